@@ -0,0 +1,69 @@
+import argparse
+import time
+
+from analysis.ft_logs import read_ft_log, save_ft_log_npz
+
+
+def print_block_lcs(log, epoch_index=-1):
+    """
+    Prints the 'layer CS' (for destinations and sources) of every layer in
+    each block, at a given feature epoch.
+
+    Args:
+        log: FtLog, the feature log;
+        epoch_index: `int`, index of the feature epoch (default: the last).
+    """
+    print("Layer CS at epoch %d:" % log.epochs[epoch_index])
+    for b in range(len(log.lcs_dst)):
+        n_layers = log.layer_num_list[epoch_index, b]
+        print("* Block %d (%d layers):" % (b, n_layers))
+        print("%8s %10s %10s" % ('layer', 'lcs_dst', 'lcs_src'))
+        for l in range(n_layers):
+            print("%8d %10.4f %10.4f" % (l, log.lcs_dst[b][epoch_index, l],
+                                         log.lcs_src[b][epoch_index, l]))
+
+
+# Parse arguments for the program.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Read CSV feature logs (ft_logs/*.csv) into NumPy arrays'
+                    ' and print a summary of each one.')
+    parser.add_argument(
+        'paths', type=str, nargs='+',
+        help='Paths of the CSV feature logs.')
+    parser.add_argument(
+        '--ft_comma_separator', '--ft_comma', '-comma',
+        dest='ft_comma', type=str, default=';',
+        help='Comma (value) separator used in the feature logs.')
+    parser.add_argument(
+        '--ft_decimal_separator', '--ft_decimal', '-dec',
+        dest='ft_decimal', type=str, default=',',
+        help='Decimal separator used in the feature logs.')
+    parser.add_argument(
+        '--layer_cs', '-lcs', dest='should_print_lcs', action='store_true',
+        help='Also print the layer CS of every layer at the last epoch.')
+    parser.add_argument(
+        '--npz', dest='should_save_npz', action='store_true',
+        help='Save the arrays read from each log in a NPZ file (next to the'
+             ' log, with the .npz extension).')
+    parser.add_argument(
+        '--no-cs-tables', dest='with_cs_tables', action='store_false',
+        help='Do not read the full CS tables (faster, less memory).')
+    parser.set_defaults(with_cs_tables=True)
+    args = parser.parse_args()
+
+    for path in args.paths:
+        start_time = time.time()
+        log = read_ft_log(path, args.ft_comma, args.ft_decimal,
+                          args.with_cs_tables)
+        print("\n%s (read in %.2fs):" % (path, time.time() - start_time))
+        for key, value in log.summary().items():
+            if isinstance(value, float):
+                value = '%.4f' % value
+            print("\t%s: %s" % (key, value))
+        if args.should_print_lcs and len(log.epochs):
+            print_block_lcs(log)
+        if args.should_save_npz:
+            npz_path = path.rsplit('.', 1)[0] + '.npz'
+            save_ft_log_npz(log, npz_path)
+            print("Arrays saved to: %s" % npz_path)
@@ -0,0 +1,281 @@
+from collections import OrderedDict
+from datetime import timedelta
+
+import numpy as np
+
+
+class FtLog:
+    """
+    Contents of a CSV feature log (as written by DenseNet during training),
+    as NumPy arrays. For a log with E feature epochs ('Epoch' rows):
+
+    - epochs: `np.ndarray` [E] of `int`, the epoch of each row;
+    - accuracy: `np.ndarray` [E], the accuracy at each epoch;
+    - loss: `np.ndarray` [E, max. number of losses], the cross-entropy at
+      each epoch (for each layer of the last block, if measured), padded
+      with NaN;
+    - layer_num_list: `np.ndarray` [E, max. number of blocks] of `int`, the
+      number of layers in each block at each epoch (0 if no such block);
+    - lcs_dst, lcs_src: `list` (one per block) of `np.ndarray` [E, max.
+      number of layers in the block], the 'layer CS' (relevance or spread)
+      for destinations and sources of each layer, padded with NaN;
+    - cs_tables: `list` (one per block) of `np.ndarray` [E, L, L], where L is
+      the max. number of layers in the block: the normalised CS received by
+      each layer l from each previous layer s (cs_tables[b][e, l, s]),
+      padded with NaN (None if not read);
+    - timings: `dict` mapping the kind of other rows (e.g. 'Phase times',
+      'Telemetry') to an `OrderedDict` of `np.ndarray` (one per key), with
+      the epoch of each row in 'epoch';
+    - total_time: `float` or None, the total training time (in seconds).
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self.epochs = np.zeros(0, dtype=np.int64)
+        self.accuracy = np.zeros(0)
+        self.loss = np.zeros((0, 0))
+        self.layer_num_list = np.zeros((0, 0), dtype=np.int64)
+        self.lcs_dst = []
+        self.lcs_src = []
+        self.cs_tables = []
+        self.timings = OrderedDict()
+        self.total_time = None
+
+    def summary(self):
+        """
+        Returns an `OrderedDict` with a summary of the log: number of feature
+        epochs, last epoch, best and final accuracy (and best epoch), final
+        number of layers per block, epochs at which the network grew, mean
+        final 'layer CS' per block, and mean timings.
+        """
+        summary = OrderedDict()
+        summary['feature_epochs'] = len(self.epochs)
+        if len(self.epochs) == 0:
+            return summary
+        best = int(np.nanargmax(self.accuracy))
+        summary['last_epoch'] = int(self.epochs[-1])
+        summary['final_accuracy'] = float(self.accuracy[-1])
+        summary['best_accuracy'] = float(self.accuracy[best])
+        summary['best_epoch'] = int(self.epochs[best])
+        summary['final_layers'] = ','.join(
+            str(n) for n in self.layer_num_list[-1] if n > 0)
+        # epochs at which the number of layers changed
+        grown = np.flatnonzero(np.any(
+            self.layer_num_list[1:] != self.layer_num_list[:-1], axis=1))
+        summary['growth_epochs'] = ','.join(
+            str(e) for e in self.epochs[grown + 1])
+        for b in range(len(self.lcs_dst)):
+            summary['block_%d_mean_lcs_dst' % b] = float(
+                np.nanmean(self.lcs_dst[b][-1]))
+            summary['block_%d_mean_lcs_src' % b] = float(
+                np.nanmean(self.lcs_src[b][-1]))
+        for kind, columns in self.timings.items():
+            for key, values in columns.items():
+                if key != 'epoch':
+                    summary['%s: %s' % (kind, key)] = float(np.mean(values))
+        if self.total_time is not None:
+            summary['total_time'] = self.total_time
+        return summary
+
+
+def parse_row_values(cells, decimal=','):
+    """
+    Converts the cells of a CSV row (without its first cell) to numbers.
+    Returns the values (`np.ndarray` of `float`, NaN for non-numeric cells)
+    and the indices of the empty cells (`np.ndarray` of `int`).
+
+    Args:
+        cells: `list` of `str`, the (quoted) cells of the row;
+        decimal: `str`, decimal separator used in the values.
+    """
+    cells = np.char.strip(np.asarray(cells, dtype=str), '"\n\r ')
+    empty = np.flatnonzero(cells == '')
+    values = np.full(len(cells), np.nan)
+    numeric = cells != ''
+    if decimal != '.':
+        cells = np.char.replace(cells, decimal, '.')
+    try:
+        values[numeric] = cells[numeric].astype(np.float64)
+    except ValueError:
+        for i in np.flatnonzero(numeric):
+            try:
+                values[i] = float(cells[i])
+            except ValueError:
+                pass
+    return values, empty
+
+
+def parse_epoch_row(values, empty):
+    """
+    Splits the values of an 'Epoch' row into its features.
+    Returns the accuracy (`float`), the losses (`np.ndarray`) and, for each
+    block, a `list` of (lcs_dst, cs_dst, cs_src, lcs_src) tuples (one per
+    layer, cs_dst and cs_src being `np.ndarray`).
+
+    The values are grouped between empty cells: [accuracy, losses...],
+    then for each layer [lcs_dst], [cs_dst...], [cs_src...], [lcs_src],
+    except that a layer's lcs_src and the next layer's lcs_dst are in the
+    same group (not separated by an empty cell). The last layer of a block
+    is the one with only one CS towards destinations.
+
+    Args:
+        values: `np.ndarray`, the row's values (see parse_row_values);
+        empty: `np.ndarray`, the indices of the row's empty cells.
+    """
+    groups = np.split(values, empty)
+    # remove the empty cell at the beginning of each group (except the 1st)
+    groups = [groups[0]] + [g[1:] for g in groups[1:]]
+    accuracy, losses = groups[0][0], groups[0][1:]
+    blocks = []
+    if len(groups) > 2:
+        layers = []
+        lcs_dst = groups[1][0]
+        # each layer: [cs_dst...], [cs_src...], [lcs_src (, next lcs_dst)]
+        for i in range(2, len(groups) - 2, 3):
+            cs_dst, cs_src, last = groups[i], groups[i+1], groups[i+2]
+            layers.append((lcs_dst, cs_dst, cs_src, last[0]))
+            if len(cs_dst) == 1:
+                blocks.append(layers)
+                layers = []
+            lcs_dst = last[1] if len(last) > 1 else np.nan
+        if layers:
+            blocks.append(layers)
+    return accuracy, losses, blocks
+
+
+def read_ft_log(path, comma=';', decimal=',', with_cs_tables=True):
+    """
+    Reads a CSV feature log (read line by line, so large logs are not
+    loaded in memory at once). Returns an FtLog.
+
+    Args:
+        path: `str`, path of the CSV feature log;
+        comma: `str`, 'comma' (value) separator used in the log;
+        decimal: `str`, decimal separator used in the log;
+        with_cs_tables: `bool`, should the full CS tables be read or not
+            (only the 'layer CS' values are read otherwise).
+    """
+    log = FtLog(path)
+    epochs, accuracy, losses, rows = [], [], [], []
+    timings = OrderedDict()
+    with open(path) as f:
+        for line in f:
+            if line.startswith('TOTAL TRAINING TIME:'):
+                log.total_time = parse_timedelta(line.split(': ', 1)[1])
+                continue
+            cells = line.rstrip('\n').split(comma)
+            title = cells[0].strip('"')
+            if not title:
+                continue
+            kind, _, epoch = title.rpartition(' ')
+            values, empty = parse_row_values(cells[1:], decimal)
+            if kind == 'Epoch':
+                acc, loss, blocks = parse_epoch_row(values, empty)
+                epochs.append(int(epoch))
+                accuracy.append(acc)
+                losses.append(loss)
+                rows.append(blocks)
+            else:
+                # rows of named values, e.g. "Phase times 3";"phase";"value"
+                columns = timings.setdefault(kind, OrderedDict(epoch=[]))
+                columns['epoch'].append(int(epoch))
+                keys = np.char.strip(np.asarray(cells[1::2], dtype=str), '"')
+                for key, value in zip(keys, values[1::2]):
+                    columns.setdefault(key, []).append(value)
+
+    log.epochs = np.array(epochs, dtype=np.int64)
+    log.accuracy = np.array(accuracy, dtype=np.float64)
+    log.loss = pad_rows(losses)
+    n_blocks = max([len(blocks) for blocks in rows] or [0])
+    log.layer_num_list = np.zeros((len(rows), n_blocks), dtype=np.int64)
+    for e, blocks in enumerate(rows):
+        log.layer_num_list[e, :len(blocks)] = [len(ls) for ls in blocks]
+    for b in range(n_blocks):
+        block_rows = [blocks[b] if len(blocks) > b else [] for blocks in rows]
+        log.lcs_dst.append(pad_rows(
+            [[layer[0] for layer in ls] for ls in block_rows]))
+        log.lcs_src.append(pad_rows(
+            [[layer[3] for layer in ls] for ls in block_rows]))
+        if with_cs_tables:
+            log.cs_tables.append(get_cs_tables(block_rows))
+        else:
+            log.cs_tables.append(None)
+    for kind, columns in timings.items():
+        log.timings[kind] = OrderedDict(
+            (key, np.array(values)) for key, values in columns.items())
+    return log
+
+
+def get_cs_tables(block_rows):
+    """
+    Builds the CS tables of a block from its parsed layers at each epoch.
+    Returns an `np.ndarray` [epochs, L, L] (see FtLog.cs_tables).
+
+    Args:
+        block_rows: `list` (one per epoch) of `list` of (lcs_dst, cs_dst,
+            cs_src, lcs_src) tuples, the block's layers at each epoch.
+    """
+    n_layers = max([len(ls) for ls in block_rows] or [0])
+    tables = np.full((len(block_rows), n_layers, n_layers), np.nan)
+    for e, layers in enumerate(block_rows):
+        for l, layer in enumerate(layers):
+            tables[e, l, :len(layer[2])] = layer[2]
+    return tables
+
+
+def pad_rows(rows, fill=np.nan):
+    """
+    Stacks rows of different lengths into a 2D `np.ndarray`, padded with
+    a fill value.
+
+    Args:
+        rows: `list` of array-like, the rows;
+        fill: `float`, value for the missing cells.
+    """
+    lengths = np.array([len(row) for row in rows], dtype=np.int64)
+    array = np.full((len(rows), lengths.max() if len(rows) else 0), fill)
+    if len(rows):
+        mask = np.arange(array.shape[1]) < lengths[:, np.newaxis]
+        array[mask] = np.concatenate(
+            [np.asarray(row, dtype=np.float64) for row in rows])
+    return array
+
+
+def parse_timedelta(text):
+    """
+    Converts a `str` representation of a `timedelta` (e.g. '1 day,
+    2:03:04.5') to a number of seconds.
+
+    Args:
+        text: `str`, the representation of the `timedelta`.
+    """
+    days = 0
+    text = text.strip()
+    if 'day' in text:
+        day_text, text = text.split(',', 1)
+        days = int(day_text.split()[0])
+    hours, minutes, seconds = text.strip().split(':')
+    return timedelta(days=days, hours=int(hours), minutes=int(minutes),
+                     seconds=float(seconds)).total_seconds()
+
+
+def save_ft_log_npz(log, path):
+    """
+    Saves the arrays of an FtLog in a compressed NPZ file.
+
+    Args:
+        log: FtLog, the feature log;
+        path: `str`, path of the NPZ file.
+    """
+    arrays = OrderedDict([('epochs', log.epochs), ('accuracy', log.accuracy),
+                          ('loss', log.loss),
+                          ('layer_num_list', log.layer_num_list)])
+    for b in range(len(log.lcs_dst)):
+        arrays['lcs_dst_%d' % b] = log.lcs_dst[b]
+        arrays['lcs_src_%d' % b] = log.lcs_src[b]
+        if log.cs_tables[b] is not None:
+            arrays['cs_table_%d' % b] = log.cs_tables[b]
+    for kind, columns in log.timings.items():
+        for key, values in columns.items():
+            arrays['%s/%s' % (kind, key)] = values
+    np.savez_compressed(path, **arrays)
@@ -0,0 +1,351 @@
+import importlib
+import json
+import multiprocessing
+import os
+import platform
+import socket
+import subprocess
+import time
+from collections import OrderedDict
+from datetime import datetime
+
+
+# Model parameters for benchmarks (same defaults as run_dense_net.py, with
+# no logs, checkpoints or images being saved).
+DEFAULT_MODEL_PARAMS = {
+    'growth_rate': 12,
+    'layer_num_list': '1',
+    'keep_prob': 1.0,
+    'num_inter_threads': 1,
+    'num_intra_threads': 128,
+    'num_eval_inter_threads': None,
+    'data_format': 'NHWC',
+    'should_fuse_batch_norm': False,
+    'should_use_xla': False,
+    'should_recompute_features': False,
+    'weight_decay': 1e-4,
+    'nesterov_momentum': 0.9,
+    'model_type': 'DenseNet',
+    'dataset': 'Synthetic',
+    'should_self_construct': True,
+    'should_change_lr': True,
+    'self_constructing_var': -1,
+    'self_constr_rlr': -1,
+    'block_count': 1,
+    'layer_cs': 'relevance',
+    'asc_thresh': 10,
+    'patience_param': 200,
+    'std_tolerance': 0.1,
+    'std_window': 50,
+    'expansion_rate': 1,
+    'should_save_logs': False,
+    'should_save_ft_logs': False,
+    'ft_period': 1,
+    'ft_comma': ';',
+    'ft_decimal': ',',
+    'ft_filters': False,
+    'ft_cross_entropies': False,
+    'should_save_model': False,
+    'should_save_images': False,
+    'renew_logs': False,
+    'reduction': 0.5,
+}
+
+# Default parameters of a benchmark (workload and implementation).
+DEFAULT_BENCHMARK_PARAMS = {
+    'implementation': 'NEWER_dense_net',
+    'batch_size': 64,
+    'warmup_steps': 3,
+    'train_steps': 20,
+    'eval_size': 1000,
+    'image_size': 32,
+    'n_classes': 10,
+    'seed': 0,
+    'omp_num_threads': None,
+}
+
+# Metrics that are better when lower (the others are better when higher).
+LOWER_IS_BETTER = ['graph_build_time', 'train_step_time',
+                   'growth_layer_time', 'growth_kernels_time',
+                   'growth_block_time', 'peak_rss_mb', 'graph_nodes',
+                   'graph_nodes_after_growth']
+
+
+def get_model_params(config):
+    """
+    Returns the DenseNet model parameters (`dict`) for a benchmark
+    configuration (which overrides the default model parameters).
+
+    Args:
+        config: `dict`, the benchmark's configuration.
+    """
+    model_params = dict(DEFAULT_MODEL_PARAMS)
+    model_params.update((key, value) for key, value in config.items()
+                        if key in DEFAULT_MODEL_PARAMS)
+    if model_params['model_type'] == 'DenseNet':
+        model_params['bc_mode'] = False
+        model_params['reduction'] = 1.0
+    else:
+        model_params['bc_mode'] = True
+    return model_params
+
+
+def get_benchmark_params(config):
+    """
+    Returns the benchmark parameters (`dict`) for a benchmark configuration
+    (which overrides the default benchmark parameters).
+
+    Args:
+        config: `dict`, the benchmark's configuration.
+    """
+    params = dict(DEFAULT_BENCHMARK_PARAMS)
+    params.update((key, value) for key, value in config.items()
+                  if key in DEFAULT_BENCHMARK_PARAMS)
+    return params
+
+
+def run_benchmark(config):
+    """
+    Runs a benchmark for a configuration, in the current process: builds
+    a DenseNet (with the chosen implementation) for synthetic data, then
+    measures its training and evaluation throughput, and the latency of
+    growth events (new kernels, layer and block, where the implementation
+    supports them). Returns an `OrderedDict` of metrics.
+
+    Args:
+        config: `dict`, the benchmark's configuration (model parameters and
+            benchmark parameters, see DEFAULT_MODEL_PARAMS and
+            DEFAULT_BENCHMARK_PARAMS).
+    """
+    os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+    from data_providers.synthetic import SyntheticDataProvider, \
+        SyntheticDataSet
+    from models.profiling import get_peak_rss
+    from models.thread_tuning import apply_thread_env
+
+    params = get_benchmark_params(config)
+    apply_thread_env(params['omp_num_threads'])
+    model_params = get_model_params(config)
+    batch_size = params['batch_size']
+    data_provider = SyntheticDataProvider(
+        data_shape=(params['image_size'], params['image_size'], 3),
+        n_classes=params['n_classes'],
+        train_size=(params['warmup_steps'] + params['train_steps'])
+        * batch_size,
+        test_size=params['eval_size'], seed=params['seed'])
+    warmup_images = params['warmup_steps'] * batch_size
+    warmup_set = SyntheticDataSet(data_provider.train.images[:warmup_images],
+                                  data_provider.train.labels[:warmup_images],
+                                  False)
+    train_set = SyntheticDataSet(data_provider.train.images[warmup_images:],
+                                 data_provider.train.labels[warmup_images:],
+                                 False)
+
+    metrics = OrderedDict()
+    implementation = importlib.import_module(
+        'models.%s' % params['implementation'])
+    start_time = time.time()
+    model = implementation.DenseNet(data_provider=data_provider,
+                                    **model_params)
+    metrics['graph_build_time'] = time.time() - start_time
+    metrics['graph_nodes'] = len(model.sess.graph.get_operations())
+
+    # training throughput (after a few warmup steps)
+    model.train_one_epoch(warmup_set, batch_size, 0.1)
+    start_time = time.time()
+    model.train_one_epoch(train_set, batch_size, 0.1)
+    train_time = time.time() - start_time
+    metrics['train_step_time'] = train_time / params['train_steps']
+    metrics['train_images_per_sec'] = (
+        params['train_steps'] * batch_size / train_time)
+
+    # evaluation throughput
+    eval_batch_size = min(batch_size, params['eval_size'])
+    start_time = time.time()
+    model.test(data_provider.test, eval_batch_size)
+    eval_time = time.time() - start_time
+    # the older implementations only evaluate complete batches
+    if params['implementation'] == 'NEWER_dense_net':
+        eval_images = params['eval_size']
+    else:
+        eval_images = (
+            params['eval_size'] // eval_batch_size * eval_batch_size)
+    metrics['eval_images_per_sec'] = eval_images / eval_time
+
+    # growth events latency
+    for event, method in [('kernels', '_new_kernels_to_last_layer'),
+                          ('layer', '_new_layer'), ('block', '_new_block')]:
+        if hasattr(model, method):
+            start_time = time.time()
+            getattr(model, method)()
+            metrics['growth_%s_time' % event] = time.time() - start_time
+    metrics['graph_nodes_after_growth'] = len(
+        model.sess.graph.get_operations())
+
+    metrics['peak_rss_mb'] = get_peak_rss() / 2**20
+    model.sess.close()
+    return metrics
+
+
+def _run_benchmark_child(config, connection):
+    """
+    Target of the benchmark processes: runs a benchmark and sends its
+    metrics (or its error) through a connection.
+    """
+    try:
+        connection.send(run_benchmark(config))
+    except Exception as e:
+        connection.send({'error': '%s: %s' % (type(e).__name__, e)})
+    connection.close()
+
+
+def run_benchmark_in_child(config, timeout=None):
+    """
+    Runs a benchmark (see run_benchmark) in a new (spawned) process, so that
+    each benchmark has its own TensorFlow graph, threads and peak memory.
+    Returns the metrics, or a `dict` with an 'error' if the benchmark failed.
+
+    Args:
+        config: `dict`, the benchmark's configuration;
+        timeout: `float` or None, maximum duration of the benchmark (s).
+    """
+    context = multiprocessing.get_context('spawn')
+    receiver, sender = context.Pipe(duplex=False)
+    process = context.Process(target=_run_benchmark_child,
+                              args=(config, sender))
+    process.start()
+    sender.close()
+    try:
+        if receiver.poll(timeout):
+            metrics = receiver.recv()
+        else:
+            process.terminate()
+            metrics = {'error': 'Timeout after %ss' % timeout}
+    except EOFError:
+        metrics = {'error': 'Process ended without results'}
+    process.join()
+    if 'error' in metrics and process.exitcode:
+        metrics['exitcode'] = process.exitcode
+    return metrics
+
+
+def print_comparison(names, metrics, baseline):
+    """
+    Prints the metrics of several benchmarks side by side, with their
+    relative cost compared to a baseline benchmark (a '+' change is
+    an improvement, a '-' change is a regression).
+
+    Args:
+        names: `list` of `str`, name of each benchmark;
+        metrics: `list` of `dict`, metrics of each benchmark;
+        baseline: `str`, name of the baseline benchmark.
+    """
+    base = metrics[names.index(baseline)] if baseline in names else {}
+    keys = []
+    for m in metrics:
+        keys.extend(k for k in m if k not in keys)
+    print('\n%-26s' % 'metric' + ''.join('%24s' % n for n in names))
+    for key in keys:
+        if key in ['error', 'exitcode']:
+            continue  # errors are printed when they happen
+        cells = []
+        for m in metrics:
+            value = m.get(key)
+            if value is None:
+                cells.append('%24s' % '-')
+                continue
+            cell = ('%d' if isinstance(value, int) else '%.4f') % value
+            if base.get(key) and m is not base:
+                change = 100 * (value - base[key]) / base[key]
+                if key in LOWER_IS_BETTER:
+                    change = -change
+                cell += ' (%+.1f%%)' % change
+            cells.append('%24s' % cell)
+        print('%-26s' % key + ''.join(cells))
+
+
+def get_environment_info():
+    """
+    Returns an `OrderedDict` describing the environment of the benchmarks
+    (host, CPU, library versions, git commit, date).
+    """
+    info = OrderedDict()
+    info['date'] = datetime.now().isoformat(' ')
+    info['host'] = socket.gethostname()
+    info['platform'] = platform.platform()
+    info['processor'] = platform.processor() or platform.machine()
+    info['cpu_count'] = os.cpu_count()
+    info['python'] = platform.python_version()
+    for module in ['numpy', 'tensorflow']:
+        try:
+            info[module] = importlib.import_module(module).__version__
+        except ImportError:
+            info[module] = None
+    try:
+        info['commit'] = subprocess.check_output(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        info['commit'] = None
+    return info
+
+
+def get_config_name(config):
+    """
+    Returns a `str` identifying a benchmark configuration (used to match
+    results between reports).
+
+    Args:
+        config: `dict`, the benchmark's configuration.
+    """
+    return ' '.join('%s=%s' % (key, config[key]) for key in sorted(config))
+
+
+def write_report(results, path):
+    """
+    Writes a JSON benchmark report, with the environment information and
+    the configuration and metrics of each benchmark.
+
+    Args:
+        results: `list` of (config, metrics) pairs;
+        path: `str`, path of the JSON report.
+    """
+    report = OrderedDict([
+        ('environment', get_environment_info()),
+        ('results', [OrderedDict([('name', get_config_name(config)),
+                                  ('config', config),
+                                  ('metrics', metrics)])
+                     for config, metrics in results])])
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        json.dump(report, f, indent=2)
+
+
+def compare_reports(old_path, new_path):
+    """
+    Prints the relative change of each metric between two benchmark reports,
+    for the configurations present in both (a '+' change is an
+    improvement, a '-' change is a regression).
+
+    Args:
+        old_path: `str`, path of the reference (old) JSON report;
+        new_path: `str`, path of the new JSON report.
+    """
+    with open(old_path) as f:
+        old = dict((r['name'], r['metrics']) for r in json.load(f)['results'])
+    with open(new_path) as f:
+        new = [(r['name'], r['metrics']) for r in json.load(f)['results']]
+    for name, metrics in new:
+        if name not in old:
+            continue
+        print('\n%s' % name)
+        for key, value in metrics.items():
+            old_value = old[name].get(key)
+            if key == 'error' or not old_value or value is None:
+                print('  %-26s %12s -> %12s' % (key, old_value, value))
+                continue
+            change = 100 * (value - old_value) / old_value
+            if key in LOWER_IS_BETTER:
+                change = -change
+            print('  %-26s %12.4f -> %12.4f  (%+.1f%%)' % (
+                key, old_value, value, change))
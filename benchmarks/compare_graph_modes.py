@@ -0,0 +1,97 @@
+import argparse
+from collections import OrderedDict
+from datetime import datetime
+
+from .common import run_benchmark_in_child, write_report, print_comparison
+
+
+# Graph modes of NEWER_dense_net: data format, fused batch norm and XLA JIT.
+GRAPH_MODES = OrderedDict([
+    ('default', {'data_format': 'NHWC', 'should_fuse_batch_norm': False,
+                 'should_use_xla': False}),
+    ('fused', {'data_format': 'NHWC', 'should_fuse_batch_norm': True,
+               'should_use_xla': False}),
+    ('fused_xla', {'data_format': 'NHWC', 'should_fuse_batch_norm': True,
+                   'should_use_xla': True}),
+    ('nchw_fused', {'data_format': 'NCHW', 'should_fuse_batch_norm': True,
+                    'should_use_xla': False}),
+    ('nchw_fused_xla', {'data_format': 'NCHW', 'should_fuse_batch_norm': True,
+                        'should_use_xla': True}),
+])
+
+
+# Parse arguments for the program.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run identical short workloads (on synthetic data) on'
+                    ' NEWER_dense_net with each graph mode (data format,'
+                    ' fused batch norm, XLA JIT), and compare their step'
+                    ' time, memory, graph size and growth event cost.'
+                    ' NCHW modes only run on CPU with TensorFlow builds'
+                    ' with MKL (otherwise their error is reported).')
+    parser.add_argument(
+        '--modes', type=str, nargs='+', choices=list(GRAPH_MODES),
+        default=list(GRAPH_MODES),
+        help='Graph modes to compare (default: %(default)s).')
+    parser.add_argument(
+        '--baseline', type=str, choices=list(GRAPH_MODES), default='default',
+        help='Graph mode to which the others are compared'
+             ' (default: %(default)s).')
+    parser.add_argument(
+        '--model_type', '-m', type=str, choices=['DenseNet', 'DenseNet-BC'],
+        default='DenseNet',
+        help='Model type (default: %(default)s).')
+    parser.add_argument(
+        '--growth_rate', '-k', type=int, default=12,
+        help='Growth rate (default: %(default)s).')
+    parser.add_argument(
+        '--layer_num_list', '-lnl', type=str, default='4,4,4', metavar='',
+        help='Number of layers in each block (default: %(default)s).')
+    parser.add_argument(
+        '--batch_size', '-bs', type=int, default=64, metavar='',
+        help='Batch size (default: %(default)s).')
+    parser.add_argument(
+        '--num_inter_threads', '-inter', type=int, default=1, metavar='',
+        help='Number of inter-operation CPU threads (default: %(default)s).')
+    parser.add_argument(
+        '--num_intra_threads', '-intra', type=int, default=128, metavar='',
+        help='Number of intra-operation CPU threads (default: %(default)s).')
+    parser.add_argument(
+        '--train_steps', type=int, default=20, metavar='',
+        help='Measured training steps (default: %(default)s).')
+    parser.add_argument(
+        '--timeout', type=float, default=None, metavar='',
+        help='Maximum duration (s) of each benchmark.')
+    parser.add_argument(
+        '--output', '-o', type=str, default=None, metavar='',
+        help='Path of the JSON report (default:'
+             ' benchmarks/results/graph_modes_<date>.json).')
+    args = parser.parse_args()
+
+    if args.output is None:
+        args.output = 'benchmarks/results/graph_modes_%s.json' % (
+            datetime.now().strftime("%Y_%m_%d_%H%M%S"))
+
+    results = []
+    for mode in args.modes:
+        config = {
+            'implementation': 'NEWER_dense_net',
+            'model_type': args.model_type,
+            'growth_rate': args.growth_rate,
+            'layer_num_list': args.layer_num_list,
+            'batch_size': args.batch_size,
+            'num_inter_threads': args.num_inter_threads,
+            'num_intra_threads': args.num_intra_threads,
+            'train_steps': args.train_steps,
+        }
+        config.update(GRAPH_MODES[mode])
+        print("Benchmarking the %s mode..." % mode)
+        metrics = run_benchmark_in_child(config, args.timeout)
+        if 'error' in metrics:
+            print("\t%s" % metrics['error'])
+        results.append((config, metrics))
+        write_report(results, args.output)
+
+    print_comparison(args.modes, [metrics for _, metrics in results],
+                     args.baseline)
+    print("\nReport written to: %s" % args.output)
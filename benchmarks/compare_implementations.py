@@ -0,0 +1,88 @@
+import argparse
+from datetime import datetime
+
+from .common import run_benchmark_in_child, write_report, print_comparison
+
+
+# DenseNet implementations (modules in models), from oldest to newest.
+IMPLEMENTATIONS = ['dense_net', 'NEW_dense_net', 'NEWER_dense_net']
+
+
+# Parse arguments for the program.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Run identical short workloads (on synthetic data) on'
+                    ' each DenseNet implementation (dense_net, NEW_dense_net,'
+                    ' NEWER_dense_net), and compare their step time, memory,'
+                    ' graph size and growth event cost.')
+    parser.add_argument(
+        '--implementations', '-impl', type=str, nargs='+',
+        choices=IMPLEMENTATIONS, default=IMPLEMENTATIONS,
+        help='Implementations to compare (default: %(default)s).')
+    parser.add_argument(
+        '--baseline', type=str, choices=IMPLEMENTATIONS, default='dense_net',
+        help='Implementation to which the others are compared'
+             ' (default: %(default)s).')
+    parser.add_argument(
+        '--model_type', '-m', type=str, choices=['DenseNet', 'DenseNet-BC'],
+        default='DenseNet',
+        help='Model type (default: %(default)s).')
+    parser.add_argument(
+        '--growth_rate', '-k', type=int, default=12,
+        help='Growth rate (default: %(default)s).')
+    parser.add_argument(
+        '--layer_num_list', '-lnl', type=str, default='4,4,4', metavar='',
+        help='Number of layers in each block (default: %(default)s).')
+    parser.add_argument(
+        '--batch_size', '-bs', type=int, default=64, metavar='',
+        help='Batch size (default: %(default)s).')
+    parser.add_argument(
+        '--num_inter_threads', '-inter', type=int, default=1, metavar='',
+        help='Number of inter-operation CPU threads (default: %(default)s).')
+    parser.add_argument(
+        '--num_intra_threads', '-intra', type=int, default=128, metavar='',
+        help='Number of intra-operation CPU threads (default: %(default)s).')
+    parser.add_argument(
+        '--train_steps', type=int, default=20, metavar='',
+        help='Measured training steps (default: %(default)s).')
+    parser.add_argument(
+        '--repeats', '-r', type=int, default=1, metavar='',
+        help='Number of runs for each implementation (the best run is kept,'
+             ' default: %(default)s).')
+    parser.add_argument(
+        '--output', '-o', type=str, default=None, metavar='',
+        help='Path of the JSON report (default:'
+             ' benchmarks/results/implementations_<date>.json).')
+    args = parser.parse_args()
+
+    if args.output is None:
+        args.output = 'benchmarks/results/implementations_%s.json' % (
+            datetime.now().strftime("%Y_%m_%d_%H%M%S"))
+
+    results = []
+    for implementation in args.implementations:
+        config = {
+            'implementation': implementation,
+            'model_type': args.model_type,
+            'growth_rate': args.growth_rate,
+            'layer_num_list': args.layer_num_list,
+            'batch_size': args.batch_size,
+            'num_inter_threads': args.num_inter_threads,
+            'num_intra_threads': args.num_intra_threads,
+            'train_steps': args.train_steps,
+        }
+        print("Benchmarking %s..." % implementation)
+        runs = [run_benchmark_in_child(config) for _ in range(args.repeats)]
+        # keep the fastest successful run
+        successful = [m for m in runs if 'error' not in m]
+        if successful:
+            metrics = min(successful, key=lambda m: m['train_step_time'])
+        else:
+            metrics = runs[-1]
+            print("\t%s" % metrics['error'])
+        results.append((config, metrics))
+        write_report(results, args.output)
+
+    print_comparison([config['implementation'] for config, _ in results],
+                     [metrics for _, metrics in results], args.baseline)
+    print("\nReport written to: %s" % args.output)
@@ -0,0 +1,96 @@
+import argparse
+from datetime import datetime
+
+from .common import run_benchmark_in_child, write_report
+
+
+# Memory modes of NEWER_dense_net (are the layers' inputs recomputed or not).
+MEMORY_MODES = [('standard', False), ('memory_efficient', True)]
+
+
+def print_memory_table(results, depths):
+    """
+    Prints the peak memory and the training step time for each depth, in
+    each memory mode.
+
+    Args:
+        results: `dict`, the metrics for each (depth, mode) pair;
+        depths: `list` of `int`, the benchmarked depths.
+    """
+    modes = [mode for mode, _ in MEMORY_MODES]
+    print('\n%-8s' % 'depth' + ''.join(
+        '%22s%22s' % ('%s MB' % mode, '%s s/step' % mode) for mode in modes))
+    for depth in depths:
+        cells = []
+        for mode in modes:
+            metrics = results[(depth, mode)]
+            if 'error' in metrics:
+                cells.extend(['%22s' % '-'] * 2)
+            else:
+                cells.append('%22.1f' % metrics['peak_rss_mb'])
+                cells.append('%22.4f' % metrics['train_step_time'])
+        print('%-8d' % depth + ''.join(cells))
+
+
+# Parse arguments for the program.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Measure the peak memory (RSS) and the training step time'
+                    ' of NEWER_dense_net for increasing block depths, with'
+                    ' and without recomputing the layers\' inputs in the'
+                    ' backward pass (--memory-efficient).')
+    parser.add_argument(
+        '--depths', '-d', type=int, nargs='+', default=[4, 8, 16, 32],
+        help='Numbers of layers in each block (default: %(default)s).')
+    parser.add_argument(
+        '--blocks', '-b', type=int, default=1, metavar='',
+        help='Number of blocks (default: %(default)s).')
+    parser.add_argument(
+        '--model_type', '-m', type=str, choices=['DenseNet', 'DenseNet-BC'],
+        default='DenseNet',
+        help='Model type (default: %(default)s).')
+    parser.add_argument(
+        '--growth_rate', '-k', type=int, default=12,
+        help='Growth rate (default: %(default)s).')
+    parser.add_argument(
+        '--batch_size', '-bs', type=int, default=64, metavar='',
+        help='Batch size (default: %(default)s).')
+    parser.add_argument(
+        '--train_steps', type=int, default=5, metavar='',
+        help='Measured training steps (default: %(default)s).')
+    parser.add_argument(
+        '--timeout', type=float, default=None, metavar='',
+        help='Maximum duration (s) of each benchmark.')
+    parser.add_argument(
+        '--output', '-o', type=str, default=None, metavar='',
+        help='Path of the JSON report (default:'
+             ' benchmarks/results/memory_<date>.json).')
+    args = parser.parse_args()
+
+    if args.output is None:
+        args.output = 'benchmarks/results/memory_%s.json' % (
+            datetime.now().strftime("%Y_%m_%d_%H%M%S"))
+
+    report = []
+    results = {}
+    for depth in args.depths:
+        for mode, should_recompute_features in MEMORY_MODES:
+            config = {
+                'implementation': 'NEWER_dense_net',
+                'model_type': args.model_type,
+                'growth_rate': args.growth_rate,
+                'layer_num_list': ','.join([str(depth)] * args.blocks),
+                'batch_size': args.batch_size,
+                'train_steps': args.train_steps,
+                'should_recompute_features': should_recompute_features,
+            }
+            print("Benchmarking %d layers per block (%s)..." % (depth, mode))
+            metrics = run_benchmark_in_child(config, args.timeout)
+            if 'error' in metrics:
+                print("\t%s" % metrics['error'])
+            results[(depth, mode)] = metrics
+            report.append((config, metrics))
+            write_report(report, args.output)
+
+    print_memory_table(results, args.depths)
+    print("\nReport written to: %s" % args.output)
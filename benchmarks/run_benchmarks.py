@@ -0,0 +1,126 @@
+import argparse
+import itertools
+from datetime import datetime
+
+from .common import run_benchmark_in_child, write_report, compare_reports, \
+    get_config_name
+
+
+def get_configs(args):
+    """
+    Returns the `list` of benchmark configurations (`dict`) for the matrix
+    of parameters given as arguments.
+
+    Args:
+        args: the parsed arguments.
+    """
+    configs = []
+    for (growth_rate, layer_num_list, model_type, batch_size,
+         threads) in itertools.product(
+            args.growth_rates, args.layer_num_lists, args.model_types,
+            args.batch_sizes, args.threads):
+        num_inter_threads, num_intra_threads = map(int, threads.split(':'))
+        configs.append({
+            'implementation': args.implementation,
+            'growth_rate': growth_rate,
+            'layer_num_list': layer_num_list,
+            'model_type': model_type,
+            'batch_size': batch_size,
+            'num_inter_threads': num_inter_threads,
+            'num_intra_threads': num_intra_threads,
+            'warmup_steps': args.warmup_steps,
+            'train_steps': args.train_steps,
+            'eval_size': args.eval_size,
+            'image_size': args.image_size,
+        })
+    return configs
+
+
+def print_metrics(metrics):
+    """Prints the metrics of a benchmark."""
+    for key, value in metrics.items():
+        if isinstance(value, float):
+            value = '%.4f' % value
+        print('\t%s: %s' % (key, value))
+
+
+# Parse arguments for the program.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Benchmark the training and inference throughput of'
+                    ' DenseNets (on synthetic data), for a matrix of'
+                    ' architectures, batch sizes and thread settings.'
+                    ' Each benchmark runs in its own process.')
+    parser.add_argument(
+        '--growth_rates', '-k', type=int, nargs='+', default=[12, 24],
+        help='Growth rates to benchmark (default: %(default)s).')
+    parser.add_argument(
+        '--layer_num_lists', '-lnl', type=str, nargs='+',
+        default=['4', '4,4,4'],
+        help='Lists of number of layers in each block to benchmark'
+             ' (default: %(default)s).')
+    parser.add_argument(
+        '--model_types', '-m', type=str, nargs='+',
+        choices=['DenseNet', 'DenseNet-BC'],
+        default=['DenseNet', 'DenseNet-BC'],
+        help='Model types to benchmark (default: %(default)s).')
+    parser.add_argument(
+        '--batch_sizes', '-bs', type=int, nargs='+', default=[64],
+        help='Batch sizes to benchmark (default: %(default)s).')
+    parser.add_argument(
+        '--threads', '-th', type=str, nargs='+', default=['1:128'],
+        help='Thread settings to benchmark, as inter:intra numbers of'
+             ' threads (default: %(default)s).')
+    parser.add_argument(
+        '--implementation', '-impl', type=str, default='NEWER_dense_net',
+        choices=['dense_net', 'NEW_dense_net', 'NEWER_dense_net'],
+        help='DenseNet implementation (module in models) to benchmark'
+             ' (default: %(default)s).')
+
+    # Parameters of the workload.
+    parser.add_argument(
+        '--warmup_steps', type=int, default=3, metavar='',
+        help='Training steps before measuring (default: %(default)s).')
+    parser.add_argument(
+        '--train_steps', type=int, default=20, metavar='',
+        help='Measured training steps (default: %(default)s).')
+    parser.add_argument(
+        '--eval_size', type=int, default=1000, metavar='',
+        help='Number of evaluated images (default: %(default)s).')
+    parser.add_argument(
+        '--image_size', type=int, default=32, metavar='',
+        help='Height and width of the synthetic images'
+             ' (default: %(default)s).')
+    parser.add_argument(
+        '--timeout', type=float, default=None, metavar='',
+        help='Maximum duration (s) of each benchmark.')
+
+    # Report.
+    parser.add_argument(
+        '--output', '-o', type=str, default=None, metavar='',
+        help='Path of the JSON report (default:'
+             ' benchmarks/results/<date>.json).')
+    parser.add_argument(
+        '--compare', '-c', type=str, default=None, metavar='',
+        help='Path of a previous JSON report to compare the results with.')
+    args = parser.parse_args()
+
+    if args.output is None:
+        args.output = 'benchmarks/results/%s.json' % (
+            datetime.now().strftime("%Y_%m_%d_%H%M%S"))
+
+    results = []
+    configs = get_configs(args)
+    for i, config in enumerate(configs):
+        print("\nBenchmark %d/%d: %s" % (i + 1, len(configs),
+                                         get_config_name(config)))
+        metrics = run_benchmark_in_child(config, args.timeout)
+        print_metrics(metrics)
+        results.append((config, metrics))
+        # write the report after each benchmark (partial results are kept)
+        write_report(results, args.output)
+    print("\nReport written to: %s" % args.output)
+
+    if args.compare is not None:
+        print("\nComparison with %s:" % args.compare)
+        compare_reports(args.compare, args.output)
@@ -0,0 +1,116 @@
+import argparse
+
+from models.metrics_store import MetricsStore
+
+
+def print_runs(store):
+    """
+    Prints a table with all the runs recorded in a metrics database.
+
+    Args:
+        store: MetricsStore, the metrics database.
+    """
+    print('%4s  %-60s %6s %9s %9s %10s' % (
+        'id', 'run_identifier', 'epochs', 'best_acc', 'final_acc', 'layers'))
+    for run in store.get_runs():
+        print('%4d  %-60s %6d %9s %9s %10s' % (
+            run['run_id'], run['run_identifier'], run['epochs'],
+            _format(run['best_accuracy']), _format(run['final_accuracy']),
+            run['final_layers'] or '-'))
+
+
+def compare_runs(store, run_ids, show_epochs=False):
+    """
+    Prints a side-by-side comparison of several runs: best and final
+    accuracy, number of epochs, final architecture, growth events, and mean
+    phase timings per epoch.
+
+    Args:
+        store: MetricsStore, the metrics database;
+        run_ids: `list` of `int`, ids of the runs to compare;
+        show_epochs: `bool`, should the accuracy of every epoch be printed.
+    """
+    runs = dict((run['run_id'], run) for run in store.get_runs())
+    run_ids = [run_id for run_id in run_ids if run_id in runs]
+    if not run_ids:
+        print("No matching runs.")
+        return
+    rows = [('epochs', [runs[r]['epochs'] for r in run_ids]),
+            ('best_accuracy', [_format(runs[r]['best_accuracy'])
+                               for r in run_ids]),
+            ('final_accuracy', [_format(runs[r]['final_accuracy'])
+                                for r in run_ids]),
+            ('final_layers', [runs[r]['final_layers'] for r in run_ids]),
+            ('total_time', [_format(runs[r]['total_time'], '%.1fs')
+                            for r in run_ids])]
+    growth_events = [store.get_growth_events(r) for r in run_ids]
+    for event in ['layer', 'block', 'kernels']:
+        rows.append(('%s_growths' % event, [
+            sum(1 for e in events if e['event'] == event)
+            for events in growth_events]))
+    rows.append(('mean_growth_time', [_format(
+        sum(e['duration'] for e in events) / len(events) if events else None,
+        '%.3fs') for events in growth_events]))
+    timings = [store.get_mean_timings(r) for r in run_ids]
+    for phase in _ordered_union(timings):
+        rows.append(('mean_%s' % phase, [
+            _format(t.get(phase), '%.3f') for t in timings]))
+
+    for run_id in run_ids:
+        print('Run %d: %s' % (run_id, runs[run_id]['run_identifier']))
+    print('\n%-24s' % 'run_id' + ''.join('%18d' % r for r in run_ids))
+    for name, values in rows:
+        print('%-24s' % name + ''.join('%18s' % (
+            '-' if v is None else v) for v in values))
+
+    if show_epochs:
+        for run_id in run_ids:
+            print('\nRun %d (%s):' % (run_id, runs[run_id]['run_identifier']))
+            print('%6s %9s %9s %10s %7s %8s' % (
+                'epoch', 'loss', 'accuracy', 'lr', 'layers', 'time'))
+            for e in store.get_epochs(run_id):
+                print('%6d %9.4f %9.4f %10.5f %7d %7.1fs' % (
+                    e['epoch'], e['loss'], e['accuracy'], e['learning_rate'],
+                    e['total_layers'], e['epoch_time']))
+
+
+def _format(value, fmt='%.4f'):
+    """Formats a value that may be None (as '-')."""
+    return '-' if value is None else fmt % value
+
+
+def _ordered_union(dicts):
+    """Returns the keys of several dicts, in order of first appearance."""
+    keys = []
+    for d in dicts:
+        keys.extend(k for k in d if k not in keys)
+    return keys
+
+
+# Parse arguments for the program.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='List and compare the training runs recorded in a'
+                    ' metrics database (run_dense_net.py --metrics_db).')
+    parser.add_argument(
+        'metrics_db', type=str,
+        help='Path of the SQLite metrics database.')
+    parser.add_argument(
+        'runs', type=str, nargs='*',
+        help='Runs to compare, as run ids or (parts of) run identifiers.'
+             ' If none are given, all recorded runs are listed.')
+    parser.add_argument(
+        '--epochs', dest='show_epochs', action='store_true',
+        help='Also print the metrics of every epoch of the compared runs.')
+    args = parser.parse_args()
+
+    store = MetricsStore(args.metrics_db)
+    if not args.runs:
+        print_runs(store)
+    else:
+        run_ids = []
+        for run in args.runs:
+            run_ids.extend(r for r in store.get_run_ids(run)
+                           if r not in run_ids)
+        compare_runs(store, run_ids, args.show_epochs)
+    store.close()
@@ -12,6 +12,12 @@ class DataSet:
         """Return batch of required size of data, labels"""
         raise NotImplementedError
 
+    def eval_batches(self, batch_size):
+        """Yield batches of data, labels that cover every example exactly
+        once (the last batch may be smaller), without changing the state
+        used by `next_batch`"""
+        raise NotImplementedError
+
 
 class ImagesDataSet(DataSet):
     """Dataset for images that provide some often used methods"""
@@ -39,6 +45,24 @@ class ImagesDataSet(DataSet):
             self._measure_mean_and_std()
         return self._stds
 
+    def eval_batches(self, batch_size):
+        """Yield batches of images, labels in their stored order, covering
+        every example exactly once (the last batch may be smaller).
+
+        This does not touch the epoch state used by `next_batch`, so it may
+        run while the dataset is also being iterated for training.
+        """
+        # keep references, shuffling replaces (not modifies) these arrays
+        images, labels = self.images, self.labels
+        for start in range(0, labels.shape[0], batch_size):
+            end = start + batch_size
+            yield (self.preprocess_eval_images(images[start: end]),
+                   labels[start: end])
+
+    def preprocess_eval_images(self, images):
+        """Process a batch of stored images before evaluation"""
+        return images
+
     def shuffle_images_and_labels(self, images, labels):
         rand_indexes = np.random.permutation(images.shape[0])
         shuffled_images = images[rand_indexes]
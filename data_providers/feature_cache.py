@@ -0,0 +1,82 @@
+import os
+
+import numpy as np
+
+from .base_provider import DataSet
+
+
+def allocate_features(shape, dtype, max_memory_mb, path):
+    """
+    Returns an empty array for cached features: in memory if it is small
+    enough, otherwise memory-mapped on disk (as a .npy file).
+
+    Args:
+        shape: `tuple` of `int`, shape of the array;
+        dtype: data type of the features (e.g. 'float32');
+        max_memory_mb: `float`, maximum size (in MB) of an in-memory array;
+        path: `str`, path of the .npy file for a memory-mapped array.
+    """
+    size_mb = np.prod(shape) * np.dtype(dtype).itemsize / 2**20
+    if size_mb <= max_memory_mb:
+        return np.empty(shape, dtype=dtype)
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    return np.lib.format.open_memmap(path, mode='w+', dtype=dtype,
+                                     shape=shape)
+
+
+class FeatureCacheDataSet(DataSet):
+    """
+    Dataset of cached features (e.g. the outputs of the frozen part of a
+    network for each image of a dataset) and their labels, in memory or
+    memory-mapped on disk. The features are not moved when shuffling, only
+    the order in which they are read.
+    """
+
+    def __init__(self, features, labels, shuffle):
+        """
+        Args:
+            features: numpy array (or memmap), the features of each example;
+            labels: 2D or 1D numpy array;
+            shuffle: `bool`, should shuffle data on every epoch or not
+        """
+        self.features = features
+        self.labels = labels
+        self.shuffle = shuffle
+        self._indexes = np.arange(labels.shape[0])
+        self.start_new_epoch()
+
+    def start_new_epoch(self):
+        self._batch_counter = 0
+        if self.shuffle:
+            self._indexes = np.random.permutation(self.labels.shape[0])
+
+    @property
+    def num_examples(self):
+        return self.labels.shape[0]
+
+    def next_batch(self, batch_size):
+        start = self._batch_counter * batch_size
+        end = (self._batch_counter + 1) * batch_size
+        self._batch_counter += 1
+        # read the examples in order (faster for memory-mapped features)
+        indexes = np.sort(self._indexes[start: end])
+        if indexes.shape[0] != batch_size:
+            self.start_new_epoch()
+            return self.next_batch(batch_size)
+        else:
+            return self.features[indexes], self.labels[indexes]
+
+    def eval_batches(self, batch_size):
+        for start in range(0, self.labels.shape[0], batch_size):
+            end = start + batch_size
+            yield self.features[start: end], self.labels[start: end]
+
+    def delete(self):
+        """
+        Releases the cached features, and deletes their file if they are
+        memory-mapped on disk.
+        """
+        path = getattr(self.features, 'filename', None)
+        self.features = None
+        if path is not None and os.path.exists(path):
+            os.remove(path)
@@ -56,6 +56,12 @@ class SVHNDataSet(ImagesDataSet):
         else:
             return images_slice, labels_slice
 
+    def preprocess_eval_images(self, images):
+        # due to memory error normalization is done inside batch
+        if self.normalization is not None:
+            images = self.normalize_images(images, self.normalization)
+        return images
+
 
 class SVHNDataProvider(DataProvider):
     def __init__(self, save_path=None, validation_set=None,
@@ -0,0 +1,133 @@
+import numpy as np
+
+from .base_provider import ImagesDataSet, DataProvider
+
+
+class SyntheticDataSet(ImagesDataSet):
+    def __init__(self, images, labels, shuffle, seed=0):
+        """
+        Args:
+            images: 4D numpy array
+            labels: 2D or 1D numpy array
+            shuffle: `bool`, should shuffle data on every epoch or not
+            seed: `int`, seed for the (deterministic) shuffling
+        """
+        self.shuffle = shuffle
+        self.images = images
+        self.labels = labels
+        self._rng = np.random.RandomState(seed)
+        self.start_new_epoch()
+
+    def start_new_epoch(self):
+        self._batch_counter = 0
+        if self.shuffle:
+            self.images, self.labels = self.shuffle_images_and_labels(
+                self.images, self.labels)
+
+    def shuffle_images_and_labels(self, images, labels):
+        rand_indexes = self._rng.permutation(images.shape[0])
+        return images[rand_indexes], labels[rand_indexes]
+
+    @property
+    def num_examples(self):
+        return self.labels.shape[0]
+
+    def next_batch(self, batch_size):
+        start = self._batch_counter * batch_size
+        end = (self._batch_counter + 1) * batch_size
+        self._batch_counter += 1
+        images_slice = self.images[start: end]
+        labels_slice = self.labels[start: end]
+        if images_slice.shape[0] != batch_size:
+            self.start_new_epoch()
+            return self.next_batch(batch_size)
+        else:
+            return images_slice, labels_slice
+
+
+class SyntheticDataProvider(DataProvider):
+    """
+    Data provider for randomly generated (but deterministic) images, which
+    requires no download and no disk access.
+    Each class has its own random 'template' image, and the images of a
+    class are its template plus Gaussian noise, so that the data is
+    learnable (at a rate depending on noise_std).
+    """
+
+    def __init__(self, data_shape=(32, 32, 3), n_classes=10,
+                 train_size=5000, test_size=1000, validation_set=None,
+                 validation_split=None, shuffle=False, noise_std=1.0,
+                 dtype='float32', seed=0, one_hot=True, **kwargs):
+        """
+        Args:
+            data_shape: `tuple` of `int`, shape of an image (H, W, C);
+            n_classes: `int`, number of classes;
+            train_size: `int`, number of training images (including those
+                of the validation set, if validation_split is used);
+            test_size: `int`, number of test images;
+            validation_set: `bool`.
+            validation_split: `float` or None
+                float: chunk of `train set` will be marked as `validation set`.
+                None: if 'validation set' == True, `validation set` will be
+                    copy of `test set`
+            shuffle: `bool`, should shuffle the training data on every epoch
+                or not
+            noise_std: `float`, standard deviation of the noise added to
+                the class templates
+            dtype: `str`, data type of the images (e.g. 'float32')
+            seed: `int`, seed for generating (and shuffling) the data
+            one_hot: `bool`, return labels one hot encoded
+        """
+        self._data_shape = tuple(data_shape)
+        self._n_classes = n_classes
+        rng = np.random.RandomState(seed)
+        templates = rng.normal(size=(n_classes,) + self._data_shape)
+
+        train_images, train_labels = self.generate_images_and_labels(
+            rng, templates, train_size, noise_std, dtype, one_hot)
+        test_images, test_labels = self.generate_images_and_labels(
+            rng, templates, test_size, noise_std, dtype, one_hot)
+
+        if validation_set and validation_split:
+            split_idx = int(train_images.shape[0] * (1 - validation_split))
+            self.validation = SyntheticDataSet(
+                train_images[split_idx:], train_labels[split_idx:],
+                False, seed)
+            train_images = train_images[:split_idx]
+            train_labels = train_labels[:split_idx]
+
+        self.train = SyntheticDataSet(
+            train_images, train_labels, shuffle, seed)
+        self.test = SyntheticDataSet(test_images, test_labels, False, seed)
+
+        if validation_set and not validation_split:
+            self.validation = self.test
+
+    def generate_images_and_labels(self, rng, templates, size, noise_std,
+                                   dtype, one_hot):
+        """
+        Generates images (noisy class templates) and their labels.
+
+        Args:
+            rng: `np.random.RandomState`, random generator for the data;
+            templates: 4D numpy array, the template image of each class;
+            size: `int`, number of images to generate;
+            noise_std: `float`, standard deviation of the noise;
+            dtype: `str`, data type of the images;
+            one_hot: `bool`, return labels one hot encoded.
+        """
+        labels = rng.randint(self.n_classes, size=size)
+        images = templates[labels] + noise_std * rng.normal(
+            size=(size,) + self._data_shape)
+        images = images.astype(dtype)
+        if one_hot:
+            labels = self.labels_to_one_hot(labels)
+        return images, labels
+
+    @property
+    def n_classes(self):
+        return self._n_classes
+
+    @property
+    def data_shape(self):
+        return self._data_shape
@@ -1,6 +1,7 @@
 from .cifar import Cifar10DataProvider, Cifar100DataProvider, \
     Cifar10AugmentedDataProvider, Cifar100AugmentedDataProvider
 from .svhn import SVHNDataProvider
+from .synthetic import SyntheticDataProvider
 
 
 def get_data_provider_by_name(name, train_params):
@@ -15,6 +16,8 @@ def get_data_provider_by_name(name, train_params):
         return Cifar100AugmentedDataProvider(**train_params)
     if name == 'SVHN':
         return SVHNDataProvider(**train_params)
+    if name == 'Synthetic':
+        return SyntheticDataProvider(**train_params)
     else:
         print("Sorry, data provider for `%s` dataset "
               "was not implemented yet" % name)
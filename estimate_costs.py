@@ -0,0 +1,77 @@
+import argparse
+
+from models.cost_model import get_kernel_num_list, get_layer_costs, \
+    format_layer_costs
+
+
+def parse_kernel_num_list(kernel_num_list):
+    """
+    Parses the number of kernels in each layer of each block, given as
+    layers separated by comas and blocks separated by semicolons (e.g.
+    '12,12,14;12,10').
+
+    Args:
+        kernel_num_list: `str`, the kernels in each layer of each block.
+    """
+    return [list(map(int, block.split(',')))
+            for block in kernel_num_list.split(';')]
+
+
+# Parse arguments for the program.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Estimate analytically (without building the graph) the'
+                    ' multiply-adds, parameter memory and activation memory'
+                    ' of each layer of a DenseNet architecture.')
+    parser.add_argument(
+        '--model_type', '-m', type=str, choices=['DenseNet', 'DenseNet-BC'],
+        default='DenseNet',
+        help='Model type (default: %(default)s).')
+    parser.add_argument(
+        '--growth_rate', '-k', type=int, default=12,
+        help='Growth rate (default: %(default)s).')
+    parser.add_argument(
+        '--layer_num_list', '-lnl', type=str, default='1', metavar='',
+        help='Number of layers in each block (default: %(default)s).')
+    parser.add_argument(
+        '--kernel_num_list', '-knl', type=str, default=None, metavar='',
+        help='Number of kernels in each layer of each block, as layers'
+             ' separated by comas and blocks by semicolons (e.g.'
+             ' \'12,12,14;12,10\', default: growth_rate kernels in each'
+             ' layer of layer_num_list).')
+    parser.add_argument(
+        '--reduction', '-red', '-theta', type=float, default=0.5,
+        metavar='',
+        help='Reduction (theta) at transition layer, for DenseNets-BC models'
+             ' (default: %(default)s).')
+    parser.add_argument(
+        '--image_shape', '-is', type=str, default='32,32,3', metavar='',
+        help='Shape of the images: height, width, channels (default:'
+             ' %(default)s).')
+    parser.add_argument(
+        '--n_classes', '-nc', type=int, default=10, metavar='',
+        help='Number of classes (default: %(default)s).')
+    parser.add_argument(
+        '--batch_size', '-bs', type=int, default=64, metavar='',
+        help='Number of images in a batch, for the activation memory'
+             ' (default: %(default)s).')
+    parser.add_argument(
+        '--memory-efficient', dest='should_recompute_features',
+        action='store_true',
+        help='Estimate the activations when the layers\' inputs are'
+             ' recomputed in the backward pass (NEWER_dense_net only).')
+    parser.set_defaults(should_recompute_features=False)
+    args = parser.parse_args()
+
+    bc_mode = args.model_type == 'DenseNet-BC'
+    if args.kernel_num_list is not None:
+        kernel_num_list = parse_kernel_num_list(args.kernel_num_list)
+    else:
+        kernel_num_list = get_kernel_num_list(
+            list(map(int, args.layer_num_list.split(','))), args.growth_rate)
+    layer_costs = get_layer_costs(
+        tuple(map(int, args.image_shape.split(','))), args.n_classes,
+        kernel_num_list, args.growth_rate, args.growth_rate * 2, bc_mode,
+        args.reduction if bc_mode else 1.0, args.batch_size,
+        args.should_recompute_features)
+    print(format_layer_costs(layer_costs))
@@ -1,16 +1,42 @@
 import os
+import re
 import time
 import shutil
-from collections import deque
+import tempfile
+from collections import deque, OrderedDict
 from datetime import timedelta, datetime
 
 import numpy as np
 import scipy.misc
 import tensorflow as tf
+from tensorflow.python.client import timeline
+
+from data_providers.feature_cache import allocate_features, \
+    FeatureCacheDataSet
+from .feature_log import FeatureLog
+from .metrics_store import MetricsStore
+from .profiling import aggregate_op_costs, write_layer_costs, PhaseTimer, \
+    get_process_rss, get_graph_flops
+from .cost_model import get_kernel_num_list, get_layer_costs, \
+    get_total_costs, format_layer_costs
 
 
 TF_VERSION = list(map(int, tf.__version__.split('.')[:2]))
 
+# Epsilon used by tf.contrib.layers.batch_norm (its default value).
+BN_EPSILON = 0.001
+# Buffering of the TensorBoard log writer: maximum number of queued events,
+# and maximum time (in seconds) between two writes to disk.
+SUMMARY_MAX_QUEUE = 100
+SUMMARY_FLUSH_SECS = 120
+
+# Collection for the (never run) batch norm updates of recomputed features.
+RECOMPUTED_BN_UPDATES = 'recomputed_bn_updates'
+
+# Names of the input and output nodes in exported inference graphs.
+INFERENCE_INPUT_NAME = 'input_images'
+INFERENCE_OUTPUT_NAME = 'prediction'
+
 
 class DenseNet:
 
@@ -31,6 +57,32 @@ class DenseNet:
                  renew_logs=False,
                  reduction=1.0,
                  bc_mode=False,
+                 sparse_labels=False,
+                 profile_period=0,
+                 should_time_phases=False,
+                 should_log_telemetry=False,
+                 telemetry_alarm_mb=0,
+                 log_batch_interval=50,
+                 should_use_summary_ops=False,
+                 metrics_db=None,
+                 num_eval_inter_threads=None,
+                 data_format='NHWC',
+                 should_fuse_batch_norm=False,
+                 should_use_xla=False,
+                 should_recompute_features=False,
+                 should_freeze_blocks=False,
+                 should_cache_features=False,
+                 feature_cache_mb=1024,
+                 feature_cache_dir=None,
+                 growth_init='random',
+                 kernel_prune_threshold=0,
+                 budget_mflops=0,
+                 budget_kparams=0,
+                 budget_ms=0,
+                 should_log_costs=False,
+                 memory_budget_mb=0,
+                 max_batch_size=512,
+                 ft_extra_rows=False,
                  **kwargs):
         """
         Class to implement DenseNet networks as defined in this paper:
@@ -80,7 +132,83 @@ class DenseNet:
             reduction: `float`, reduction (theta) at transition layers for
                 DenseNets with compression (DenseNet-BC);
             bc_mode: `bool`, boolean equivalent of model_type, should we use
-                bottleneck layers and compression (DenseNet-BC) or not.
+                bottleneck layers and compression (DenseNet-BC) or not;
+            sparse_labels: `bool`, are labels given as class numbers (`int`)
+                instead of one-hot vectors or not;
+            profile_period: `int`, number of training steps between two traced
+                (profiled) steps, 0 to disable profiling;
+            should_time_phases: `bool`, should the time spent in each phase of
+                the training (data fetching, training steps, validation, etc.)
+                be measured and logged for each epoch or not;
+            should_log_telemetry: `bool`, should the size of the graph
+                (nodes, variables, optimizer slots), the process memory and
+                the mean training step time be logged for each epoch or not;
+            telemetry_alarm_mb: `int`, process memory (RSS, in MB) above
+                which an alarm is printed with the telemetry (0 = no alarm);
+            log_batch_interval: `int`, number of training steps aggregated
+                (mean, min and max loss and accuracy) in each per-batch log;
+            should_use_summary_ops: `bool`, should the per-batch logs be
+                aggregated in the graph (with the training step) and written
+                by summary ops or not;
+            metrics_db: `str` or None, path of a SQLite database in which
+                the metrics of the training run (epochs, 'layer CS', growth
+                events, timings) are recorded, None to not record them;
+            num_eval_inter_threads: `int` or None, number of inter-operation
+                CPU threads used for evaluation and prediction (in their own
+                thread pool), None to use the same threads as for training;
+            data_format: `str`, layout of the feature maps in the graph,
+                'NHWC' (channels last) or 'NCHW' (channels first, only
+                supported on CPU by TensorFlow builds with MKL). The images
+                are always fed in NHWC layout;
+            should_fuse_batch_norm: `bool`, should the batch normalisations
+                use the fused implementation or not;
+            should_use_xla: `bool`, should the operations be compiled into
+                clusters by the XLA JIT compiler (auto-clustering) or not;
+            should_recompute_features: `bool`, memory-efficient mode: should
+                the concatenation, batch normalisation and ReLU at the input
+                of each dense layer (and transition layer) be recomputed
+                during the backward pass instead of being stored or not
+                (requires TensorFlow >= 1.12);
+            should_freeze_blocks: `bool`, should the previous blocks be
+                frozen (no longer trained, no gradients computed through
+                them, and their batch norms in inference mode) when a new
+                block is added or not;
+            should_cache_features: `bool`, when blocks are frozen, should
+                their outputs for each training image be computed once and
+                cached (so that only the last block is computed when
+                training) or not. Only for datasets without augmentation;
+            feature_cache_mb: `int`, maximum size (in MB) of the feature
+                cache in memory, larger caches are memory-mapped on disk;
+            feature_cache_dir: `str` or None, directory of memory-mapped
+                feature caches, None for the system's temporary directory;
+            growth_init: `str`, initialisation of the weights added to the
+                last block by self-construction: 'random' (MSRA kernels and
+                Xavier FC weights) or 'preserving' (copied kernels and zero
+                FC weights, so that the network's function is preserved);
+            kernel_prune_threshold: `float`, when the self-construction of a
+                block ends, the kernels in its last layer with a mean
+                absolute weight below this fraction of the layer's highest
+                one are removed (0 to keep all the kernels), and the network
+                is trained for one more epoch if the training ends there;
+            budget_mflops: `float`, compute budget of the network in FLOPs
+                per image (in millions), self-construction refuses any growth
+                that would exceed it (0 for no budget);
+            budget_kparams: `float`, compute budget in parameters (in
+                thousands, 0 for no budget);
+            budget_ms: `float`, compute budget in inference time per image
+                (in ms, 0 for no budget);
+            should_log_costs: `bool`, should the analytically estimated costs
+                (multiply-adds, parameter and activation memory) of the
+                network be logged for each epoch and growth event or not;
+            memory_budget_mb: `float`, memory budget (in MB) of the training,
+                the batch size is adapted to it after each growth event, and
+                the learning rate scaled accordingly (0 for a fixed batch
+                size);
+            max_batch_size: `int`, maximum batch size when it is adapted to
+                the memory budget;
+            ft_extra_rows: `bool`, should the rows other than the epochs'
+                features and the total training time (e.g. phase times,
+                telemetry, costs) be written to the CSV feature log or not.
         """
         # Main DenseNet and DenseNet-BC parameters.
         self.creation_time = datetime.now().strftime("%Y_%m_%d_%H%M%S")
@@ -90,6 +218,40 @@ class DenseNet:
         self.growth_rate = growth_rate
         self.num_inter_threads = num_inter_threads
         self.num_intra_threads = num_intra_threads
+        self.num_eval_inter_threads = num_eval_inter_threads
+        # Layout of the feature maps, and the axes of channels and width.
+        self.data_format = data_format
+        if data_format == 'NCHW':
+            self.channel_axis, self.width_axis = 1, 3
+        else:
+            self.channel_axis, self.width_axis = 3, 2
+        self.should_fuse_batch_norm = should_fuse_batch_norm
+        self.should_use_xla = should_use_xla
+        self.should_recompute_features = should_recompute_features
+        # Number of frozen blocks (at the start of the network).
+        self.should_freeze_blocks = should_freeze_blocks
+        self.frozen_blocks = 0
+        # Cache of the frozen blocks' outputs (rebuilt for each new block).
+        self.should_cache_features = should_cache_features
+        self.feature_cache_mb = feature_cache_mb
+        self.feature_cache_dir = feature_cache_dir or tempfile.gettempdir()
+        self.feature_cache = None
+        self.growth_init = growth_init
+        # Removal of negligible kernels, and the variables no longer used.
+        self.kernel_prune_threshold = kernel_prune_threshold
+        self.removed_variables = set()
+        # Compute budget (ceilings on the costs of the network).
+        self.budget_mflops = budget_mflops
+        self.budget_kparams = budget_kparams
+        self.budget_ms = budget_ms
+        # Inference time per MFLOP (and the MFLOPs for which it was measured)
+        self.ms_per_mflop = None
+        self.should_log_costs = should_log_costs
+        # Memory budget for the training (the batch size is adapted to it).
+        self.memory_budget_mb = memory_budget_mb
+        self.max_batch_size = max_batch_size
+        # Operation that masks pruned connections (when fine-tuning them).
+        self.connection_mask_op = None
         # Number of outputs (feature maps) produced by the initial convolution
         # (2*k, same value as in the original Torch code).
         self.first_output_features = growth_rate * 2
@@ -97,6 +259,7 @@ class DenseNet:
         self.total_blocks = len(self.layer_num_list)
         self.bc_mode = bc_mode
         self.reduction = reduction
+        self.sparse_labels = sparse_labels
 
         print("Build %s model with %d blocks, "
               "The number of layers in each block is:" % (
@@ -163,13 +326,32 @@ class DenseNet:
         self.ftd = ft_decimal
         self.ft_filters = ft_filters
         self.ft_cross_entropies = ft_cross_entropies
+        self.ft_extra_rows = ft_extra_rows
 
         self.should_save_model = should_save_model
         self.should_save_images = should_save_images
         self.renew_logs = renew_logs
         self.batches_step = 0
+        self.log_batch_interval = max(1, log_batch_interval)
+        self.should_use_summary_ops = should_use_summary_ops
+        self.metrics_store = None
+        if metrics_db:
+            self.metrics_store = MetricsStore(metrics_db)
+        self.current_epoch = 0
+
+        # Step-level profiling parameters.
+        self.profile_period = profile_period
+        self.profiled_costs = OrderedDict()
+        self.phase_timer = PhaseTimer(enabled=should_time_phases)
+
+        # Graph and memory telemetry parameters.
+        self.should_log_telemetry = should_log_telemetry
+        self.telemetry_alarm_mb = telemetry_alarm_mb
+        self.mean_step_time = 0
 
         self._define_inputs()
+        if self.should_use_summary_ops:
+            self._define_batch_summary_ops()
         self._build_graph()
         self._initialize_session()
         self._count_useful_trainable_params()
@@ -207,7 +389,10 @@ class DenseNet:
             os.makedirs(images_path, exist_ok=True)
         self._images_path = images_path
 
-        return save_path, logs_path, ft_logs_path, images_path
+        export_path = 'exports/%s' % self.model_identifier
+        self._export_path = export_path
+
+        return save_path, logs_path, ft_logs_path, images_path, export_path
 
     @property
     def model_identifier(self):
@@ -278,6 +463,18 @@ class DenseNet:
             images_path = self.update_paths()[3]
         return images_path
 
+    @property
+    def export_path(self):
+        """
+        Returns a path where the inference graph for the current model should
+        be exported.
+        """
+        try:
+            export_path = self._export_path
+        except AttributeError:
+            export_path = self.update_paths()[4]
+        return export_path
+
     def save_model(self, global_step=None):
         """
         Saves the current trained model at the proper path, using the saver.
@@ -326,7 +523,164 @@ class DenseNet:
         ])
         self.summary_writer.add_summary(summary, epoch)
 
-    def ft_log_filters(self, b, cs_table_ls, lcs_dst, lcs_src):
+    def log_batch_interval_stats(self, losses, accuracies, step):
+        """
+        Writes a single log for the loss (cross_entropy) and accuracy of
+        several training batches: their mean value is logged with the same
+        tags as in log_loss_accuracy ('per_batch' prefix), and their min and
+        max values with the '_min' and '_max' suffixes.
+
+        Args:
+            losses: `list` of `float`, losses for the aggregated batches;
+            accuracies: `list` of `float`, accuracies for the same batches;
+            step: `int`, current training step (last aggregated batch).
+        """
+        values = []
+        for name, batch_values in [('loss', losses),
+                                   ('accuracy', accuracies)]:
+            values.append(tf.Summary.Value(
+                tag='%s_per_batch' % name,
+                simple_value=float(np.mean(batch_values))))
+            if len(batch_values) > 1:
+                values.append(tf.Summary.Value(
+                    tag='%s_per_batch_min' % name,
+                    simple_value=float(np.min(batch_values))))
+                values.append(tf.Summary.Value(
+                    tag='%s_per_batch_max' % name,
+                    simple_value=float(np.max(batch_values))))
+        self.summary_writer.add_summary(tf.Summary(value=values), step)
+
+    def write_batch_summary(self):
+        """
+        Writes the per-batch log aggregated in the graph for the training
+        steps since the last one (see _define_batch_summary_ops), and
+        restarts the aggregation.
+        """
+        self.summary_writer.add_summary(
+            self.sess.run(self.batch_summary), self.batches_step)
+        self.sess.run(self.batch_log_reset)
+
+    def log_phase_times(self, phase_times, epoch, train_examples,
+                        eval_examples):
+        """
+        Prints and writes a log of the time spent in each phase of a training
+        epoch (data fetching, training steps, validation, feature analysis,
+        checkpointing, logging, growth events), as well as the number of
+        images per second processed during training and evaluation.
+        These are written to the TensorBoard logs and to the feature log,
+        if they are being saved.
+
+        Args:
+            phase_times: `dict`, time (in seconds) spent in each phase;
+            epoch: `int`, current training epoch;
+            train_examples: `int`, number of examples used in training;
+            eval_examples: `int`, number of examples used in validation.
+        """
+        phase_times = OrderedDict(phase_times)
+        train_time = (phase_times.get('data_fetch', 0) +
+                      phase_times.get('train_step', 0))
+        if train_time > 0:
+            phase_times['train_images_per_sec'] = train_examples / train_time
+        if phase_times.get('validation', 0) > 0:
+            phase_times['eval_images_per_sec'] = (
+                eval_examples / phase_times['validation'])
+
+        print("Phase times: %s" % ', '.join(
+            '%s = %.3f%s' % (phase, value, '' if 'per_sec' in phase else 's')
+            for phase, value in phase_times.items()))
+        if self.should_save_logs:
+            summary = tf.Summary(value=[
+                tf.Summary.Value(tag='time_%s' % phase,
+                                 simple_value=float(value))
+                for phase, value in phase_times.items()])
+            self.summary_writer.add_summary(summary, epoch)
+        if self.should_save_ft_logs:
+            self.feature_log.add_row('Phase times', epoch, phase_times)
+        if self.metrics_store is not None:
+            self.metrics_store.log_timings(epoch, phase_times)
+
+    def save_feature_log(self):
+        """
+        Writes all pending rows of the feature log to its file and to the
+        CSV feature log.
+        """
+        self.feature_log.close()
+
+    def get_run_params(self, train_params):
+        """
+        Returns a `dict` with the parameters of a training run (model,
+        self-construction and training parameters), as recorded in the
+        metrics database.
+
+        Args:
+            train_params: `dict`, the training parameters (see
+                train_all_epochs).
+        """
+        run_params = OrderedDict([
+            ('layer_num_list', ','.join(map(str, self.layer_num_list))),
+            ('keep_prob', self.keep_prob),
+            ('weight_decay', self.weight_decay),
+            ('nesterov_momentum', self.nesterov_momentum),
+            ('reduction', self.reduction),
+            ('should_self_construct', self.should_self_construct),
+            ('should_change_lr', self.should_change_lr),
+            ('block_count', self.block_count),
+            ('layer_cs', self.layer_cs)])
+        if self.should_self_construct:
+            run_params.update([
+                ('self_constructing_var', self.sc_var),
+                ('asc_thresh', self.asc_thresh),
+                ('patience_param', self.patience_param),
+                ('std_tolerance', self.std_tolerance),
+                ('std_window', self.std_window),
+                ('expansion_rate', self.expansion_rate)])
+        run_params.update(train_params)
+        return run_params
+
+    def log_growth_event(self, event, kernels, duration):
+        """
+        Records a growth event in the metrics database (if there is one),
+        for the last layer of the last block.
+
+        Args:
+            event: `str`, 'layer', 'block', 'kernels' or 'removed_kernels';
+            kernels: `int`, number of kernels added (or removed);
+            duration: `float`, duration of the event (in seconds).
+        """
+        if self.metrics_store is not None:
+            self.metrics_store.log_growth_event(
+                self.current_epoch, event, self.total_blocks-1,
+                self.layer_num_list[-1]-1, kernels, duration)
+
+    def save_step_profile(self, run_metadata, step):
+        """
+        Saves the profile of a traced training step in the logs directory:
+        a Chrome trace (JSON, viewable at chrome://tracing) and a table with
+        the op costs aggregated by layer (variable scope, e.g.
+        'Block_0/layer_3'), as well as a table with the costs aggregated
+        over all the profiled steps.
+
+        Args:
+            run_metadata: `RunMetadata`, collected when running the step;
+            step: `int`, number of the training step (batch).
+        """
+        profile_path = '%s/profile' % self.logs_path
+        os.makedirs(profile_path, exist_ok=True)
+        step_timeline = timeline.Timeline(run_metadata.step_stats)
+        with open('%s/timeline_step_%d.json' % (profile_path, step), 'w') as f:
+            f.write(step_timeline.generate_chrome_trace_format())
+
+        step_costs = aggregate_op_costs(run_metadata.step_stats)
+        aggregate_op_costs(run_metadata.step_stats, self.profiled_costs)
+        write_layer_costs(
+            step_costs, '%s/layer_costs_step_%d.txt' % (profile_path, step),
+            title='Op costs for training step %d (%s)' % (
+                step, self.model_identifier))
+        write_layer_costs(
+            self.profiled_costs, '%s/layer_costs_total.txt' % profile_path,
+            title='Op costs over all profiled training steps')
+
+    def ft_log_filters(self, b, cs_table_ls, lcs_dst, lcs_src, epoch):
         """
         Write a feature log with data concerning filters: the CS of every
         connection in a given block, the 'layer CS' (relevance or spread) for
@@ -339,7 +693,8 @@ class DenseNet:
             lcs_dst: `list` of `float`, 'layer CS' for destinations
                 for all layers in the block;
             lcs_src: `list` of `float`, 'layer CS' for sources
-                for all layers in the block.
+                for all layers in the block;
+            epoch: `int`, current training epoch (-1 when testing).
         """
         # printing and saving the data to feature logs
         for l in range(self.layer_num_list[b]):
@@ -362,23 +717,22 @@ class DenseNet:
                 self.layer_cs.capitalize(), lcs_src[l]))
 
             if self.should_save_ft_logs:
-                # write all of the above in the feature log
-                self.feature_writer.write(('%s\"%f\"' % (self.ftc, lcs_dst[l])
-                                           ).replace(".", self.ftd))
-                self.feature_writer.write('%s\"\"' % self.ftc)
-                for d in range(l, self.layer_num_list[b]):
-                    self.feature_writer.write((
-                        '%s\"%f\"' % (self.ftc, cs_table_ls[d][l]/max(
-                            fwd[l] for fwd in cs_table_ls if len(fwd) > l))
-                        ).replace(".", self.ftd))
-                self.feature_writer.write('%s\"\"' % self.ftc)
-                for s in range(len(cs_table_ls[l])):
-                    self.feature_writer.write(('%s\"%f\"' % (
-                        self.ftc, cs_table_ls[l][s]/max(cs_table_ls[l]))
-                        ).replace(".", self.ftd))
-                self.feature_writer.write('%s\"\"' % self.ftc)
-                self.feature_writer.write(('%s\"%f\"' % (self.ftc, lcs_src[l])
-                                           ).replace(".", self.ftd))
+                # add all of the above to the feature log
+                cs_dst = np.array([cs_table_ls[d][l] for d in range(
+                    l, self.layer_num_list[b])])
+                cs_src = np.array(cs_table_ls[l])
+                self.feature_log.add_values('lcs_dst', lcs_dst[l], b, l)
+                self.feature_log.add_values(
+                    'cs_dst', cs_dst / max(
+                        fwd[l] for fwd in cs_table_ls if len(fwd) > l), b, l)
+                self.feature_log.add_values(
+                    'cs_src', cs_src / cs_src.max(), b, l)
+                self.feature_log.add_values('lcs_src', lcs_src[l], b, l)
+
+        # the layer CS is only recorded during training (in the run)
+        if (self.metrics_store is not None and
+                self.metrics_store.run_id is not None and epoch >= 0):
+            self.metrics_store.log_layer_cs(epoch, b, lcs_dst, lcs_src)
 
     # -------------------------------------------------------------------------
     # ----------------------- PROCESSING FEATURE VALUES -----------------------
@@ -626,7 +980,7 @@ class DenseNet:
     def _define_inputs(self):
         """
         Defines some imput placeholder tensors:
-        images, labels, learning_rate, is_training.
+        images, labels, learning_rate, is_training, frozen_blocks_input.
         """
         shape = [None]
         shape.extend(self.data_shape)
@@ -634,15 +988,62 @@ class DenseNet:
             tf.float32,
             shape=shape,
             name='input_images')
-        self.labels = tf.placeholder(
-            tf.float32,
-            shape=[None, self.n_classes],
-            name='labels')
+        if self.sparse_labels:
+            self.labels = tf.placeholder(
+                tf.int64,
+                shape=[None],
+                name='labels')
+        else:
+            self.labels = tf.placeholder(
+                tf.float32,
+                shape=[None, self.n_classes],
+                name='labels')
         self.learning_rate = tf.placeholder(
             tf.float32,
             shape=[],
             name='learning_rate')
         self.is_training = tf.placeholder(tf.bool, shape=[])
+        # number of frozen blocks (fed when training)
+        self.frozen_blocks_input = tf.placeholder_with_default(
+            0, shape=[], name='frozen_blocks')
+
+    def _define_batch_summary_ops(self):
+        """
+        Defines the variables in which the loss (cross_entropy) and accuracy
+        of the training steps are aggregated (sum, min and max) for the
+        per-batch logs, and the summary ops for their mean, min and max
+        (with the same tags as in log_batch_interval_stats).
+        These are only defined once (the accumulation ops are defined with
+        the training step), so that their tags do not change when the
+        network grows.
+        """
+        # the aggregated values are local variables (not saved)
+        with tf.variable_scope('Batch_logs'):
+            self.batch_log_count = tf.Variable(
+                0., trainable=False, name='count',
+                collections=[tf.GraphKeys.LOCAL_VARIABLES])
+            self.batch_log_stats = OrderedDict()
+            for name in ['loss', 'accuracy']:
+                self.batch_log_stats[name] = OrderedDict(
+                    (stat, tf.Variable(
+                        initial_value, trainable=False,
+                        name='%s_%s' % (name, stat),
+                        collections=[tf.GraphKeys.LOCAL_VARIABLES]))
+                    for stat, initial_value in [
+                        ('sum', 0.), ('min', np.inf), ('max', -np.inf)])
+        self.batch_log_reset = tf.local_variables_initializer()
+        # summaries merged explicitly (not from the graph's collection)
+        summaries = []
+        for name, stats in self.batch_log_stats.items():
+            summaries.append(tf.summary.scalar(
+                '%s_per_batch' % name, stats['sum'] / self.batch_log_count,
+                collections=[]))
+            if self.log_batch_interval > 1:
+                summaries.append(tf.summary.scalar(
+                    '%s_per_batch_min' % name, stats['min'], collections=[]))
+                summaries.append(tf.summary.scalar(
+                    '%s_per_batch_max' % name, stats['max'], collections=[]))
+        self.batch_summary = tf.summary.merge(summaries)
 
     # -------------------------------------------------------------------------
     # ---------------------- BUILDING THE DENSENET GRAPH ----------------------
@@ -667,32 +1068,130 @@ class DenseNet:
             shape=shape,
             initializer=tf.contrib.layers.variance_scaling_initializer())
 
-    def avg_pool(self, _input, k):
+    def weight_variable_copy(self, value, name, noise=0.01):
+        """
+        Creates weights initialized as a copy of some given values, plus a
+        small random noise (to break the symmetry between the copies).
+
+        Args:
+            value: `np.ndarray`, the values to copy;
+            name: `str`, a name for identifying the weights;
+            noise: `float`, std of the noise, relative to the values' std.
+        """
+        initial = value + np.random.normal(
+            scale=noise * np.std(value), size=value.shape)
+        return tf.get_variable(
+            name=name, initializer=tf.constant(initial.astype(np.float32)))
+
+    def unused_variable_name(self, prefix):
+        """
+        Returns the first name prefix+str(i) (i = 0, 1, ...) that is not used
+        by any variable in the current variable scope. Removed kernels and FC
+        weights remain in the graph, so their names cannot be reused.
+
+        Args:
+            prefix: `str`, the name's prefix (e.g. 'kernel').
+        """
+        scope = tf.get_variable_scope().name
+        used_names = set(var.op.name for var in tf.get_collection(
+            tf.GraphKeys.GLOBAL_VARIABLES))
+        i = 0
+        while (scope + '/' if scope else '') + prefix + str(i) in used_names:
+            i += 1
+        return prefix + str(i)
+
+    def avg_pool(self, _input, k, data_format=None):
         """
         Performs average pooling on a given input (_input),
         within square kernels of side k and stride k.
 
         Args:
             _input: tensor, the operation's input;
-            k: `int`, the size and stride for the kernels.
+            k: `int`, the size and stride for the kernels;
+            data_format: `str` or None, layout of the input ('NHWC' or
+                'NCHW'), None for the graph's data_format.
         """
-        ksize = [1, k, k, 1]
-        strides = [1, k, k, 1]
+        data_format = data_format or self.data_format
+        if data_format == 'NCHW':
+            ksize = [1, 1, k, k]
+        else:
+            ksize = [1, k, k, 1]
+        strides = ksize
         padding = 'VALID'
-        output = tf.nn.avg_pool(_input, ksize, strides, padding)
+        output = tf.nn.avg_pool(_input, ksize, strides, padding,
+                                data_format=data_format)
         return output
 
-    def batch_norm(self, _input, scope='BatchNorm'):
+    def batch_norm(self, _input, scope='BatchNorm', should_update=True):
         """
         Performs batch normalisation on a given input (_input).
+        The batch normalisations of frozen blocks (and of the transition
+        layers between them) are always in inference mode: they use their
+        moving mean and variance, which are no longer updated.
 
         Args:
             _input: tensor, the operation's input.
-            scope: `str`, a variable scope for the operation.
+            scope: `str`, a variable scope for the operation;
+            should_update: `bool`, should the moving mean and variance be
+                updated when training or not (they are not updated when the
+                batch normalisation is recomputed in the backward pass).
         """
+        if should_update:
+            updates_collections = None
+        else:
+            updates_collections = [RECOMPUTED_BN_UPDATES]
+        is_training = self.is_training
+        if self.should_freeze_blocks:
+            # the part of the network (block b, or transition layer after
+            # block b-1) is frozen if b is below the number of frozen blocks
+            match = re.match(r'(Block|Transition_after_block)_(\d+)(/|$)',
+                             tf.get_variable_scope().name)
+            if match:
+                part = int(match.group(2)) + (match.group(1) != 'Block')
+                is_training = tf.logical_and(
+                    is_training,
+                    tf.greater_equal(part, self.frozen_blocks_input))
         output = tf.contrib.layers.batch_norm(
-            _input, scale=True, is_training=self.is_training,
-            updates_collections=None, scope=scope)
+            _input, scale=True, is_training=is_training,
+            updates_collections=updates_collections, scope=scope,
+            fused=self.should_fuse_batch_norm, data_format=self.data_format)
+        return output
+
+    def bn_relu(self, _input, features=None):
+        """
+        Performs batch normalisation and the ReLU activation function on a
+        given input (_input).
+        In memory-efficient mode, if the features whose concatenation is the
+        input are given, the concatenation, batch normalisation and ReLU are
+        recomputed from these features during the backward pass, instead of
+        being stored (so that the memory needed by a block's activations
+        grows linearly with its depth instead of quadratically).
+
+        Args:
+            _input: tensor, the operation's input;
+            features: `list` of tensors or None, the features whose
+                concatenation (along the channel axis) is the input.
+        """
+        if not self.should_recompute_features or not features:
+            return tf.nn.relu(self.batch_norm(_input))
+
+        # the function is called once for the forward pass, and once more
+        # for each gradient computation (where the statistics of the batch
+        # norm must not be updated again)
+        calls = []
+
+        def concat_bn_relu(*features):
+            should_update = not calls
+            calls.append(True)
+            output = tf.concat(axis=self.channel_axis, values=features)
+            output = self.batch_norm(output, should_update=should_update)
+            return tf.nn.relu(output)
+
+        # variables in functions with custom gradients must be resources
+        with tf.variable_scope(tf.get_variable_scope(), use_resource=True,
+                               auxiliary_name_scope=False):
+            output = tf.contrib.layers.recompute_grad(concat_bn_relu)(
+                *features)
         return output
 
     def conv2d(self, _input, out_features, kernel_size,
@@ -709,11 +1208,12 @@ class DenseNet:
             strides: `list` of `int`, strides in each direction for kernels;
             padding: `str`, should we use padding ('SAME') or not ('VALID').
         """
-        in_features = int(_input.get_shape()[-1])
+        in_features = int(_input.get_shape()[self.channel_axis])
         filter_ref = self.weight_variable_msra(
             [kernel_size, kernel_size, in_features, out_features],
             name='filter')
-        output = tf.nn.conv2d(_input, filter_ref, strides, padding)
+        output = tf.nn.conv2d(_input, filter_ref, strides, padding,
+                              data_format=self.data_format)
         return output, filter_ref
 
     def conv2d_with_kernels(self, _input, out_features, kernel_size,
@@ -731,7 +1231,7 @@ class DenseNet:
             strides: `list` of `int`, strides in each direction for kernels;
             padding: `str`, should we use padding ('SAME') or not ('VALID').
         """
-        in_features = int(_input.get_shape()[-1])
+        in_features = int(_input.get_shape()[self.channel_axis])
         # First create a list with the 3d kernels (easily modifiable):
         kernels = []
         for o in range(out_features):
@@ -741,7 +1241,8 @@ class DenseNet:
         # (dimension 3 = output features).
         filter_ref = tf.stack(kernels, axis=3, name='filter')
         # Using the filter, the convolution is defined.
-        output = tf.nn.conv2d(_input, filter_ref, strides, padding)
+        output = tf.nn.conv2d(_input, filter_ref, strides, padding,
+                              data_format=self.data_format)
         return output, filter_ref, kernels
 
     def conv2d_with_given_kernels(self, _input, kernels,
@@ -761,7 +1262,8 @@ class DenseNet:
         # The kernels are stacked together so as to create a 4d filter.
         # Using the same name = good idea?
         filter_ref = tf.stack(kernels, axis=3, name='filter')
-        output = tf.nn.conv2d(_input, filter_ref, strides, padding)
+        output = tf.nn.conv2d(_input, filter_ref, strides, padding,
+                              data_format=self.data_format)
         return output, filter_ref
 
     def dropout(self, _input):
@@ -814,7 +1316,8 @@ class DenseNet:
     # COMPOSITE FUNCTION + BOTTLENECK -----------------------------------------
     # -------------------------------------------------------------------------
 
-    def composite_function(self, _input, out_features, kernel_size=3):
+    def composite_function(self, _input, out_features, kernel_size=3,
+                           features=None):
         """
         Composite function H_l([x_0, ..., x_l-1]) for a dense layer.
 
@@ -830,13 +1333,13 @@ class DenseNet:
         Args:
             _input: tensor, the operation's input;
             out_features: `int`, number of feature maps at the output;
-            kernel_size: `int`, size of the square kernels (their side).
+            kernel_size: `int`, size of the square kernels (their side);
+            features: `list` of tensors or None, the features concatenated
+                in the input (recomputed in memory-efficient mode).
         """
         with tf.variable_scope("composite_function"):
-            # batch normalisation
-            in_cv = self.batch_norm(_input)
-            # ReLU activation function
-            in_cv = tf.nn.relu(in_cv)
+            # batch normalisation and ReLU activation function
+            in_cv = self.bn_relu(_input, features)
             # 2d convolution
             output, filter_ref, kernels = self.conv2d_with_kernels(
                 in_cv, out_features=out_features, kernel_size=kernel_size)
@@ -860,7 +1363,7 @@ class DenseNet:
         output = self.dropout(output)
         return output, filter_ref
 
-    def bottleneck(self, _input, out_features):
+    def bottleneck(self, _input, out_features, features=None):
         """
         Bottleneck function, used before the composite function H_l in the
         dense layers of DenseNet-BC.
@@ -875,13 +1378,12 @@ class DenseNet:
         Args:
             _input: tensor, the operation's input;
             out_features: `int`, number of feature maps at the output of H_l;
-            kernel_size: `int`, size of the square kernels (their side).
+            features: `list` of tensors or None, the features concatenated
+                in the input (recomputed in memory-efficient mode).
         """
         with tf.variable_scope("bottleneck"):
-            # batch normalisation
-            output = self.batch_norm(_input)
-            # ReLU activation function
-            output = tf.nn.relu(output)
+            # batch normalisation and ReLU activation function
+            output = self.bn_relu(_input, features)
             inter_features = out_features * 4
             # 2d convolution (produces intermediate features)
             output, filter_ref = self.conv2d(
@@ -914,23 +1416,74 @@ class DenseNet:
         with tf.variable_scope("layer_%d" % layer):
             with tf.variable_scope("composite_function"):
                 # create kernel_num new kernels
-                in_features = int(in_cv.get_shape()[-1])
+                in_features = int(in_cv.get_shape()[self.channel_axis])
+                # function-preserving growth: copy random existing kernels
+                if self.growth_init == 'preserving':
+                    kernel_values = self.sess.run(
+                        self.kernels_ref_list[-1][-1])
                 for new_k in range(kernel_num):
-                    self.kernels_ref_list[-1][-1].append(
-                        self.weight_variable_msra(
-                            [kernel_size, kernel_size, in_features],
-                            name='kernel'+str(
-                                len(self.kernels_ref_list[-1][-1])+new_k)))
+                    name = self.unused_variable_name('kernel')
+                    if self.growth_init == 'preserving':
+                        self.kernels_ref_list[-1][-1].append(
+                            self.weight_variable_copy(kernel_values[
+                                np.random.randint(len(kernel_values))], name))
+                    else:
+                        self.kernels_ref_list[-1][-1].append(
+                            self.weight_variable_msra(
+                                [kernel_size, kernel_size, in_features],
+                                name=name))
                 # reconstruct the composite function from the current kernels
                 comp_out, filter_ref = self.reconstruct_composite_function(
                     in_cv, self.kernels_ref_list[-1][-1])
                 # save a reference to the composite function's filter
                 self.filter_ref_list[-1][-1] = filter_ref
+            # the layer's output replaces the previous one in the features
+            self.block_features[-1] = comp_out
             # concatenate output with layer input to ensure DenseNet paradigm
             if TF_VERSION[0] >= 1 and TF_VERSION[1] >= 0:
-                output = tf.concat(axis=3, values=(_input, comp_out))
+                output = tf.concat(axis=self.channel_axis,
+                                   values=(_input, comp_out))
             else:
-                output = tf.concat(3, (_input, comp_out))
+                output = tf.concat(self.channel_axis, (_input, comp_out))
+        return output
+
+    def remove_kernels_from_layer(self, _input, in_cv, layer, kept_kernels):
+        """
+        Removes convolution kernels from a layer within a block:
+        keeps only some of its kernels, reconstructs the composite function,
+        and concatenates outputs to ensure the DenseNet paradigm.
+        Returns the layer's new output tensor.
+        N.B.: This function is meant to be used ONLY in self-constructing mode
+            (i.e. when should_self_construct is true), on the last layer.
+
+        Args:
+            _input: tensor, the layer's input;
+            in_cv: tensor, the input for the layer's convolution;
+            layer: `int`, identifier number for this layer (within a block);
+            kept_kernels: `list` of `int`, indexes of the kernels to keep.
+        """
+        with tf.variable_scope("layer_%d" % layer):
+            with tf.variable_scope("composite_function"):
+                kernels = self.kernels_ref_list[-1][-1]
+                # the removed kernels remain in the graph, but are not used
+                self.removed_variables.update(
+                    kernels[k].name for k in range(len(kernels))
+                    if k not in kept_kernels)
+                self.kernels_ref_list[-1][-1] = [kernels[k]
+                                                 for k in kept_kernels]
+                # reconstruct the composite function from the kept kernels
+                comp_out, filter_ref = self.reconstruct_composite_function(
+                    in_cv, self.kernels_ref_list[-1][-1])
+                # save a reference to the composite function's filter
+                self.filter_ref_list[-1][-1] = filter_ref
+            # the layer's output replaces the previous one in the features
+            self.block_features[-1] = comp_out
+            # concatenate output with layer input to ensure DenseNet paradigm
+            if TF_VERSION[0] >= 1 and TF_VERSION[1] >= 0:
+                output = tf.concat(axis=self.channel_axis,
+                                   values=(_input, comp_out))
+            else:
+                output = tf.concat(self.channel_axis, (_input, comp_out))
         return output
 
     def add_internal_layer(self, _input, layer, growth_rate):
@@ -949,15 +1502,18 @@ class DenseNet:
             layer: `int`, identifier number for this layer (within a block);
             growth_rate: `int`, number of new convolutions per dense layer.
         """
+        # the features concatenated in the input (all previous outputs)
+        features = list(self.block_features)
         with tf.variable_scope("layer_%d" % layer):
             # use the composite function H_l (3x3 kernel conv)
             if not self.bc_mode:
                 comp_out, filter_ref, kernels, in_cv = self.composite_function(
-                    _input, out_features=growth_rate, kernel_size=3)
+                    _input, out_features=growth_rate, kernel_size=3,
+                    features=features)
             # in DenseNet-BC mode, add a bottleneck layer before H_l (1x1 conv)
             elif self.bc_mode:
                 bottleneck_out, filter_ref = self.bottleneck(
-                    _input, out_features=growth_rate)
+                    _input, out_features=growth_rate, features=features)
                 if self.ft_filters or self.should_self_construct:
                     self.filter_ref_list[-1].append(filter_ref)
                 comp_out, filter_ref, kernels, in_cv = self.composite_function(
@@ -966,11 +1522,13 @@ class DenseNet:
             if self.ft_filters or self.should_self_construct:
                 self.filter_ref_list[-1].append(filter_ref)
                 self.kernels_ref_list[-1].append(kernels)
+            self.block_features.append(comp_out)
             # concatenate output of H_l with layer input (all previous outputs)
             if TF_VERSION[0] >= 1 and TF_VERSION[1] >= 0:
-                output = tf.concat(axis=3, values=(_input, comp_out))
+                output = tf.concat(axis=self.channel_axis,
+                                   values=(_input, comp_out))
             else:
-                output = tf.concat(3, (_input, comp_out))
+                output = tf.concat(self.channel_axis, (_input, comp_out))
         return output, in_cv
 
     def add_block(self, _input, block, growth_rate, layers_in_block, is_last):
@@ -993,6 +1551,8 @@ class DenseNet:
             self.kernels_ref_list.append([])
         if is_last:
             self.cross_entropy = []
+        # outputs of the block's input and of each of its layers
+        self.block_features = [_input]
 
         with tf.variable_scope("Block_%d" % block) as self.current_block:
             output = _input
@@ -1035,10 +1595,12 @@ class DenseNet:
         """
         with tf.variable_scope("Transition_after_block_%d" % block):
             # add feature map compression in DenseNet-BC mode
-            out_features = int(int(_input.get_shape()[-1]) * self.reduction)
+            out_features = int(
+                int(_input.get_shape()[self.channel_axis]) * self.reduction)
             # use the composite function H_l (1x1 kernel conv)
             output, filter_ref, kernels, in_cv = self.composite_function(
-                _input, out_features=out_features, kernel_size=1)
+                _input, out_features=out_features, kernel_size=1,
+                features=self.block_features)
             # save a reference to the composite function's filter
             if self.ft_filters or self.should_self_construct:
                 self.filter_ref_list[-1].append(filter_ref)
@@ -1063,7 +1625,7 @@ class DenseNet:
             _input: tensor, the operation's input;
             block: `int`, identifier number for the last block.
         """
-        self.features_total = int(_input.get_shape()[-1])
+        self.features_total = int(_input.get_shape()[self.channel_axis])
 
         with tf.variable_scope("Transition_to_FC_block_%d" % block,
                                reuse=tf.AUTO_REUSE):
@@ -1073,7 +1635,7 @@ class DenseNet:
             # ReLU activation function.
             output = tf.nn.relu(output)
             # Wide average pooling.
-            last_pool_kernel = int(output.get_shape()[-2])
+            last_pool_kernel = int(output.get_shape()[self.width_axis])
             output = self.avg_pool(output, k=last_pool_kernel)
             # Reshaping the output into 1d.
             output = tf.reshape(output, [-1, self.features_total])
@@ -1089,17 +1651,28 @@ class DenseNet:
         logits = tf.matmul(output, stacked_FC_W) + self.FC_bias
         return logits
 
-    def reconstruct_transition_to_classes(self, _input, block):
+    def reconstruct_transition_to_classes(self, _input, block,
+                                          kept_features=None):
         """
         Reconstruct the transition layer to classes after adding a new kernel
         or layer in the last block (in such a case, the transition layer must
-        remain mostly unchanged except for the new weights).
+        remain mostly unchanged except for the new weights), or after removing
+        kernels from the last layer (only the weights of the kept features
+        are then preserved).
 
         Args:
             _input: tensor, the operation's input;
-            block: `int`, identifier number for the last block.
-        """
-        new_features_total = int(_input.get_shape()[-1])
+            block: `int`, identifier number for the last block;
+            kept_features: `list` of `int` or None, indexes of the previous
+                input features that are kept (None if none were removed).
+        """
+        new_features_total = int(_input.get_shape()[self.channel_axis])
+        # indexes of the previous features (params) that are copied
+        if kept_features is None:
+            kept_features = list(range(self.features_total))
+            is_shrinking = False
+        else:
+            is_shrinking = True
         with tf.variable_scope("Transition_to_FC_block_%d" % block,
                                reuse=tf.AUTO_REUSE):
             # The batch norm contains beta and gamma params for each kernel,
@@ -1124,26 +1697,56 @@ class DenseNet:
             # the remaining new values for the new kernels.
             new_beta_values = self.sess.run(new_beta)
             new_gamma_values = self.sess.run(new_gamma)
-            difference = new_features_total-self.features_total
-            new_beta_values[:-difference] = beta_values
-            new_gamma_values[:-difference] = gamma_values
+            kept_total = len(kept_features)
+            new_beta_values[:kept_total] = beta_values[kept_features]
+            new_gamma_values[:kept_total] = gamma_values[kept_features]
             # Then we assign the modified values to reconstruct the batch norm.
             self.sess.run(new_beta.assign(new_beta_values))
             self.sess.run(new_gamma.assign(new_gamma_values))
+            # The moving mean and variance are reset (the batch norm may have
+            # been used by a previous version of the network). For
+            # function-preserving growth and when removing kernels, they are
+            # also copied (so that inference is preserved as well).
+            for stat in ['moving_mean', 'moving_variance']:
+                values = self.sess.run(tf.get_variable(
+                    "BatchNorm%d/%s" % (self.features_total, stat),
+                    [self.features_total]))
+                new_stat = tf.get_variable(
+                    "BatchNorm%d/%s" % (new_features_total, stat),
+                    [new_features_total])
+                self.sess.run(tf.variables_initializer([new_stat]))
+                if self.growth_init == 'preserving' or is_shrinking:
+                    new_values = self.sess.run(new_stat)
+                    new_values[:kept_total] = values[kept_features]
+                    self.sess.run(new_stat.assign(new_values))
             self.features_total = new_features_total
 
             # ReLU, average pooling, and reshaping into 1d
             # these do not contain any trainable params, so they are rewritten.
             output = tf.nn.relu(output)
-            last_pool_kernel = int(output.get_shape()[-2])
+            last_pool_kernel = int(output.get_shape()[self.width_axis])
             output = self.avg_pool(output, k=last_pool_kernel)
-            features_total = int(output.get_shape()[-1])
+            features_total = int(output.get_shape()[self.channel_axis])
             output = tf.reshape(output, [-1, features_total])
 
-        # For the FC layer: add new weights, keep biases and old weights.
+        # For the FC layer: add new weights, keep biases and old weights
+        # (only those of the kept features, if kernels were removed).
+        # For function-preserving growth, the new weights are zero (the new
+        # features do not change the output until they are trained).
+        if is_shrinking:
+            self.removed_variables.update(
+                self.FC_W[i].name for i in range(len(self.FC_W))
+                if i not in kept_features)
+            self.FC_W = [self.FC_W[i] for i in kept_features]
         for i in range(len(self.FC_W), features_total):
-            self.FC_W.append(self.weight_variable_xavier(
-                [self.n_classes], name="FC_block_%d_W%d" % (block, i)))
+            name = self.unused_variable_name("FC_block_%d_W" % block)
+            if self.growth_init == 'preserving':
+                self.FC_W.append(tf.get_variable(
+                    name, shape=[self.n_classes],
+                    initializer=tf.zeros_initializer()))
+            else:
+                self.FC_W.append(self.weight_variable_xavier(
+                    [self.n_classes], name=name))
         stacked_FC_W = tf.stack(self.FC_W, axis=0)
         logits = tf.matmul(output, stacked_FC_W) + self.FC_bias
         return logits
@@ -1152,7 +1755,7 @@ class DenseNet:
     # -------------------------------------------------------------------------
 
     def cross_entropy_loss(self, _input, labels, block,
-                           preserve_transition=False):
+                           preserve_transition=False, kept_features=None):
         """
         Takes an input and adds a transition layer to obtain predictions for
         classes. Then calculates the cross-entropy loss for that input with
@@ -1161,21 +1764,30 @@ class DenseNet:
 
         Args:
             _input: tensor, the operation's input;
-            labels: tensor, the expected labels (classes) for the data;
+            labels: tensor, the expected labels (classes) for the data, as
+                one-hot vectors or class numbers (if sparse_labels is True);
             block: `int`, identifier number for the last block;
             preserve_transition: `bool`, whether or not to preserve the
                 transition to classes (if yes, adapts the previous transition,
-                otherwise creates a new one).
+                otherwise creates a new one);
+            kept_features: `list` of `int` or None, when preserving the
+                transition, indexes of the previous input features that are
+                kept (None if none were removed).
         """
         # add the FC transition layer to the classes (+ softmax).
         if preserve_transition:
-            logits = self.reconstruct_transition_to_classes(_input, block)
+            logits = self.reconstruct_transition_to_classes(
+                _input, block, kept_features)
         else:
             logits = self.transition_layer_to_classes(_input, block)
         prediction = tf.nn.softmax(logits)
 
         # set the calculation for the losses (cross_entropy and l2_loss)
-        if TF_VERSION[0] >= 1 and TF_VERSION[1] >= 5:
+        if self.sparse_labels:
+            cross_entropy = tf.reduce_mean(
+                tf.nn.sparse_softmax_cross_entropy_with_logits(logits=logits,
+                                                               labels=labels))
+        elif TF_VERSION[0] >= 1 and TF_VERSION[1] >= 5:
             cross_entropy = tf.reduce_mean(
                 tf.nn.softmax_cross_entropy_with_logits_v2(logits=logits,
                                                            labels=labels))
@@ -1186,7 +1798,8 @@ class DenseNet:
 
         return prediction, cross_entropy
 
-    def _define_end_graph_operations(self, preserve_transition=False):
+    def _define_end_graph_operations(self, preserve_transition=False,
+                                     kept_features=None):
         """
         Adds the last layer on top of the (editable portion of the) graph.
         Then defines the operations for cross-entropy, the training step,
@@ -1195,14 +1808,19 @@ class DenseNet:
         Args:
             preserve_transition: `bool`, whether or not to preserve the
                 transition to classes (if yes, adapts the previous transition,
-                otherwise creates a new one).
+                otherwise creates a new one);
+            kept_features: `list` of `int` or None, when preserving the
+                transition, indexes of the previous input features that are
+                kept (None if none were removed).
         """
         # obtain the predicted logits, set the calculation for the losses
         # (cross_entropy and l2_loss)
         prediction, cross_entropy = self.cross_entropy_loss(
-            self.output, self.labels, self.total_blocks-1, preserve_transition)
+            self.output, self.labels, self.total_blocks-1, preserve_transition,
+            kept_features)
+        self.prediction = prediction
         self.cross_entropy.append(cross_entropy)
-        var_list = self.get_useful_variables()
+        var_list = self.get_trainable_variables()
         l2_loss = tf.add_n(
             [tf.nn.l2_loss(var) for var in var_list])
 
@@ -1213,11 +1831,29 @@ class DenseNet:
             cross_entropy + l2_loss * self.weight_decay, var_list=var_list)
 
         # set the calculation for the accuracy
-        correct_prediction = tf.equal(
-            tf.argmax(prediction, 1),
-            tf.argmax(self.labels, 1))
+        if self.sparse_labels:
+            correct_prediction = tf.equal(
+                tf.argmax(prediction, 1),
+                self.labels)
+        else:
+            correct_prediction = tf.equal(
+                tf.argmax(prediction, 1),
+                tf.argmax(self.labels, 1))
         self.accuracy = tf.reduce_mean(tf.cast(correct_prediction, tf.float32))
 
+        # accumulate the loss and accuracy of each training step for the
+        # per-batch logs (see _define_batch_summary_ops)
+        if self.should_use_summary_ops:
+            updates = [tf.assign_add(self.batch_log_count, 1)]
+            for name, value in [('loss', cross_entropy),
+                                ('accuracy', self.accuracy)]:
+                stats = self.batch_log_stats[name]
+                updates.extend([
+                    tf.assign_add(stats['sum'], value),
+                    tf.assign(stats['min'], tf.minimum(stats['min'], value)),
+                    tf.assign(stats['max'], tf.maximum(stats['max'], value))])
+            self.batch_log_update = tf.group(*updates)
+
     # MAIN GRAPH BUILDING FUNCTIONS -------------------------------------------
     # -------------------------------------------------------------------------
 
@@ -1226,6 +1862,8 @@ class DenseNet:
         Add new convolution kernels to the current last layer.
         The number of kernels to be added is given by the expansion_rate param.
         """
+        self.phase_timer.start('growth')
+        growth_start_time = time.time()
         # safely access the current block's variable scope
         with tf.variable_scope(self.current_block,
                                auxiliary_name_scope=False) as cblock_scope:
@@ -1246,6 +1884,63 @@ class DenseNet:
         self._define_end_graph_operations(preserve_transition=True)
         self._initialize_uninitialized_variables()
         self._count_useful_trainable_params()
+        self.log_growth_event('kernels', self.expansion_rate,
+                              time.time() - growth_start_time)
+        self.phase_timer.stop('growth')
+
+    def _remove_kernels_from_last_layer(self):
+        """
+        Remove the negligible convolution kernels from the current last layer,
+        i.e. those with a mean absolute weight below kernel_prune_threshold
+        times the highest one in the layer (at least one kernel is kept).
+        Only the last layer can shrink, as its outputs are only received by
+        the transition to classes. Returns the number of removed kernels.
+        """
+        kernel_values = self.sess.run(self.kernels_ref_list[-1][-1])
+        magnitudes = [np.mean(np.abs(kernel)) for kernel in kernel_values]
+        kept_kernels = [
+            k for k in range(len(magnitudes))
+            if magnitudes[k] >= self.kernel_prune_threshold * max(magnitudes)]
+        removed_kernels = len(magnitudes) - len(kept_kernels)
+        if not removed_kernels:
+            return 0
+
+        self.phase_timer.start('growth')
+        growth_start_time = time.time()
+        # the last layer's outputs are the last features in the transition
+        previous_features = self.features_total - len(magnitudes)
+        kept_features = list(range(previous_features)) + [
+            previous_features + k for k in kept_kernels]
+        # safely access the current block's variable scope
+        with tf.variable_scope(self.current_block,
+                               auxiliary_name_scope=False) as cblock_scope:
+            with tf.name_scope(cblock_scope.original_name_scope):
+                # Remove the kernels and save the new relevant outputs
+                self.output = self.remove_kernels_from_layer(
+                    self.input_lt_lay, self.input_lt_cnv,
+                    self.layer_num_list[-1]-1, kept_kernels)
+
+        # Delete the last cross-entropy from the list, we will recreate it.
+        del self.cross_entropy[-1]
+
+        print("REMOVED %d NEGLIGIBLE KERNEL(S) FROM LAYER #%d (BLOCK #%d)! "
+              "It now has got %d kernels." %
+              (removed_kernels, self.layer_num_list[-1]-1,
+               self.total_blocks-1, len(kept_kernels)))
+
+        self._define_end_graph_operations(preserve_transition=True,
+                                          kept_features=kept_features)
+        self._initialize_uninitialized_variables()
+        self._count_useful_trainable_params()
+        self.log_growth_event('removed_kernels', removed_kernels,
+                              time.time() - growth_start_time)
+        if self.should_save_ft_logs:
+            self.feature_log.add_row('Removed kernels', self.current_epoch, {
+                'block': self.total_blocks-1,
+                'layer': self.layer_num_list[-1]-1,
+                'removed': removed_kernels, 'kept': len(kept_kernels)})
+        self.phase_timer.stop('growth')
+        return removed_kernels
 
     def _new_layer(self):
         """
@@ -1253,6 +1948,8 @@ class DenseNet:
         In DenseNet-BC mode, two layers (bottleneck and compression) will be
         added instead of just one.
         """
+        self.phase_timer.start('growth')
+        growth_start_time = time.time()
         # safely access the current block's variable scope
         with tf.variable_scope(self.current_block,
                                auxiliary_name_scope=False) as cblock_scope:
@@ -1281,6 +1978,9 @@ class DenseNet:
         self._define_end_graph_operations(preserve_transition=True)
         self._initialize_uninitialized_variables()
         self._count_useful_trainable_params()
+        self.log_growth_event('layer', self.growth_rate,
+                              time.time() - growth_start_time)
+        self.phase_timer.stop('growth')
 
     def _new_block(self):
         """
@@ -1289,6 +1989,15 @@ class DenseNet:
         In DenseNet-BC mode, the new module will begin with two layers
         (bottleneck and compression) instead of just one.
         """
+        self.phase_timer.start('growth')
+        growth_start_time = time.time()
+        # Freeze all the previous blocks: no gradients go through their output
+        if self.should_freeze_blocks:
+            self.frozen_blocks = self.total_blocks
+            self.frozen_output = tf.stop_gradient(self.output)
+            self.output = self.frozen_output
+            self.block_features = [self.frozen_output]
+            self.release_feature_cache()
         # The input of the last block is useful if the block must be ditched
         self.input_lt_blc = self.transition_layer(
             self.output, self.total_blocks-1)
@@ -1310,11 +2019,16 @@ class DenseNet:
                             'layers.' % (k, self.layer_num_list[k],
                                          self.layer_num_list[k])
                             for k in range(len(self.layer_num_list))))
+        if self.frozen_blocks:
+            print("Blocks #0 to #%d are frozen." % (self.frozen_blocks-1))
 
         self.update_paths()
         self._define_end_graph_operations()
         self._initialize_uninitialized_variables()
         self._count_useful_trainable_params()
+        self.log_growth_event('block', self.growth_rate,
+                              time.time() - growth_start_time)
+        self.phase_timer.stop('growth')
 
     def _build_graph(self):
         """
@@ -1326,6 +2040,9 @@ class DenseNet:
         growth_rate = self.growth_rate
         layers_in_each_block = self.layer_num_list
         self.output = self.images
+        # the images are fed in NHWC layout
+        if self.data_format == 'NCHW':
+            self.output = tf.transpose(self.output, [0, 3, 1, 2])
 
         # first add a 3x3 convolution layer with first_output_features outputs
         with tf.variable_scope("Initial_convolution"):
@@ -1377,6 +2094,8 @@ class DenseNet:
             self.sess.run(tf.global_variables_initializer())
         else:
             self.sess.run(tf.initialize_all_variables())
+        if self.should_use_summary_ops:
+            self.sess.run(self.batch_log_reset)
 
     def _initialize_session(self):
         """
@@ -1389,6 +2108,19 @@ class DenseNet:
         # specify the CPU inter and intra threads used by MKL
         config.intra_op_parallelism_threads = self.num_intra_threads
         config.inter_op_parallelism_threads = self.num_inter_threads
+        # evaluation may use its own inter-op thread pool (pool 0 is used for
+        # training, pool 1 for evaluation and prediction)
+        self.eval_run_options = None
+        if self.num_eval_inter_threads:
+            config.session_inter_op_thread_pool.add().num_threads = (
+                self.num_inter_threads)
+            config.session_inter_op_thread_pool.add().num_threads = (
+                self.num_eval_inter_threads)
+            self.eval_run_options = tf.RunOptions(inter_op_thread_pool=1)
+        # XLA auto-clustering (JIT compilation of clusters of operations)
+        if self.should_use_xla:
+            config.graph_options.optimizer_options.global_jit_level = (
+                tf.OptimizerOptions.ON_1)
 
         # restrict model GPU memory utilization to the minimum required
         config.gpu_options.allow_growth = True
@@ -1402,9 +2134,17 @@ class DenseNet:
                 logswriter = tf.summary.FileWriter
             else:
                 logswriter = tf.train.SummaryWriter
-            self.summary_writer = logswriter(self.logs_path)
+            # buffer the events, written to disk every now and then
+            self.summary_writer = logswriter(
+                self.logs_path, max_queue=SUMMARY_MAX_QUEUE,
+                flush_secs=SUMMARY_FLUSH_SECS)
         if self.should_save_ft_logs:
-            self.feature_writer = open('./%s.csv' % self.ft_logs_path, "w")
+            # the CSV feature log (with the ft_comma and ft_decimal
+            # separators) is written along with the compact feature log
+            self.feature_log = FeatureLog(
+                './%s.features.csv' % self.ft_logs_path,
+                './%s.csv' % self.ft_logs_path, self.ftc, self.ftd,
+                self.ft_extra_rows)
 
     # -------------------------------------------------------------------------
     # ------------------- COUNTING ALL TRAINABLE PARAMETERS -------------------
@@ -1433,7 +2173,7 @@ class DenseNet:
         parameters in the graph, as well as the number of parameters that are
         currently 'useful'. By 'useful' parameters are meant the multiplied
         dimensions of each TF variable that is not a discarded transition to
-        classes or batch normalization.
+        classes or batch normalization, or a removed kernel or FC weight.
         The method prints not only the number of parameters, but also the
         number of parameters in the convolutional and fully connected parts
         of the TensorFlow graph.
@@ -1458,6 +2198,9 @@ class DenseNet:
                 variable_parameters *= dim.value
             # Add all identified parameters to total_parameters.
             total_parameters += variable_parameters
+            # Skip params from removed kernels and FC weights.
+            if variable.name in self.removed_variables:
+                continue
             # Add params from the current FC layer to useful_fc_params.
             if variable.name.startswith(true_fc_name):
                 useful_fc_params += variable_parameters
@@ -1475,12 +2218,89 @@ class DenseNet:
         print("Total useful params: %.1fk" % (total_useful_parameters / 1e3))
         print("\tConvolutional: %.1fk" % (useful_conv_params / 1e3))
         print("\tFully Connected: %.1fk" % (useful_fc_params / 1e3))
+        if self.should_log_costs:
+            self.print_costs(get_total_costs(self.get_layer_costs()))
+        if self.should_log_telemetry:
+            self.print_telemetry(self.get_telemetry())
+
+    # -------------------------------------------------------------------------
+    # ------------------- GRAPH AND MEMORY GROWTH TELEMETRY -------------------
+    # -------------------------------------------------------------------------
+
+    def get_telemetry(self):
+        """
+        Measures values that reflect the growth of the graph and of the
+        process during self-construction. Returns an `OrderedDict` with:
+        the number of nodes (ops) in the graph, the number of variables and
+        their size (MB), the size of the optimizer's slots (MB), the process
+        memory (RSS, in MB) and the mean time of the last training steps (s).
+        """
+        variables = tf.get_collection(tf.GraphKeys.GLOBAL_VARIABLES)
+        variable_bytes = 0
+        slot_bytes = 0
+        for variable in variables:
+            var_bytes = (variable.get_shape().num_elements() *
+                         variable.dtype.base_dtype.size)
+            variable_bytes += var_bytes
+            # momentum optimizer slots are named '<variable>/Momentum', or
+            # '<variable>/Momentum_<i>' when the optimizer is rebuilt
+            if re.search(r'/Momentum(_\d+)?$', variable.op.name):
+                slot_bytes += var_bytes
+
+        telemetry = OrderedDict()
+        telemetry['graph_nodes'] = len(self.sess.graph.get_operations())
+        telemetry['variables'] = len(variables)
+        telemetry['variables_mb'] = variable_bytes / 2**20
+        telemetry['optimizer_slots_mb'] = slot_bytes / 2**20
+        telemetry['rss_mb'] = get_process_rss() / 2**20
+        telemetry['step_time'] = self.mean_step_time
+        return telemetry
+
+    def print_telemetry(self, telemetry):
+        """
+        Prints the telemetry values on console, as well as an alarm if the
+        process memory is above the alarm threshold (telemetry_alarm_mb).
+
+        Args:
+            telemetry: `dict`, the telemetry values (see get_telemetry).
+        """
+        print("Graph nodes: %d, variables: %d (%.1f MB, optimizer slots:"
+              " %.1f MB)" % (telemetry['graph_nodes'], telemetry['variables'],
+                             telemetry['variables_mb'],
+                             telemetry['optimizer_slots_mb']))
+        print("Process memory (RSS): %.1f MB, mean step time: %.4fs" % (
+            telemetry['rss_mb'], telemetry['step_time']))
+        if (self.telemetry_alarm_mb > 0 and
+                telemetry['rss_mb'] > self.telemetry_alarm_mb):
+            print("WARNING: process memory (%.1f MB) is above the alarm"
+                  " threshold (%d MB)!" % (telemetry['rss_mb'],
+                                           self.telemetry_alarm_mb))
+
+    def log_telemetry(self, epoch):
+        """
+        Measures, prints and writes a log of the telemetry values for a
+        training epoch, in the TensorBoard logs and in the feature log if
+        they are being saved.
+
+        Args:
+            epoch: `int`, current training epoch.
+        """
+        telemetry = self.get_telemetry()
+        self.print_telemetry(telemetry)
+        if self.should_save_logs:
+            summary = tf.Summary(value=[
+                tf.Summary.Value(tag='telemetry_%s' % key,
+                                 simple_value=float(value))
+                for key, value in telemetry.items()])
+            self.summary_writer.add_summary(summary, epoch)
+        if self.should_save_ft_logs:
+            self.feature_log.add_row('Telemetry', epoch, telemetry)
 
     def get_useful_variables(self):
         """
         Get a list of the trainable variables in the graph that are currently
         'useful' (all variables except those in discarded transitions to
-        classes or batch normalizations).
+        classes or batch normalizations, and removed kernels or FC weights).
         """
         useful_vars = []
         fc_name = 'FC_'
@@ -1490,6 +2310,9 @@ class DenseNet:
             self.total_blocks-1, self.features_total)
 
         for variable in tf.trainable_variables():
+            # Skip removed kernels and FC weights.
+            if variable.name in self.removed_variables:
+                continue
             # Add variables from the current FC layer.
             if variable.name.startswith(true_fc_name):
                 useful_vars.append(variable)
@@ -1507,6 +2330,718 @@ class DenseNet:
 
         return useful_vars
 
+    def is_frozen_variable(self, variable):
+        """
+        Returns True if a variable belongs to a frozen part of the network
+        (the initial convolution, a frozen block or the transition layers
+        between frozen blocks), False otherwise.
+
+        Args:
+            variable: a TensorFlow variable.
+        """
+        if not self.frozen_blocks:
+            return False
+        frozen_names = ['Initial_convolution/']
+        frozen_names.extend('Block_%d/' % b for b in range(self.frozen_blocks))
+        frozen_names.extend('Transition_after_block_%d/' % b
+                            for b in range(self.frozen_blocks-1))
+        return variable.name.startswith(tuple(frozen_names))
+
+    def get_trainable_variables(self):
+        """
+        Get a list of the useful variables (see get_useful_variables) that
+        are trained, i.e. that are not in a frozen part of the network.
+        """
+        return [var for var in self.get_useful_variables()
+                if not self.is_frozen_variable(var)]
+
+    # -------------------------------------------------------------------------
+    # ------------------ ESTIMATING COSTS AND COMPUTE BUDGET ------------------
+    # -------------------------------------------------------------------------
+
+    def get_kernel_num_list(self):
+        """
+        Get the current number of kernels in each layer of each block (`list`
+        of `list` of `int`), which may differ from the growth rate after
+        kernel-wise self-construction.
+        """
+        if hasattr(self, 'kernels_ref_list'):
+            return [[len(kernels) for kernels in block_kernels[:layers]]
+                    for block_kernels, layers in zip(self.kernels_ref_list,
+                                                     self.layer_num_list)]
+        return get_kernel_num_list(self.layer_num_list, self.growth_rate)
+
+    def get_layer_costs(self, batch_size=1, event=None):
+        """
+        Estimates analytically the costs of each layer of the network, or of
+        the network it would become after a growth event (see
+        cost_model.get_layer_costs): parameters, multiply-adds per image,
+        and sizes of the parameters and activations (for a batch).
+
+        Args:
+            batch_size: `int`, number of images in a batch;
+            event: `str` or None, the growth event ('layer', 'kernels' or
+                'block'), None for the current network.
+        """
+        kernel_num_list = self.get_kernel_num_list()
+        if event == 'layer':
+            kernel_num_list[-1].append(self.growth_rate)
+        elif event == 'kernels':
+            kernel_num_list[-1][-1] += self.expansion_rate
+        elif event == 'block':
+            kernel_num_list.append([self.growth_rate])
+        return get_layer_costs(
+            self.data_shape, self.n_classes, kernel_num_list,
+            self.growth_rate, self.first_output_features, self.bc_mode,
+            self.reduction, batch_size, self.should_recompute_features)
+
+    def get_costs(self, event=None):
+        """
+        Estimates analytically the costs of the network, or of the network
+        it would become after a growth event. Returns an `OrderedDict` with
+        the number of FLOPs per image (in millions, a multiply-add counts as
+        2, as in get_graph_flops) and the number of parameters (in thousands).
+
+        Args:
+            event: `str` or None, the growth event ('layer', 'kernels' or
+                'block'), None for the current network.
+        """
+        costs = get_total_costs(self.get_layer_costs(event=event))
+        return OrderedDict([('mflops', 2 * costs['macs'] / 1e6),
+                            ('kparams', costs['params'] / 1e3)])
+
+    def print_costs(self, costs, batch_size=1):
+        """
+        Prints the estimated total costs of the network.
+
+        Args:
+            costs: `dict`, the total costs (see cost_model.get_total_costs);
+            batch_size: `int`, number of images in a batch (for activations).
+        """
+        print("Estimated costs: %.2fM mult-adds per image, %.1fk params"
+              " (%.2f MB), activations: %.1f MB per batch of %d" % (
+                  costs['macs'] / 1e6, costs['params'] / 1e3,
+                  costs['param_bytes'] / 2**20,
+                  costs['activation_bytes'] / 2**20, batch_size))
+
+    def log_costs(self, epoch, batch_size):
+        """
+        Estimates, prints and writes a log of the costs of the network for a
+        training epoch, in the TensorBoard logs (along with a table of the
+        costs of each layer) and in the feature log if they are being saved.
+
+        Args:
+            epoch: `int`, current training epoch;
+            batch_size: `int`, number of images in a training batch.
+        """
+        layer_costs = self.get_layer_costs(batch_size)
+        costs = get_total_costs(layer_costs)
+        self.print_costs(costs, batch_size)
+        if self.should_save_logs:
+            summary = tf.Summary(value=[
+                tf.Summary.Value(tag='costs_%s' % key,
+                                 simple_value=float(value))
+                for key, value in costs.items()])
+            self.summary_writer.add_summary(summary, epoch)
+            with open('%s/layer_costs_estimated.txt' % self.logs_path,
+                      'w') as f:
+                f.write('Estimated costs at epoch %d (%s)\n%s\n' % (
+                    epoch, self.model_identifier,
+                    format_layer_costs(layer_costs)))
+        if self.should_save_ft_logs:
+            self.feature_log.add_row('Costs', epoch, costs)
+
+    def measure_inference_ms(self, batch_size=200, repeats=3):
+        """
+        Measures the inference time per image (in ms) of the current network,
+        as the fastest of several predictions for a batch of test images.
+
+        Args:
+            batch_size: `int`, number of images in the batch;
+            repeats: `int`, number of timed predictions (after a warm-up).
+        """
+        images, _ = next(self.data_provider.test.eval_batches(batch_size))
+        self.predict(images, batch_size)
+        durations = []
+        for _ in range(repeats):
+            start_time = time.time()
+            self.predict(images, batch_size)
+            durations.append(time.time() - start_time)
+        return 1e3 * min(durations) / images.shape[0]
+
+    def get_ms_per_mflop(self):
+        """
+        Returns the inference time per image and per MFLOP (in ms) of the
+        current network. It is only measured once for each architecture
+        (i.e. whenever the estimated FLOPs change), and cached.
+        """
+        mflops = self.get_costs()['mflops']
+        if self.ms_per_mflop is None or self.ms_per_mflop[0] != mflops:
+            self.ms_per_mflop = (mflops,
+                                 self.measure_inference_ms() / mflops)
+        return self.ms_per_mflop[1]
+
+    def fits_budget(self, event):
+        """
+        Checks if the network would still fit in the compute budget (FLOPs
+        per image, parameters and inference time per image) after a growth
+        event. The inference time after the event is extrapolated from its
+        FLOPs, with the time per FLOP of the current network (measured once
+        for each architecture, see get_ms_per_mflop).
+        Returns True if it would (or if there is no budget), False otherwise.
+
+        Args:
+            event: `str`, the growth event ('layer', 'kernels' or 'block').
+        """
+        if not (self.budget_mflops or self.budget_kparams or self.budget_ms):
+            return True
+        costs = self.get_costs(event)
+        exceeded = []
+        if self.budget_mflops and costs['mflops'] > self.budget_mflops:
+            exceeded.append("%.2f > %.2f MFLOPs per image" % (
+                costs['mflops'], self.budget_mflops))
+        if self.budget_kparams and costs['kparams'] > self.budget_kparams:
+            exceeded.append("%.1fk > %.1fk params" % (
+                costs['kparams'], self.budget_kparams))
+        if self.budget_ms:
+            inference_ms = costs['mflops'] * self.get_ms_per_mflop()
+            if inference_ms > self.budget_ms:
+                exceeded.append("%.3f > %.3f ms per image" % (
+                    inference_ms, self.budget_ms))
+        if exceeded:
+            print("GROWTH REFUSED (NEW %s): the network would exceed its"
+                  " compute budget (%s)." % (event.upper(),
+                                             ', '.join(exceeded)))
+            return False
+        return True
+
+    def get_adaptive_batch_size(self):
+        """
+        Get the largest training batch size (at most max_batch_size, and a
+        multiple of 8 if possible) for which the estimated training memory
+        fits in the memory budget: the activations of the batch (see
+        get_layer_costs), and the parameters with their gradients and
+        momentum (3 times the size of the parameters). At least 1.
+        """
+        costs = get_total_costs(self.get_layer_costs())
+        available_bytes = (self.memory_budget_mb * 2**20 -
+                           3 * costs['param_bytes'])
+        batch_size = min(int(available_bytes // costs['activation_bytes']),
+                         self.max_batch_size)
+        if batch_size >= 8:
+            batch_size -= batch_size % 8
+        return max(batch_size, 1)
+
+    def _adapt_batch_size(self, batch_size):
+        """
+        Adapts the training batch size to the memory budget (after a growth
+        event, or before training). Returns the new batch size.
+
+        Args:
+            batch_size: `int`, the current batch size.
+        """
+        new_batch_size = self.get_adaptive_batch_size()
+        if new_batch_size != batch_size:
+            costs = get_total_costs(self.get_layer_costs(new_batch_size))
+            memory_mb = (costs['activation_bytes'] +
+                         3 * costs['param_bytes']) / 2**20
+            print("Batch size adapted to the memory budget (%d MB): %d -> %d"
+                  " (estimated memory: %.1f MB)." % (
+                      self.memory_budget_mb, batch_size, new_batch_size,
+                      memory_mb))
+            if memory_mb > self.memory_budget_mb:
+                print("WARNING: the network does not fit in the memory"
+                      " budget, even with a batch size of 1!")
+        return new_batch_size
+
+    def print_cost_summary(self, accuracy):
+        """
+        Prints the accuracy of the network along with its costs (FLOPs and
+        inference time per image, parameters) and the compute budget, and
+        writes them in the feature log if it is being saved.
+
+        Args:
+            accuracy: `float`, the network's accuracy (e.g. on the test set).
+        """
+        costs = self.get_costs()
+        costs['inference_ms'] = self.measure_inference_ms()
+        budgets = [self.budget_mflops, self.budget_kparams, self.budget_ms]
+        print("\nAccuracy vs cost:")
+        print("\tAccuracy: %f" % accuracy)
+        for value, budget, unit in zip(
+                costs.values(), budgets,
+                ['MFLOPs per image', 'k params', 'ms per image']):
+            print("\t%.3f %s%s" % (value, unit, " (budget: %.3f)" % budget
+                                   if budget else ""))
+        if self.should_save_ft_logs:
+            costs['accuracy'] = accuracy
+            self.feature_log.add_row('Accuracy vs cost', -1, costs)
+
+    # -------------------------------------------------------------------------
+    # --------------------- EXPORTING THE INFERENCE GRAPH ---------------------
+    # -------------------------------------------------------------------------
+
+    def _get_inference_weights(self):
+        """
+        Gets the current values of all the weights needed for inference, in a
+        nested structure that follows the network's architecture (initial
+        convolution, blocks with their layers and transitions, transition to
+        classes). Filters are returned as `np.ndarray` with shape
+        [kernel_size, kernel_size, in_features, out_features], batch
+        normalisations as lists with their gamma, beta, moving mean and
+        moving variance.
+        """
+        var_by_name = {var.op.name: var
+                       for var in tf.get_collection(
+                           tf.GraphKeys.GLOBAL_VARIABLES)}
+
+        def bn_vars(scope):
+            return [var_by_name['%s/%s' % (scope, param)] for param in [
+                'gamma', 'beta', 'moving_mean', 'moving_variance']]
+
+        def kernel_vars(scope):
+            kernels = []
+            while '%s/kernel%d' % (scope, len(kernels)) in var_by_name:
+                kernels.append(
+                    var_by_name['%s/kernel%d' % (scope, len(kernels))])
+            return kernels
+
+        weights = {'initial': var_by_name['Initial_convolution/filter'],
+                   'blocks': []}
+        for b in range(self.total_blocks):
+            block = {'layers': []}
+            for l in range(self.layer_num_list[b]):
+                scope = 'Block_%d/layer_%d' % (b, l)
+                layer = {
+                    'bn': bn_vars(scope + '/composite_function/BatchNorm')}
+                # the kernel references are kept up to date after growth
+                if hasattr(self, 'kernels_ref_list'):
+                    layer['kernels'] = self.kernels_ref_list[b][l]
+                else:
+                    layer['kernels'] = kernel_vars(
+                        scope + '/composite_function')
+                if self.bc_mode:
+                    layer['bottleneck_bn'] = bn_vars(
+                        scope + '/bottleneck/BatchNorm')
+                    layer['bottleneck_filter'] = var_by_name[
+                        scope + '/bottleneck/filter']
+                block['layers'].append(layer)
+            # all blocks except the last have transition layers
+            if b != self.total_blocks - 1:
+                scope = 'Transition_after_block_%d/composite_function' % b
+                block['transition'] = {'bn': bn_vars(scope + '/BatchNorm'),
+                                       'kernels': kernel_vars(scope)}
+            weights['blocks'].append(block)
+        weights['classes'] = {
+            'bn': bn_vars('Transition_to_FC_block_%d/BatchNorm%d' % (
+                self.total_blocks-1, self.features_total)),
+            'FC_W': self.FC_W,
+            'FC_bias': self.FC_bias}
+
+        weights = self.sess.run(weights)
+        # stack the kernels to obtain the filters (as done in the graph)
+        for block in weights['blocks']:
+            for layer in block['layers'] + [block.get('transition')]:
+                if layer is not None:
+                    layer['filter'] = np.stack(layer.pop('kernels'), axis=3)
+        weights['classes']['FC_W'] = np.stack(
+            weights['classes']['FC_W'], axis=0)
+        return weights
+
+    def fold_batch_norm(self, bn_values):
+        """
+        Folds the inference-time batch normalisation into a per-channel scale
+        and offset, so that batch_norm(x) = x * scale + offset.
+        Returns the scale and offset as `np.ndarray`.
+
+        Args:
+            bn_values: `list` of `np.ndarray`, the gamma, beta, moving mean
+                and moving variance of the batch normalisation.
+        """
+        gamma, beta, moving_mean, moving_variance = bn_values
+        scale = gamma / np.sqrt(moving_variance + BN_EPSILON)
+        offset = beta - moving_mean * scale
+        return scale, offset
+
+    def _frozen_bn_relu(self, _input, bn_values, next_weights):
+        """
+        Applies a folded batch normalisation and a ReLU activation function
+        on a given input (_input) in the inference graph.
+        Returns the output tensor, and the weights of the next linear
+        operation (convolution filter or FC weights) with the batch
+        normalisation's scale folded into them when possible.
+
+        Since relu(x * s + o) = s * relu(x + o / s) for s > 0, when all the
+        scales are positive they are folded into the input features of the
+        next linear operation, and only a bias addition remains.
+
+        Args:
+            _input: tensor, the operation's input;
+            bn_values: `list` of `np.ndarray`, the batch norm's values;
+            next_weights: `np.ndarray`, weights of the next linear operation,
+                with the input features as their second-to-last dimension.
+        """
+        scale, offset = self.fold_batch_norm(bn_values)
+        if np.all(scale > 0):
+            output = tf.nn.bias_add(
+                _input, (offset / scale).astype(np.float32))
+            next_weights = next_weights * np.expand_dims(scale, -1)
+        else:
+            output = _input * scale.astype(np.float32) + offset.astype(
+                np.float32)
+        output = tf.nn.relu(output)
+        return output, next_weights.astype(np.float32)
+
+    def _frozen_composite_function(self, _input, bn_values, filter_values,
+                                   padding='SAME'):
+        """
+        Composite function (or bottleneck) in the inference graph: folded
+        batch normalisation, ReLU, and 2d convolution with a constant filter.
+        Dropout is not used at inference time, so it is removed.
+
+        Args:
+            _input: tensor, the operation's input;
+            bn_values: `list` of `np.ndarray`, the batch norm's values;
+            filter_values: `np.ndarray`, the convolution's filter;
+            padding: `str`, should we use padding ('SAME') or not ('VALID').
+        """
+        output, filter_values = self._frozen_bn_relu(
+            _input, bn_values, filter_values)
+        output = tf.nn.conv2d(
+            output, tf.constant(filter_values), [1, 1, 1, 1], padding)
+        return output
+
+    def _select_connections(self, features, kept, bn_values, filter_values):
+        """
+        Selects the connections (groups of input features) kept by a layer
+        in the inference graph: returns the concatenation of the kept
+        features, and the layer's batch norm values and filter sliced to
+        their channels.
+
+        Args:
+            features: `list` of tensors, the features received by the layer
+                (the block's input and the outputs of the previous layers);
+            kept: `list` of `int` or None, indexes of the kept features
+                (None to keep all of them);
+            bn_values: `list` of `np.ndarray`, the batch norm's values;
+            filter_values: `np.ndarray`, the layer's (first) filter.
+        """
+        if kept is None:
+            kept = range(len(features))
+        channels = []
+        offset = 0
+        for f, feature in enumerate(features):
+            size = int(feature.get_shape()[-1])
+            if f in kept:
+                channels.extend(range(offset, offset + size))
+            offset += size
+        output = tf.concat(axis=3, values=[features[f] for f in kept])
+        bn_values = [values[channels] for values in bn_values]
+        return output, bn_values, filter_values[:, :, channels, :]
+
+    def build_inference_graph(self, kept_connections=None):
+        """
+        Builds a standalone inference graph for the current network, in a new
+        TensorFlow graph: all variables are frozen to constants, batch
+        normalisations use their moving statistics (folded into adjacent
+        convolutions where possible), and dropout and all training-only
+        operations are removed.
+        Returns the new graph, its input (images) and output (prediction).
+
+        Args:
+            kept_connections: `list` or None, the connections kept by each
+                layer and transition of each block, if the graph is pruned
+                (see get_kept_connections), None to keep all connections.
+        """
+        weights = self._get_inference_weights()
+        graph = tf.Graph()
+        with graph.as_default():
+            shape = [None]
+            shape.extend(self.data_shape)
+            images = tf.placeholder(
+                tf.float32, shape=shape, name=INFERENCE_INPUT_NAME)
+            output = tf.nn.conv2d(
+                images, tf.constant(weights['initial']), [1, 1, 1, 1],
+                'SAME')
+            for b, block in enumerate(weights['blocks']):
+                features = [output]
+                for l, layer in enumerate(block['layers']):
+                    kept = kept_connections[b][l] if kept_connections else None
+                    if self.bc_mode:
+                        comp_out, bn_values, filter_values = (
+                            self._select_connections(
+                                features, kept, layer['bottleneck_bn'],
+                                layer['bottleneck_filter']))
+                        comp_out = self._frozen_composite_function(
+                            comp_out, bn_values, filter_values,
+                            padding='VALID')
+                        comp_out = self._frozen_composite_function(
+                            comp_out, layer['bn'], layer['filter'])
+                    else:
+                        comp_out, bn_values, filter_values = (
+                            self._select_connections(
+                                features, kept, layer['bn'], layer['filter']))
+                        comp_out = self._frozen_composite_function(
+                            comp_out, bn_values, filter_values)
+                    features.append(comp_out)
+                output = tf.concat(axis=3, values=features)
+                if 'transition' in block:
+                    kept = (kept_connections[b][-1] if kept_connections
+                            else None)
+                    output, bn_values, filter_values = (
+                        self._select_connections(
+                            features, kept, block['transition']['bn'],
+                            block['transition']['filter']))
+                    output = self._frozen_composite_function(
+                        output, bn_values, filter_values)
+                    output = self.avg_pool(output, k=2, data_format='NHWC')
+
+            # transition to classes (the FC weights take the folded scale)
+            output, fc_weights = self._frozen_bn_relu(
+                output, weights['classes']['bn'],
+                weights['classes']['FC_W'])
+            last_pool_kernel = int(output.get_shape()[-2])
+            output = self.avg_pool(output, k=last_pool_kernel,
+                                   data_format='NHWC')
+            output = tf.reshape(output, [-1, fc_weights.shape[0]])
+            logits = tf.matmul(output, tf.constant(fc_weights)) + tf.constant(
+                weights['classes']['FC_bias'])
+            prediction = tf.nn.softmax(logits, name=INFERENCE_OUTPUT_NAME)
+        return graph, images, prediction
+
+    def export_inference_graph(self, export_path=None, kept_connections=None):
+        """
+        Exports a frozen inference graph for the current network as a
+        standalone binary GraphDef file (see build_inference_graph).
+        Its input node is 'input_images' and its output node 'prediction'.
+        Returns the path to the exported file.
+
+        Args:
+            export_path: `str` or None, directory where the graph file is
+                written (if None, the model's export path is used);
+            kept_connections: `list` or None, the connections kept by each
+                layer if the graph is pruned (see get_kept_connections).
+        """
+        if export_path is None:
+            export_path = self.export_path
+        os.makedirs(export_path, exist_ok=True)
+        graph, _, _ = self.build_inference_graph(kept_connections)
+        graph_path = tf.train.write_graph(
+            graph.as_graph_def(), export_path, 'frozen_graph.pb',
+            as_text=False)
+        print("Exported frozen inference graph (%d nodes) to: %s" % (
+            len(graph.as_graph_def().node), graph_path))
+        return graph_path
+
+    # -------------------------------------------------------------------------
+    # -------------------- PRUNING CONNECTIONS FOR INFERENCE ------------------
+    # -------------------------------------------------------------------------
+
+    def get_kept_connections(self, threshold, weights=None):
+        """
+        Decides which connections to keep in each block when pruning the
+        network: for each layer (and transition), the CS of its connection
+        with each previous output (as in get_cs_list, the mean of the
+        absolute weights received from that output by its first filter) is
+        compared to the layer's highest CS, and connections below a fraction
+        of it are pruned.
+        Returns a `list` (one per block) of lists of kept connections
+        (indexes of the received outputs, 0 being the block's input) for
+        each layer, then for the block's transition if any.
+
+        Args:
+            threshold: `float`, fraction of a layer's highest CS below which
+                its connections are pruned;
+            weights: `dict` or None, the network's inference weights (see
+                _get_inference_weights), None to get the current weights.
+        """
+        if weights is None:
+            weights = self._get_inference_weights()
+        filter_key = 'bottleneck_filter' if self.bc_mode else 'filter'
+        kept_connections = []
+        for block in weights['blocks']:
+            layers = block['layers']
+            # number of features received from the block's input and layers
+            sizes = [layers[0][filter_key].shape[2]]
+            sizes.extend(layer['filter'].shape[3] for layer in layers)
+            filters = [layer[filter_key] for layer in layers]
+            if 'transition' in block:
+                filters.append(block['transition']['filter'])
+            kept_block = []
+            for l, filter_values in enumerate(filters):
+                offsets = np.cumsum([0] + sizes[:l+1])
+                cs_list = [np.mean(np.abs(filter_values[:, :, start:end, :]))
+                           for start, end in zip(offsets[:-1], offsets[1:])]
+                kept_block.append([s for s, cs in enumerate(cs_list)
+                                   if cs >= threshold * max(cs_list)])
+            kept_connections.append(kept_block)
+        return kept_connections
+
+    def _define_connection_masks(self, kept_connections):
+        """
+        Defines an operation that sets to zero the weights of the pruned
+        connections in the training graph (run after each training step
+        when fine-tuning a pruned network).
+
+        Args:
+            kept_connections: `list`, the connections kept by each layer and
+                transition of each block (see get_kept_connections).
+        """
+        var_by_name = {var.op.name: var
+                       for var in tf.get_collection(
+                           tf.GraphKeys.GLOBAL_VARIABLES)}
+
+        def kernel_vars(scope):
+            kernels = []
+            while '%s/kernel%d' % (scope, len(kernels)) in var_by_name:
+                kernels.append(
+                    var_by_name['%s/kernel%d' % (scope, len(kernels))])
+            return kernels
+
+        mask_ops = []
+        for b, kept_block in enumerate(kept_connections):
+            scopes = ['Block_%d/layer_%d/%s' % (b, l, 'bottleneck' if
+                                                self.bc_mode else
+                                                'composite_function')
+                      for l in range(self.layer_num_list[b])]
+            if b != self.total_blocks - 1:
+                scopes.append(
+                    'Transition_after_block_%d/composite_function' % b)
+            sizes = None
+            for l, (scope, kept) in enumerate(zip(scopes, kept_block)):
+                if self.bc_mode and l < self.layer_num_list[b]:
+                    variables = [var_by_name[scope + '/filter']]
+                # the kernel references are kept up to date after growth
+                elif (hasattr(self, 'kernels_ref_list') and
+                      l < self.layer_num_list[b]):
+                    variables = self.kernels_ref_list[b][l]
+                else:
+                    variables = kernel_vars(scope)
+                in_features = int(variables[0].get_shape()[2])
+                if sizes is None:
+                    sizes = [in_features]
+                # outputs of the previous layer are the newly received ones
+                elif in_features > sum(sizes):
+                    sizes.append(in_features - sum(sizes))
+                mask = np.zeros(in_features, dtype=np.float32)
+                offsets = np.cumsum([0] + sizes)
+                for s in kept:
+                    mask[offsets[s]:offsets[s+1]] = 1
+                for var in variables:
+                    shape = [1] * len(var.get_shape())
+                    shape[2] = in_features
+                    mask_ops.append(var.assign(var * mask.reshape(shape)))
+        return tf.group(*mask_ops)
+
+    def time_inference_graph(self, graph, images_input, prediction, data,
+                             batch_size=200):
+        """
+        Runs an inference graph on a dataset, and measures its accuracy and
+        its mean inference time per image (in ms).
+        Returns the accuracy and the time per image.
+
+        Args:
+            graph: `tf.Graph`, the inference graph;
+            images_input: tensor, the graph's input (images);
+            prediction: tensor, the graph's output (class probabilities);
+            data: dataset yielded by the dataset's data provider;
+            batch_size: `int`, number of images in an inference batch.
+        """
+        config = tf.ConfigProto()
+        config.intra_op_parallelism_threads = self.num_intra_threads
+        config.inter_op_parallelism_threads = self.num_inter_threads
+        correct = 0
+        total_time = 0
+        with tf.Session(graph=graph, config=config) as sess:
+            # warmup run (excluded from the time measurement)
+            images, _ = next(data.eval_batches(batch_size))
+            sess.run(prediction, feed_dict={images_input: images})
+            for images, labels in data.eval_batches(batch_size):
+                start_time = time.time()
+                batch_prediction = sess.run(
+                    prediction, feed_dict={images_input: images})
+                total_time += time.time() - start_time
+                if not self.sparse_labels:
+                    labels = np.argmax(labels, axis=1)
+                correct += np.sum(np.argmax(batch_prediction, 1) == labels)
+        return (correct / data.num_examples,
+                1000 * total_time / data.num_examples)
+
+    def prune_connections(self, threshold, data, fine_tune_epochs=0,
+                          batch_size=64, learning_rate=0.001,
+                          export_path=None):
+        """
+        Prunes the connections with a low CS (see get_kept_connections) in
+        the inference graph, where each layer then only receives (and
+        convolves) its kept inputs. The network can be fine-tuned with the
+        pruned connections masked beforehand. Prints a report of the pruned
+        connections, and of the FLOPs per image, inference time per image
+        and accuracy before and after pruning, then exports the pruned
+        inference graph. Returns the kept connections.
+
+        Args:
+            threshold: `float`, fraction of a layer's highest CS below which
+                its connections are pruned;
+            data: dataset on which the graphs are evaluated and timed;
+            fine_tune_epochs: `int`, number of fine-tuning epochs with the
+                pruned connections masked (0 for no fine-tuning);
+            batch_size: `int`, number of examples in a fine-tuning batch;
+            learning_rate: `float`, learning rate for fine-tuning;
+            export_path: `str` or None, directory where the pruned graph is
+                written (if None, the model's export path is used).
+        """
+        kept_connections = self.get_kept_connections(threshold)
+        total = sum(len(kept) for kept_block in kept_connections
+                    for kept in kept_block)
+        total_before = sum(l + 1 for b in range(self.total_blocks)
+                           for l in range(self.layer_num_list[b]))
+        total_before += sum(self.layer_num_list[b] + 1
+                            for b in range(self.total_blocks - 1))
+        print("\nPruning connections with a CS below %.2f of their layer's"
+              " highest CS: %d of %d connections kept." % (
+                  threshold, total, total_before))
+        for b, kept_block in enumerate(kept_connections):
+            for l, kept in enumerate(kept_block):
+                name = 'layer %d' % l if l < self.layer_num_list[b] else (
+                    'transition')
+                print("\tBlock %d, %s: %s" % (b, name, kept))
+
+        # evaluate the network before pruning (and fine-tuning)
+        graph, images_input, prediction = self.build_inference_graph()
+        accuracy, ms_per_image = self.time_inference_graph(
+            graph, images_input, prediction, data)
+        report = [('before', get_graph_flops(graph), ms_per_image, accuracy)]
+
+        if fine_tune_epochs > 0:
+            self.connection_mask_op = self._define_connection_masks(
+                kept_connections)
+            self.sess.run(self.connection_mask_op)
+            for epoch in range(1, fine_tune_epochs + 1):
+                print("Fine-tuning the pruned network, epoch %d..." % epoch,
+                      end=' ')
+                loss, acc = self.train_one_epoch(
+                    self.data_provider.train, batch_size, learning_rate)
+                print("mean cross_entropy: %f, mean accuracy: %f" % (
+                    loss, acc))
+            self.connection_mask_op = None
+
+        graph, images_input, prediction = self.build_inference_graph(
+            kept_connections)
+        accuracy, ms_per_image = self.time_inference_graph(
+            graph, images_input, prediction, data)
+        report.append(('after', get_graph_flops(graph), ms_per_image,
+                       accuracy))
+        print("\n%-8s%16s%14s%10s" % ('', 'FLOPs/image', 'ms/image',
+                                      'accuracy'))
+        for name, flops, ms, acc in report:
+            print("%-8s%16d%14.4f%10.4f" % (name, flops, ms, acc))
+        print("FLOPs reduction: %.1f%%, inference time reduction: %.1f%%" % (
+            100 * (1 - report[1][1] / report[0][1]),
+            100 * (1 - report[1][2] / report[0][2])))
+
+        self.export_inference_graph(export_path, kept_connections)
+        return kept_connections
+
     # -------------------------------------------------------------------------
     # -------------------- TRAINING AND TESTING THE MODEL ---------------------
     # -------------------------------------------------------------------------
@@ -1545,16 +3080,9 @@ class DenseNet:
 
         if self.should_save_ft_logs:
             # save the previously printed feature values
-            self.feature_writer.write(("\"Epoch %d\"%s\"%f\"%s" % (
-                epoch, self.ftc, accuracy, self.ftc)).replace(".", self.ftd))
-            if validation_set:
-                for l in range(len(loss)):
-                    self.feature_writer.write(("\"%f\"%s" % (loss[l], self.ftc)
-                                               ).replace(".", self.ftd))
-            else:
-                self.feature_writer.write(("\"%f\"%s" % (loss, self.ftc)
-                                           ).replace(".", self.ftd))
-            self.feature_writer.write('\"\"')
+            self.feature_log.start_row('Epoch', epoch)
+            self.feature_log.add_values('accuracy', accuracy)
+            self.feature_log.add_values('loss', loss)
 
         if self.ft_filters:
             # process filters, sometimes save their state as images
@@ -1562,15 +3090,35 @@ class DenseNet:
             print('\n* Global input data (post-processed):')
             for b in range(0, self.total_blocks):
                 cs, lcs_dst, lcs_src = self.process_block_filters(b, epoch)
-                self.ft_log_filters(b, cs, lcs_dst, lcs_src)
+                self.ft_log_filters(b, cs, lcs_dst, lcs_src, epoch)
 
         print('-' * 40)
         if self.should_save_ft_logs:
-            self.feature_writer.write('\n')
+            self.feature_log.end_row()
 
     # SELF-CONSTRUCTING ALGORITHM VARIANTS ------------------------------------
     # -------------------------------------------------------------------------
 
+    def _new_layer_within_budget(self, epoch):
+        """
+        Adds a new layer to the last block, unless the network would then
+        exceed its compute budget: in that case, the ascension stage ends
+        (if it is not over yet) instead.
+        Returns True if the layer was added, False otherwise.
+
+        Args:
+            epoch: `int`, current training epoch (since adding the last block).
+        """
+        if self.fits_budget('layer'):
+            self._new_layer()
+            return True
+        if self.algorithm_stage == 0:
+            self.algorithm_stage += 1
+            if self.sc_var != 0 and self.sc_var != 1:
+                # max_n_ep is used to estimate completion time.
+                self.max_n_ep = epoch + self.patience_param
+        return False
+
     def self_constructing_var0(self, epoch):
         """
         A step of the self-constructing algorithm (variant #0) for one
@@ -1603,7 +3151,7 @@ class DenseNet:
                 self.settled_layers_ceil = settled_layers
                 self.algorithm_stage += 1
             elif (epoch-1) % self.asc_thresh == 0:
-                self._new_layer()
+                self._new_layer_within_budget(epoch)
 
         # stage #1 = improvement stage
         if self.algorithm_stage == 1:
@@ -1647,7 +3195,7 @@ class DenseNet:
                 self.settled_layers_ceil = settled_layers
                 self.algorithm_stage += 1
             elif (epoch-1) % self.asc_thresh == 0:
-                self._new_layer()
+                self._new_layer_within_budget(epoch)
 
         # stage #1 = improvement stage
         if self.algorithm_stage == 1:
@@ -1657,7 +3205,7 @@ class DenseNet:
                 self.algorithm_stage = 0
             elif settled_layers > self.settled_layers_ceil:
                 self.settled_layers_ceil = settled_layers
-                self._new_layer()
+                self._new_layer_within_budget(epoch)
 
         return continue_training
 
@@ -1695,7 +3243,7 @@ class DenseNet:
                 # max_n_ep is used to estimate completion time.
                 self.max_n_ep = epoch + self.patience_param
             elif (epoch-1) % self.asc_thresh == 0:
-                self._new_layer()
+                self._new_layer_within_budget(epoch)
 
         # stage #1 = improvement stage
         if self.algorithm_stage == 1:
@@ -1707,10 +3255,12 @@ class DenseNet:
             elif settled_layers > self.settled_layers_ceil:
                 # if a layer settles, add a layer and restart the countdown
                 self.settled_layers_ceil = settled_layers
-                self._new_layer()
-                self.patience_cntdwn = self.patience_param
-                # max_n_ep is used to estimate completion time.
-                self.max_n_ep = epoch + self.patience_param
+                if self._new_layer_within_budget(epoch):
+                    self.patience_cntdwn = self.patience_param
+                    # max_n_ep is used to estimate completion time.
+                    self.max_n_ep = epoch + self.patience_param
+                else:
+                    self.patience_cntdwn -= 1
             else:
                 self.patience_cntdwn -= 1
 
@@ -1745,7 +3295,7 @@ class DenseNet:
         # stage #0 = ascension stage
         if self.algorithm_stage == 0:
             if (epoch-1) % self.asc_thresh == 0:
-                self._new_layer()
+                self._new_layer_within_budget(epoch)
 
         # stage #1 = improvement stage
         if self.algorithm_stage == 1:
@@ -1757,10 +3307,12 @@ class DenseNet:
             elif settled_layers > self.settled_layers_ceil:
                 # if a layer settles, add a layer and restart the countdown
                 self.settled_layers_ceil = settled_layers
-                self._new_layer()
-                self.patience_cntdwn = self.patience_param
-                # max_n_ep is used to estimate completion time.
-                self.max_n_ep = epoch + self.patience_param
+                if self._new_layer_within_budget(epoch):
+                    self.patience_cntdwn = self.patience_param
+                    # max_n_ep is used to estimate completion time.
+                    self.max_n_ep = epoch + self.patience_param
+                else:
+                    self.patience_cntdwn -= 1
             else:
                 self.patience_cntdwn -= 1
 
@@ -1789,8 +3341,8 @@ class DenseNet:
         # stage #0 = ascension stage
         if self.algorithm_stage == 0:
             if (epoch-1) % self.asc_thresh == 0:
-                self._new_layer()
-            elif (epoch-1) % int(2) == 0:
+                self._new_layer_within_budget(epoch)
+            elif (epoch-1) % int(2) == 0 and self.fits_budget('kernels'):
                 self._new_kernels_to_last_layer()
 
         # stage #1 = improvement stage
@@ -1877,68 +3429,191 @@ class DenseNet:
         num_examples = data.num_examples
         total_loss = []
         total_accuracy = []
+        total_step_time = 0
+        interval_loss = []
+        interval_accuracy = []
+        interval_steps = 0  # steps aggregated in the graph
 
         # save each training batch's loss and accuracy
         for i in range(num_examples // batch_size):
-            batch = data.next_batch(batch_size)
+            with self.phase_timer.measure('data_fetch'):
+                batch = data.next_batch(batch_size)
             images, labels = batch
+            # cached features are fed as the output of the frozen blocks
+            if data is self.feature_cache:
+                inputs = self.frozen_output
+            else:
+                inputs = self.images
             feed_dict = {
-                self.images: images,
+                inputs: images,
                 self.labels: labels,
                 self.learning_rate: learning_rate,
                 self.is_training: True,
+                self.frozen_blocks_input: self.frozen_blocks,
             }
             fetches = [self.train_step, self.cross_entropy[-1], self.accuracy]
-            result = self.sess.run(fetches, feed_dict=feed_dict)
-            _, loss, accuracy = result
+            # the step after which a per-batch log will be written
+            should_log_batch = self.should_save_logs and (
+                (self.batches_step + 1) % self.log_batch_interval == 0)
+            if self.should_save_logs and self.should_use_summary_ops:
+                fetches.append(self.batch_log_update)
+            # trace the step with full details on certain steps
+            run_options, run_metadata = None, None
+            if (self.profile_period > 0 and
+                    self.batches_step % self.profile_period == 0):
+                run_options = tf.RunOptions(
+                    trace_level=tf.RunOptions.FULL_TRACE)
+                run_metadata = tf.RunMetadata()
+            with self.phase_timer.measure('train_step'):
+                step_start_time = time.time()
+                result = self.sess.run(fetches, feed_dict=feed_dict,
+                                       options=run_options,
+                                       run_metadata=run_metadata)
+                # keep pruned connections at zero (when fine-tuning)
+                if self.connection_mask_op is not None:
+                    self.sess.run(self.connection_mask_op)
+                total_step_time += time.time() - step_start_time
+            loss, accuracy = result[1:3]
             total_loss.append(loss)
             total_accuracy.append(accuracy)
-            if self.should_save_logs:
+            with self.phase_timer.measure('logging'):
+                if run_metadata is not None:
+                    self.save_step_profile(run_metadata, self.batches_step)
                 self.batches_step += 1
-                self.log_loss_accuracy(
-                    loss, accuracy, self.batches_step, prefix='per_batch',
-                    should_print=False)
+                if self.should_save_logs and not self.should_use_summary_ops:
+                    interval_loss.append(loss)
+                    interval_accuracy.append(accuracy)
+                elif self.should_save_logs:
+                    interval_steps += 1
+                if should_log_batch and self.should_use_summary_ops:
+                    self.write_batch_summary()
+                    interval_steps = 0
+                elif should_log_batch:
+                    self.log_batch_interval_stats(
+                        interval_loss, interval_accuracy, self.batches_step)
+                    interval_loss, interval_accuracy = [], []
+
+        # log the batches since the last per-batch log
+        if interval_loss:
+            self.log_batch_interval_stats(
+                interval_loss, interval_accuracy, self.batches_step)
+        elif interval_steps:
+            self.write_batch_summary()
 
         # use the saved data to calculate the mean loss and accuracy
         mean_loss = np.mean(total_loss)
         mean_accuracy = np.mean(total_accuracy)
+        self.mean_step_time = total_step_time / max(1, len(total_loss))
         return mean_loss, mean_accuracy
 
+    def build_feature_cache(self, data, batch_size):
+        """
+        Runs the frozen blocks once over a dataset (in inference mode, as
+        their batch normalisations also are when training), and caches their
+        output for each example, in memory or memory-mapped on disk (see
+        feature_cache_mb). The cache is then used as training data, fed
+        directly to the first trained layer.
+
+        Args:
+            data: training data yielded by the dataset's data provider;
+            batch_size: `int`, number of examples in a batch.
+        """
+        shape = [data.num_examples]
+        shape.extend(self.frozen_output.get_shape().as_list()[1:])
+        path = os.path.join(self.feature_cache_dir, '%s_block_%d.npy' % (
+            self.run_identifier, self.frozen_blocks-1))
+        features = allocate_features(shape, np.float32, self.feature_cache_mb,
+                                     path)
+        labels = []
+        start = 0
+        for images, batch_labels in data.eval_batches(batch_size):
+            feed_dict = {
+                self.images: images,
+                self.is_training: False,
+            }
+            end = start + batch_labels.shape[0]
+            features[start: end] = self.sess.run(
+                self.frozen_output, feed_dict=feed_dict,
+                options=self.eval_run_options)
+            labels.append(batch_labels)
+            start = end
+        shuffle = getattr(data, 'shuffle_every_epoch',
+                          getattr(data, 'shuffle', False))
+        self.feature_cache = FeatureCacheDataSet(
+            features, np.concatenate(labels), shuffle)
+        print("Cached the output of the frozen blocks (%s, %.1f MB%s)." % (
+            'x'.join(map(str, shape)), features.nbytes / 2**20,
+            ' on disk' if isinstance(features, np.memmap) else ''))
+
+    def release_feature_cache(self):
+        """
+        Releases the cached outputs of the frozen blocks (if any).
+        """
+        if self.feature_cache is not None:
+            self.feature_cache.delete()
+            self.feature_cache = None
+
     def test(self, data, batch_size):
         """
         Tests the model using the proper testing set.
+        Every example in the set is used exactly once (the last batch may be
+        smaller than batch_size), and the mean loss and accuracy are weighted
+        by the size of each batch. The dataset's training iteration state is
+        not modified.
 
         Args:
             data: testing data yielded by the dataset's data provider;
             batch_size: `int`, number of examples in a testing batch.
         """
-        num_examples = data.num_examples
-        total_loss = []
-        for l in range(len(self.cross_entropy)):
-            total_loss.append([])
-        total_accuracy = []
+        total_loss = np.zeros(len(self.cross_entropy))
+        total_accuracy = 0
+        num_examples = 0
 
-        # save each testing batch's loss and accuracy
-        for i in range(num_examples // batch_size):
-            batch = data.next_batch(batch_size)
+        # save each testing batch's loss and accuracy (weighted by its size)
+        for images, labels in data.eval_batches(batch_size):
             feed_dict = {
-                self.images: batch[0],
-                self.labels: batch[1],
+                self.images: images,
+                self.labels: labels,
                 self.is_training: False,
             }
-            loss = self.sess.run(self.cross_entropy, feed_dict=feed_dict)
-            accuracy = self.sess.run(self.accuracy, feed_dict=feed_dict)
-            for j in range(len(loss)):
-                total_loss[j].append(loss[j])
-            total_accuracy.append(accuracy)
+            fetches = [self.cross_entropy, self.accuracy]
+            loss, accuracy = self.sess.run(fetches, feed_dict=feed_dict,
+                                           options=self.eval_run_options)
+            batch_examples = labels.shape[0]
+            total_loss += np.array(loss) * batch_examples
+            total_accuracy += accuracy * batch_examples
+            num_examples += batch_examples
 
         # use the saved data to calculate the mean loss and accuracy
-        mean_loss = []
-        for loss_list in total_loss:
-            mean_loss.append(np.mean(loss_list))
-        mean_accuracy = np.mean(total_accuracy)
+        mean_loss = list(total_loss / num_examples)
+        mean_accuracy = total_accuracy / num_examples
         return mean_loss, mean_accuracy
 
+    def predict(self, images, batch_size=200):
+        """
+        Predicts the class probabilities for some given images, using the
+        current network in inference mode (no dropout, moving statistics in
+        batch normalisations). All images are processed, including those in
+        a last batch smaller than batch_size.
+        Returns an `np.ndarray` of shape [num_images, n_classes].
+
+        Args:
+            images: `np.ndarray`, 4D array of (normalised) images;
+            batch_size: `int`, number of images in a prediction batch.
+        """
+        predictions = []
+        for start in range(0, images.shape[0], batch_size):
+            feed_dict = {
+                self.images: images[start: start + batch_size],
+                self.is_training: False,
+            }
+            predictions.append(
+                self.sess.run(self.prediction, feed_dict=feed_dict,
+                              options=self.eval_run_options))
+        if not predictions:
+            return np.zeros((0, self.n_classes), dtype=np.float32)
+        return np.concatenate(predictions)
+
     def train_all_epochs(self, train_params):
         """
         Trains the model for a certain number of epochs, using parameters
@@ -1974,18 +3649,38 @@ class DenseNet:
         initial_lr = train_params['initial_learning_rate']
         learning_rate = train_params['initial_learning_rate']
         batch_size = train_params['batch_size']
+        # the batch size for which the learning rate is set
+        base_batch_size = batch_size
         rlr_1 = train_params['reduce_lr_1']
         rlr_2 = train_params['reduce_lr_2']
         validation_set = train_params.get('validation_set', False)
         total_start_time = time.time()
+        # number of examples processed per epoch (for images/sec)
+        train_examples = (self.data_provider.train.num_examples //
+                          batch_size) * batch_size
+        eval_examples = 0
+        if validation_set:
+            eval_examples = self.data_provider.validation.num_examples
+        if self.metrics_store is not None:
+            self.metrics_store.start_run(
+                self.run_identifier, self.model_type, self.dataset_name,
+                self.growth_rate, self.get_run_params(train_params))
 
         epoch = 1         # current training epoch
         epoch_last_b = 0  # epoch at which the last block was added
+        is_fine_tuning = False  # last epoch, after removing kernels
         while True:
             # only print epoch name on certain epochs
             if (epoch-1) % self.ft_period == 0:
                 print('\n', '-'*30, "Train epoch: %d" % epoch, '-'*30, '\n')
             start_time = time.time()
+            self.current_epoch = epoch
+
+            # adapt the batch size to the memory budget (after any growth)
+            if self.memory_budget_mb:
+                batch_size = self._adapt_batch_size(batch_size)
+                train_examples = (self.data_provider.train.num_examples //
+                                  batch_size) * batch_size
 
             # if not self-constructing, may reduce learning rate at some epochs
             if not self.should_self_construct and self.should_change_lr:
@@ -1996,34 +3691,63 @@ class DenseNet:
                     print("Learning rate has been divided by 10, new lr = %f" %
                           learning_rate)
 
-            # training step for one epoch
+            # training step for one epoch (from the cached features if any)
+            train_data = self.data_provider.train
+            if self.should_cache_features and self.frozen_blocks:
+                if self.feature_cache is None:
+                    with self.phase_timer.measure('feature_cache'):
+                        self.build_feature_cache(train_data, batch_size)
+                train_data = self.feature_cache
+            # the learning rate is scaled linearly with the batch size
+            train_learning_rate = learning_rate
+            if batch_size != base_batch_size:
+                train_learning_rate = (learning_rate * batch_size /
+                                       base_batch_size)
             print("Training...", end=' ')
             loss, acc = self.train_one_epoch(
-                self.data_provider.train, batch_size, learning_rate)
+                train_data, batch_size, train_learning_rate)
             # save logs
             if self.should_save_logs:
-                self.log_loss_accuracy(loss, acc, epoch, prefix='train')
+                with self.phase_timer.measure('logging'):
+                    self.log_loss_accuracy(loss, acc, epoch, prefix='train')
 
             # validation step after the epoch
             if validation_set:
                 print("Validation...")
-                loss, acc = self.test(
-                    self.data_provider.validation, batch_size)
+                with self.phase_timer.measure('validation'):
+                    loss, acc = self.test(
+                        self.data_provider.validation, batch_size)
                 # save logs
                 if self.should_save_logs:
-                    self.log_loss_accuracy(loss[-1], acc, epoch,
-                                           prefix='valid')
+                    with self.phase_timer.measure('logging'):
+                        self.log_loss_accuracy(loss[-1], acc, epoch,
+                                               prefix='valid')
 
             # save feature logs (on certain epochs)
             if (epoch-1) % self.ft_period == 0:
-                self.print_pertinent_features(loss, acc, epoch, validation_set)
+                with self.phase_timer.measure('feature_analysis'):
+                    self.print_pertinent_features(loss, acc, epoch,
+                                                  validation_set)
 
             # save model if required
             if self.should_save_model:
-                self.save_model()
+                with self.phase_timer.measure('checkpoint'):
+                    self.save_model()
+
+            # record the epoch's metrics (before any growth of the network)
+            if self.metrics_store is not None:
+                self.metrics_store.log_epoch(
+                    epoch, loss[-1] if validation_set else loss, acc,
+                    learning_rate, self.total_blocks,
+                    sum(self.layer_num_list), time.time() - start_time)
 
             # step of the self-constructing algorithm
+            self.phase_timer.start('feature_analysis')
             if self.should_self_construct:
+                # the fine-tuning epoch (already saved) ends the training
+                if is_fine_tuning:
+                    self.phase_timer.stop('feature_analysis')
+                    break
                 if epoch - epoch_last_b != 1:
                     # if the accuracy doesn't change much, ends the ascension.
                     if self.algorithm_stage == 0:
@@ -2038,10 +3762,22 @@ class DenseNet:
 
                     # can break here if self-constructing algorithm is over
                     if not self.self_constructing_step(epoch - epoch_last_b):
+                        # remove the negligible kernels in the last layer
+                        removed_kernels = 0
+                        if self.kernel_prune_threshold > 0:
+                            removed_kernels = (
+                                self._remove_kernels_from_last_layer())
                         # add another block if block_count not yet exceeded
-                        if self.total_blocks < self.block_count:
+                        # (and if it fits in the compute budget)
+                        if (self.total_blocks < self.block_count and
+                                self.fits_budget('block')):
                             self._new_block()
+                        elif removed_kernels:
+                            # fine-tune (and save) the network for one more
+                            # epoch before ending the training
+                            is_fine_tuning = True
                         else:
+                            self.phase_timer.stop('feature_analysis')
                             break
 
                     # optional learning rate reduction for self-constructing
@@ -2054,6 +3790,7 @@ class DenseNet:
                     self.settled_layers_ceil = 0  # highest num of settled lay
                     self.algorithm_stage = 0  # start with ascension stage
                     self.patience_cntdwn = self.patience_param
+            self.phase_timer.stop('feature_analysis')
 
             # measure training time for this epoch
             time_per_epoch = time.time() - start_time
@@ -2062,17 +3799,39 @@ class DenseNet:
                 str(timedelta(seconds=time_per_epoch)),
                 self.max_n_ep,
                 str(timedelta(seconds=seconds_left))))
+            # log the time spent in each phase of the epoch
+            if self.phase_timer.enabled:
+                self.log_phase_times(self.phase_timer.reset(), epoch,
+                                     train_examples, eval_examples)
+            # log the growth of the graph and of the process
+            if self.should_log_telemetry:
+                self.log_telemetry(epoch)
+            # log the estimated costs of the network
+            if self.should_log_costs:
+                self.log_costs(epoch, batch_size)
 
             # increase epoch, break at max_n_ep if not self-constructing
             epoch += 1
             if not self.should_self_construct and epoch >= self.max_n_ep+1:
                 break
 
+        # log the phase times for the last epoch (if it ended the training)
+        if self.phase_timer.times:
+            self.log_phase_times(self.phase_timer.reset(), epoch,
+                                 train_examples, eval_examples)
+
         # measure total training time
         total_training_time = time.time() - total_start_time
         print("\nTOTAL TRAINING TIME: %s\n" % str(timedelta(
             seconds=total_training_time)))
         if self.should_save_ft_logs:
-            self.feature_writer.write("\nTOTAL TRAINING TIME: %s\n" % str(
-                timedelta(seconds=total_training_time)))
+            self.feature_log.add_row('Total training time', epoch,
+                                     {'seconds': total_training_time})
+            self.save_feature_log()
+        if self.should_save_logs:
+            self.summary_writer.flush()
+        if self.metrics_store is not None:
+            self.metrics_store.end_run(total_training_time,
+                                       self.layer_num_list)
+        self.release_feature_cache()
         self._count_useful_trainable_params()
@@ -0,0 +1,141 @@
+from collections import OrderedDict
+
+
+# Size (in bytes) of the parameters and activations (float32).
+VALUE_BYTES = 4
+
+
+def get_kernel_num_list(layer_num_list, growth_rate):
+    """
+    Returns the number of kernels in each layer of each block (`list` of
+    `list` of `int`) of a network whose layers all have growth_rate kernels.
+
+    Args:
+        layer_num_list: `list` of `int`, number of layers in each block;
+        growth_rate: `int`, number of kernels in each layer.
+    """
+    return [[growth_rate] * layers for layers in layer_num_list]
+
+
+def get_layer_costs(data_shape, n_classes, kernel_num_list, growth_rate,
+                    first_output_features, bc_mode=False, reduction=1.0,
+                    batch_size=1, memory_efficient=False):
+    """
+    Computes analytically the costs of each layer of a DenseNet architecture
+    (without building its graph). Returns a `list` of `OrderedDict`, one for
+    each layer (initial convolution, dense layers, transition layers and
+    transition to classes), with its name (variable scope), its number of
+    trainable parameters, its number of multiply-adds per image, the size of
+    its parameters (bytes) and the size of the activations that it keeps
+    for the backward pass (bytes, for a batch).
+    The activations of a dense or transition layer are its input (the
+    concatenation of previous outputs), the batch norm and ReLU outputs,
+    and the convolution's output. In memory-efficient mode, only the
+    convolution's output is kept (the others are recomputed).
+
+    Args:
+        data_shape: `tuple` of `int`, shape of the images (height, width,
+            channels);
+        n_classes: `int`, number of classes;
+        kernel_num_list: `list` of `list` of `int`, number of kernels in each
+            layer of each block (see get_kernel_num_list);
+        growth_rate: `int`, growth rate (sets the bottleneck's width);
+        first_output_features: `int`, number of kernels in the initial
+            convolution;
+        bc_mode: `bool`, is the network a DenseNet-BC or not;
+        reduction: `float`, reduction (theta) in the transition layers;
+        batch_size: `int`, number of images in a batch (for activations);
+        memory_efficient: `bool`, are the inputs of the layers recomputed in
+            the backward pass or not (memory-efficient mode).
+    """
+    height, width, features = data_shape
+    # activations kept by a batch norm + ReLU on some features (input,
+    # batch norm and ReLU outputs), unless they are recomputed
+    bn_relu_maps = 0 if memory_efficient else 3
+    layers = []
+
+    def add_layer(name, params, macs, activations):
+        layers.append(OrderedDict([
+            ('name', name), ('params', params), ('macs', macs),
+            ('param_bytes', params * VALUE_BYTES),
+            ('activation_bytes', activations * batch_size * VALUE_BYTES)]))
+
+    # initial 3x3 convolution (same padding)
+    add_layer('Initial_convolution', 9 * features * first_output_features,
+              height * width * 9 * features * first_output_features,
+              height * width * first_output_features)
+    features = first_output_features
+    for b, kernel_nums in enumerate(kernel_num_list):
+        for l, kernels in enumerate(kernel_nums):
+            # batch norm (beta and gamma) + convolution(s)
+            if bc_mode:
+                # the bottleneck's output is never recomputed
+                inter_features = growth_rate * 4
+                params = (2 * features + features * inter_features +
+                          2 * inter_features + 9 * inter_features * kernels)
+                macs = height * width * (features * inter_features +
+                                         9 * inter_features * kernels)
+                activations = height * width * (
+                    bn_relu_maps * features + 3 * inter_features + kernels)
+            else:
+                params = 2 * features + 9 * features * kernels
+                macs = height * width * 9 * features * kernels
+                activations = height * width * (
+                    bn_relu_maps * features + kernels)
+            add_layer('Block_%d/layer_%d' % (b, l), params, macs,
+                      activations)
+            features += kernels
+        # all blocks except the last have transition layers (1x1 convolution
+        # and 2x2 average pooling)
+        if b != len(kernel_num_list) - 1:
+            out_features = int(features * reduction)
+            add_layer('Transition_after_block_%d' % b,
+                      2 * features + features * out_features,
+                      height * width * features * out_features,
+                      height * width * (bn_relu_maps * features +
+                                        out_features) +
+                      (height // 2) * (width // 2) * out_features)
+            features = out_features
+            height, width = height // 2, width // 2
+    # batch norm, global average pooling and FC layer (weights and biases)
+    add_layer('Transition_to_classes',
+              2 * features + features * n_classes + n_classes,
+              features * n_classes,
+              height * width * 2 * features + features + n_classes)
+    return layers
+
+
+def get_total_costs(layer_costs):
+    """
+    Returns the total costs of a network (`OrderedDict` with its number of
+    trainable parameters, of multiply-adds per image, and the sizes of its
+    parameters and activations), from the costs of its layers.
+
+    Args:
+        layer_costs: `list` of `dict`, the costs of each layer (see
+            get_layer_costs).
+    """
+    return OrderedDict(
+        (key, sum(layer[key] for layer in layer_costs))
+        for key in ['params', 'macs', 'param_bytes', 'activation_bytes'])
+
+
+def format_layer_costs(layer_costs):
+    """
+    Returns a table (`str`) with the costs of each layer and their totals:
+    parameters, multiply-adds per image (in millions), size of the
+    parameters and of the activations (in MB).
+
+    Args:
+        layer_costs: `list` of `dict`, the costs of each layer (see
+            get_layer_costs).
+    """
+    lines = ['%-32s %12s %12s %12s %16s' % (
+        'layer', 'params', 'M_mult_adds', 'params_MB', 'activations_MB')]
+    total = get_total_costs(layer_costs)
+    total['name'] = 'total'
+    for layer in layer_costs + [total]:
+        lines.append('%-32s %12d %12.3f %12.3f %16.3f' % (
+            layer['name'], layer['params'], layer['macs'] / 1e6,
+            layer['param_bytes'] / 2**20, layer['activation_bytes'] / 2**20))
+    return '\n'.join(lines)
@@ -0,0 +1,272 @@
+import os
+from datetime import timedelta
+
+import numpy as np
+
+
+# Columns of the feature log file (one feature per line, its values being
+# separated by spaces in the last column).
+FEATURE_LOG_COLUMNS = ['row', 'kind', 'epoch', 'key', 'block', 'layer',
+                       'values']
+
+# Kinds of rows written to the legacy CSV feature log (other kinds, e.g.
+# 'Phase times' or 'Telemetry', are only written there on demand).
+LEGACY_ROW_KINDS = ['Epoch', 'Total training time']
+
+# Keys that are preceded by an empty cell in the legacy CSV feature log.
+LEGACY_SEPARATED_KEYS = ['cs_dst', 'cs_src', 'lcs_src']
+
+
+class FeatureLog:
+    """
+    Feature log that accumulates records (rows) of feature values in memory,
+    and writes them in bulk to a compact CSV file with a schema header: each
+    line holds one feature, with the row it belongs to, the kind of row
+    (e.g. 'Epoch', 'Phase times'), the epoch, the name (key) of the feature,
+    the block and layer it concerns (-1 if none), and its values separated
+    by spaces (e.g. a CS table's row).
+
+    Values are added as whole arrays (e.g. all the CS for a layer), so that
+    logging does not require any formatting during the training.
+    The same rows are appended to a CSV feature log with locale-specific
+    separators (as read by spreadsheets) whenever they are written.
+    """
+
+    def __init__(self, path, csv_path=None, comma=';', decimal=',',
+                 extra_rows=False, flush_rows=10):
+        """
+        Args:
+            path: `str`, path of the feature log file (previous contents are
+                overwritten);
+            csv_path: `str` or None, path of the CSV feature log in the
+                legacy format (previous contents are overwritten), None to
+                not write it;
+            comma: `str`, 'comma' (value) separator for the CSV file;
+            decimal: `str`, 'decimal' separator for the CSV file;
+            extra_rows: `bool`, should the rows other than the epochs and
+                the total training time (e.g. phase times, telemetry) be
+                written to the CSV feature log or not;
+            flush_rows: `int`, number of rows kept in memory before they are
+                written to the files.
+        """
+        self.path = path
+        self.csv_path = csv_path
+        self.comma = comma
+        self.decimal = decimal
+        self.extra_rows = extra_rows
+        self.flush_rows = flush_rows
+        self.row_count = 0
+        self._rows = []
+        self._row = None
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path, 'w') as f:
+            f.write(','.join(FEATURE_LOG_COLUMNS) + '\n')
+        if csv_path is not None:
+            open(csv_path, 'w').close()
+
+    def start_row(self, kind, epoch):
+        """
+        Starts a new row (record) of feature values.
+
+        Args:
+            kind: `str`, kind of row (e.g. 'Epoch', 'Phase times');
+            epoch: `int`, epoch to which the values correspond.
+        """
+        if self._row is not None:
+            self.end_row()
+        self._row = (self.row_count, kind, epoch, [])
+
+    def add_values(self, key, values, block=-1, layer=-1):
+        """
+        Adds one or several values for a feature to the current row.
+
+        Args:
+            key: `str`, name of the feature (e.g. 'accuracy', 'cs_src');
+            values: `float` or array-like of `float`, the feature value(s);
+            block: `int`, block concerned by the feature (-1 if none);
+            layer: `int`, layer concerned by the feature (-1 if none).
+        """
+        values = np.asarray(values, dtype=np.float64).ravel()
+        self._row[3].append((key, block, layer, values))
+
+    def add_named_values(self, named_values):
+        """
+        Adds several single-valued features to the current row.
+
+        Args:
+            named_values: `dict`, feature names mapped to their values.
+        """
+        for key, value in named_values.items():
+            self.add_values(key, value)
+
+    def end_row(self):
+        """
+        Ends the current row, writes the pending rows to the files if there
+        are flush_rows of them.
+        """
+        if self._row is None:
+            return
+        self._rows.append(self._row)
+        self._row = None
+        self.row_count += 1
+        if len(self._rows) >= self.flush_rows:
+            self.flush()
+
+    def add_row(self, kind, epoch, named_values):
+        """
+        Adds a whole row of single-valued features.
+
+        Args:
+            kind: `str`, kind of row (e.g. 'Phase times');
+            epoch: `int`, epoch to which the values correspond;
+            named_values: `dict`, feature names mapped to their values.
+        """
+        self.start_row(kind, epoch)
+        self.add_named_values(named_values)
+        self.end_row()
+
+    def flush(self):
+        """
+        Writes all the ended rows to the feature log file, and appends them
+        to the CSV feature log.
+        """
+        rows, self._rows = self._rows, []
+        if not rows:
+            return
+        lines = []
+        for row, kind, epoch, features in rows:
+            for key, block, layer, values in features:
+                lines.append('%d,%s,%d,%s,%d,%d,%s\n' % (
+                    row, kind, epoch, key, block, layer,
+                    ' '.join(['%.9g' % v for v in values.tolist()])))
+        with open(self.path, 'a') as f:
+            f.write(''.join(lines))
+        if self.csv_path is not None:
+            with open(self.csv_path, 'a') as f:
+                f.write(''.join(
+                    render_legacy_row(
+                        kind, epoch, [(key, values)
+                                      for key, _, _, values in features],
+                        self.comma, self.decimal)
+                    for _, kind, epoch, features in rows
+                    if self.extra_rows or kind in LEGACY_ROW_KINDS))
+
+    def close(self):
+        """
+        Ends the current row (if any) and writes all pending rows.
+        """
+        self.end_row()
+        self.flush()
+
+    def export_csv(self, path, comma=';', decimal=',', extra_rows=False):
+        """
+        Writes the contents of the feature log to a CSV file in the legacy
+        format (one line per row, with quoted values, empty cells between
+        groups of values, and locale-specific separators).
+        Pending rows are written to the feature log file beforehand.
+
+        Args:
+            path: `str`, path of the CSV file to write;
+            comma: `str`, 'comma' (value) separator for the CSV file;
+            decimal: `str`, 'decimal' separator for the CSV file;
+            extra_rows: `bool`, should the rows other than the epochs and
+                the total training time be written or not.
+        """
+        self.flush()
+        export_legacy_csv(self.path, path, comma, decimal, extra_rows)
+
+
+def read_feature_log(path):
+    """
+    Reads a feature log file written by a FeatureLog (line by line, so
+    large logs are not loaded in memory at once).
+    Returns a `list` of rows, each as a tuple (kind, epoch, features), where
+    features is a `list` of (key, block, layer, values) tuples (values
+    being an `np.ndarray`).
+
+    Args:
+        path: `str`, path of the feature log file.
+    """
+    rows = []
+    last_row = None
+    with open(path) as f:
+        next(f)  # schema header
+        for line in f:
+            row, kind, epoch, key, block, layer, values = line.rstrip(
+                '\n').split(',', 6)
+            if row != last_row:
+                rows.append((kind, int(epoch), []))
+                last_row = row
+            rows[-1][2].append((key, int(block), int(layer), np.array(
+                values.split(), dtype=np.float64)))
+    return rows
+
+
+def format_legacy_values(values, decimal=','):
+    """
+    Formats values as quoted CSV cells for the legacy feature log.
+    Returns a `list` of `str`.
+
+    Args:
+        values: `np.ndarray`, the values to format;
+        decimal: `str`, decimal separator for the values.
+    """
+    cells = ['"%f"' % v for v in np.asarray(values).tolist()]
+    if decimal != '.':
+        cells = [cell.replace('.', decimal) for cell in cells]
+    return cells
+
+
+def render_legacy_row(kind, epoch, chunks, comma=';', decimal=','):
+    """
+    Renders a row of the feature log as a line of the legacy CSV format.
+
+    Args:
+        kind: `str`, kind of row (e.g. 'Epoch', 'Phase times');
+        epoch: `int`, epoch to which the values correspond;
+        chunks: `list` of (key, values), the values of each feature in the
+            row, in the order in which they were added;
+        comma: `str`, 'comma' (value) separator for the CSV file;
+        decimal: `str`, 'decimal' separator for the CSV file.
+    """
+    if kind == 'Total training time':
+        return '\nTOTAL TRAINING TIME: %s\n' % str(
+            timedelta(seconds=float(chunks[0][1][0])))
+    cells = ['"%s %d"' % (kind, epoch)]
+    for key, values in chunks:
+        if kind == 'Epoch':
+            # feature values for each epoch (accuracy, losses and filters)
+            if key in LEGACY_SEPARATED_KEYS:
+                cells.append('""')
+            cells.extend(format_legacy_values(values, decimal))
+            if key == 'loss':
+                cells.append('""')
+        else:
+            # named values (e.g. phase times, telemetry)
+            cells.append('"%s"' % key)
+            cells.extend(format_legacy_values(values, decimal))
+    return comma.join(cells) + '\n'
+
+
+def export_legacy_csv(log_path, csv_path, comma=';', decimal=',',
+                      extra_rows=False):
+    """
+    Converts a feature log file (written by a FeatureLog) to a CSV feature
+    log in the legacy format.
+
+    Args:
+        log_path: `str`, path of the feature log file;
+        csv_path: `str`, path of the CSV file to write;
+        comma: `str`, 'comma' (value) separator for the CSV file;
+        decimal: `str`, 'decimal' separator for the CSV file;
+        extra_rows: `bool`, should the rows other than the epochs and the
+            total training time (e.g. phase times, telemetry) be written or
+            not.
+    """
+    with open(csv_path, 'w') as f:
+        for kind, epoch, features in read_feature_log(log_path):
+            if extra_rows or kind in LEGACY_ROW_KINDS:
+                f.write(render_legacy_row(
+                    kind, epoch, [(key, values)
+                                  for key, _, _, values in features],
+                    comma, decimal))
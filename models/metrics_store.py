@@ -0,0 +1,282 @@
+import json
+import sqlite3
+from datetime import datetime
+
+
+# Tables and indexes of the metrics database.
+METRICS_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    run_id INTEGER PRIMARY KEY AUTOINCREMENT,
+    run_identifier TEXT NOT NULL,
+    model_type TEXT,
+    dataset TEXT,
+    growth_rate INTEGER,
+    params TEXT,
+    start_time TEXT,
+    end_time TEXT,
+    total_time REAL,
+    final_blocks INTEGER,
+    final_layers TEXT
+);
+CREATE TABLE IF NOT EXISTS epochs (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    epoch INTEGER NOT NULL,
+    loss REAL,
+    accuracy REAL,
+    learning_rate REAL,
+    total_blocks INTEGER,
+    total_layers INTEGER,
+    epoch_time REAL,
+    PRIMARY KEY (run_id, epoch)
+);
+CREATE TABLE IF NOT EXISTS layer_cs (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    epoch INTEGER NOT NULL,
+    block INTEGER NOT NULL,
+    layer INTEGER NOT NULL,
+    lcs_dst REAL,
+    lcs_src REAL
+);
+CREATE TABLE IF NOT EXISTS growth_events (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    epoch INTEGER NOT NULL,
+    event TEXT NOT NULL,
+    block INTEGER,
+    layer INTEGER,
+    kernels INTEGER,
+    duration REAL
+);
+CREATE TABLE IF NOT EXISTS timings (
+    run_id INTEGER NOT NULL REFERENCES runs(run_id),
+    epoch INTEGER NOT NULL,
+    phase TEXT NOT NULL,
+    value REAL
+);
+CREATE INDEX IF NOT EXISTS runs_identifier ON runs (run_identifier);
+CREATE INDEX IF NOT EXISTS layer_cs_run_epoch
+    ON layer_cs (run_id, epoch, block, layer);
+CREATE INDEX IF NOT EXISTS growth_events_run
+    ON growth_events (run_id, epoch);
+CREATE INDEX IF NOT EXISTS timings_run_phase ON timings (run_id, phase);
+"""
+
+
+class MetricsStore:
+    """
+    SQLite database recording the metrics of self-constructing experiments:
+    the runs (one per execution of train_all_epochs), and for each run the
+    metrics of each epoch, the 'layer CS' of each layer (for destinations
+    and sources), the growth events (new layers, blocks or kernels) and the
+    timings of each epoch's phases.
+
+    Several runs (and processes, one at a time) can share a database.
+    Changes are committed at the end of each epoch and of each run.
+    """
+
+    def __init__(self, path):
+        """
+        Args:
+            path: `str`, path of the SQLite database (created if needed).
+        """
+        self.path = path
+        self.connection = sqlite3.connect(path)
+        self.connection.row_factory = sqlite3.Row
+        self.connection.executescript(METRICS_SCHEMA)
+        self.connection.commit()
+        self.run_id = None
+
+    def start_run(self, run_identifier, model_type, dataset, growth_rate,
+                  params):
+        """
+        Records a new run, whose metrics are then recorded by the other
+        methods. Returns the run's id (`int`).
+
+        Args:
+            run_identifier: `str`, identifier for the run (see DenseNet);
+            model_type: `str`, 'DenseNet' or 'DenseNet-BC';
+            dataset: `str`, name of the dataset;
+            growth_rate: `int`, the model's growth rate;
+            params: `dict`, other parameters of the run (saved as JSON).
+        """
+        cursor = self.connection.execute(
+            "INSERT INTO runs (run_identifier, model_type, dataset,"
+            " growth_rate, params, start_time) VALUES (?, ?, ?, ?, ?, ?)",
+            (run_identifier, model_type, dataset, growth_rate,
+             json.dumps(params), datetime.now().isoformat(' ')))
+        self.connection.commit()
+        self.run_id = cursor.lastrowid
+        return self.run_id
+
+    def log_epoch(self, epoch, loss, accuracy, learning_rate, total_blocks,
+                  total_layers, epoch_time):
+        """
+        Records the metrics of an epoch (and commits all pending changes).
+
+        Args:
+            epoch: `int`, the epoch;
+            loss: `float`, loss (cross_entropy) for the epoch;
+            accuracy: `float`, accuracy for the epoch;
+            learning_rate: `float`, learning rate used during the epoch;
+            total_blocks: `int`, number of blocks in the network;
+            total_layers: `int`, number of layers in the network;
+            epoch_time: `float`, duration of the epoch (in seconds).
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO epochs VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+            (self.run_id, epoch, float(loss), float(accuracy),
+             float(learning_rate), total_blocks, total_layers, epoch_time))
+        self.connection.commit()
+
+    def log_layer_cs(self, epoch, block, lcs_dst, lcs_src):
+        """
+        Records the 'layer CS' of all layers in a block for an epoch.
+        Nothing is recorded outside of a run (e.g. when only testing).
+
+        Args:
+            epoch: `int`, the epoch;
+            block: `int`, identifier number for the block;
+            lcs_dst: `list` of `float`, 'layer CS' for destinations;
+            lcs_src: `list` of `float`, 'layer CS' for sources.
+        """
+        if self.run_id is None:
+            return
+        self.connection.executemany(
+            "INSERT INTO layer_cs VALUES (?, ?, ?, ?, ?, ?)",
+            [(self.run_id, epoch, block, l, float(dst), float(src))
+             for l, (dst, src) in enumerate(zip(lcs_dst, lcs_src))])
+
+    def log_growth_event(self, epoch, event, block, layer, kernels,
+                         duration):
+        """
+        Records a growth event of the network.
+
+        Args:
+            epoch: `int`, epoch during which the event happened;
+            event: `str`, 'layer', 'block', 'kernels' or 'removed_kernels';
+            block: `int`, block in which the growth happened;
+            layer: `int`, layer in which the growth happened;
+            kernels: `int`, number of kernels added (or removed);
+            duration: `float`, duration of the event (in seconds).
+        """
+        self.connection.execute(
+            "INSERT INTO growth_events VALUES (?, ?, ?, ?, ?, ?, ?)",
+            (self.run_id, epoch, event, block, layer, kernels, duration))
+
+    def log_timings(self, epoch, timings):
+        """
+        Records the timings (phase times, images per second, etc.) of an
+        epoch.
+
+        Args:
+            epoch: `int`, the epoch;
+            timings: `dict`, names of the timings mapped to their values.
+        """
+        self.connection.executemany(
+            "INSERT INTO timings VALUES (?, ?, ?, ?)",
+            [(self.run_id, epoch, phase, float(value))
+             for phase, value in timings.items()])
+
+    def end_run(self, total_time, layer_num_list):
+        """
+        Records the end of the current run (and commits all changes), after
+        which no run is active.
+
+        Args:
+            total_time: `float`, total training time (in seconds);
+            layer_num_list: `list` of `int`, final number of layers in each
+                block.
+        """
+        self.connection.execute(
+            "UPDATE runs SET end_time = ?, total_time = ?, final_blocks = ?,"
+            " final_layers = ? WHERE run_id = ?",
+            (datetime.now().isoformat(' '), total_time, len(layer_num_list),
+             ','.join(map(str, layer_num_list)), self.run_id))
+        self.connection.commit()
+        self.run_id = None
+
+    def close(self):
+        """Commits all changes and closes the database."""
+        self.connection.commit()
+        self.connection.close()
+
+    # QUERIES -----------------------------------------------------------------
+    # -------------------------------------------------------------------------
+
+    def get_runs(self):
+        """
+        Returns a `list` of `sqlite3.Row` with all the recorded runs, and for
+        each one its number of epochs and its best and final accuracy.
+        """
+        return self.connection.execute(
+            "SELECT runs.*, COUNT(epochs.epoch) AS epochs,"
+            " MAX(epochs.accuracy) AS best_accuracy,"
+            " (SELECT accuracy FROM epochs AS e WHERE e.run_id = runs.run_id"
+            "  ORDER BY e.epoch DESC LIMIT 1) AS final_accuracy"
+            " FROM runs LEFT JOIN epochs ON epochs.run_id = runs.run_id"
+            " GROUP BY runs.run_id ORDER BY runs.run_id").fetchall()
+
+    def get_run_ids(self, run):
+        """
+        Returns the ids (`list` of `int`) of the runs matching a run id or
+        (a part of) a run identifier.
+
+        Args:
+            run: `str`, a run id or (a part of) a run identifier.
+        """
+        if run.isdigit():
+            return [int(run)]
+        return [row[0] for row in self.connection.execute(
+            "SELECT run_id FROM runs WHERE run_identifier LIKE ?"
+            " ORDER BY run_id", ('%' + run + '%',))]
+
+    def get_epochs(self, run_id):
+        """
+        Returns a `list` of `sqlite3.Row` with the metrics of every epoch of
+        a run.
+
+        Args:
+            run_id: `int`, id of the run.
+        """
+        return self.connection.execute(
+            "SELECT * FROM epochs WHERE run_id = ? ORDER BY epoch",
+            (run_id,)).fetchall()
+
+    def get_growth_events(self, run_id):
+        """
+        Returns a `list` of `sqlite3.Row` with the growth events of a run.
+
+        Args:
+            run_id: `int`, id of the run.
+        """
+        return self.connection.execute(
+            "SELECT * FROM growth_events WHERE run_id = ? ORDER BY rowid",
+            (run_id,)).fetchall()
+
+    def get_mean_timings(self, run_id):
+        """
+        Returns a `dict` mapping each timing (phase) of a run to its mean
+        value over all epochs.
+
+        Args:
+            run_id: `int`, id of the run.
+        """
+        return dict(self.connection.execute(
+            "SELECT phase, AVG(value) FROM timings WHERE run_id = ?"
+            " GROUP BY phase ORDER BY MIN(rowid)", (run_id,)).fetchall())
+
+    def get_layer_cs(self, run_id, epoch=None):
+        """
+        Returns a `list` of `sqlite3.Row` with the 'layer CS' of every layer
+        of a run, for a given epoch (by default the last recorded epoch).
+
+        Args:
+            run_id: `int`, id of the run;
+            epoch: `int` or None, the epoch.
+        """
+        if epoch is None:
+            epoch = self.connection.execute(
+                "SELECT MAX(epoch) FROM layer_cs WHERE run_id = ?",
+                (run_id,)).fetchone()[0]
+        return self.connection.execute(
+            "SELECT * FROM layer_cs WHERE run_id = ? AND epoch = ?"
+            " ORDER BY block, layer", (run_id, epoch)).fetchall()
@@ -0,0 +1,230 @@
+import os
+import re
+import sys
+import time
+from collections import OrderedDict
+from contextlib import contextmanager
+
+import numpy as np
+
+
+# Variable scopes by which op costs are aggregated (blocks' layers, etc.).
+LAYER_SCOPE_RE = re.compile(
+    r'(Initial_convolution|Block_\d+/layer_\d+|Transition_after_block_\d+'
+    r'|Transition_to_FC_block_\d+|FC_block_\d+)')
+COST_PHASES = ['forward', 'backward', 'update']
+
+
+def is_counted_device(device_name):
+    """
+    Returns True if the op stats for a given device should be counted
+    (avoids counting GPU ops twice, as launches and as stream executions).
+
+    Args:
+        device_name: `str`, name of the device in the step stats.
+    """
+    if 'stream:' in device_name:
+        return device_name.endswith('stream:all')
+    return 'memcpy' not in device_name and 'gpu' not in device_name.lower()
+
+
+def get_op_scope_and_phase(node_name):
+    """
+    Returns the layer scope (e.g. 'Block_0/layer_3') that an op belongs to,
+    and the phase of the training step in which it runs ('forward',
+    'backward' or 'update'). Ops outside any layer have the scope 'other'.
+
+    Args:
+        node_name: `str`, name of the op's node in the graph.
+    """
+    match = LAYER_SCOPE_RE.search(node_name)
+    scope = match.group(1) if match else 'other'
+    if node_name.startswith('gradients'):
+        phase = 'backward'
+    elif 'Momentum' in node_name or '/update_' in node_name:
+        phase = 'update'
+    else:
+        phase = 'forward'
+    return scope, phase
+
+
+def aggregate_op_costs(step_stats, costs=None):
+    """
+    Aggregates the execution time of all ops in a traced step by layer scope
+    and by phase. Returns an `OrderedDict` mapping each scope to a `dict`
+    with the time (in microseconds) spent in each phase.
+
+    Args:
+        step_stats: `StepStats` proto, from the RunMetadata of a traced step;
+        costs: `OrderedDict` or None, previously aggregated costs to which
+            the new ones are added.
+    """
+    if costs is None:
+        costs = OrderedDict()
+    for dev_stats in step_stats.dev_stats:
+        if not is_counted_device(dev_stats.device):
+            continue
+        for node_stats in dev_stats.node_stats:
+            scope, phase = get_op_scope_and_phase(node_stats.node_name)
+            if scope not in costs:
+                costs[scope] = dict((p, 0) for p in COST_PHASES)
+            costs[scope][phase] += node_stats.all_end_rel_micros
+    return costs
+
+
+def write_layer_costs(costs, path, title=''):
+    """
+    Writes a table with the aggregated op costs per layer scope (sorted by
+    decreasing total time) to a text file. Returns the table as a `str`.
+
+    Args:
+        costs: `dict`, aggregated costs (see aggregate_op_costs);
+        path: `str`, path of the file to write;
+        title: `str`, a title line for the table.
+    """
+    total = sum(sum(c.values()) for c in costs.values()) or 1
+    lines = [title] if title else []
+    lines.append('%-32s %12s %12s %12s %12s %7s' % (
+        'scope', 'forward_ms', 'backward_ms', 'update_ms', 'total_ms',
+        'share'))
+    for scope, c in sorted(costs.items(), key=lambda item: -sum(
+            item[1].values())):
+        lines.append('%-32s %12.3f %12.3f %12.3f %12.3f %6.1f%%' % (
+            scope, c['forward'] / 1e3, c['backward'] / 1e3,
+            c['update'] / 1e3, sum(c.values()) / 1e3,
+            100 * sum(c.values()) / total))
+    table = '\n'.join(lines) + '\n'
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    with open(path, 'w') as f:
+        f.write(table)
+    return table
+
+
+class PhaseTimer:
+    """
+    Accumulates the wall time spent in named phases of the training (e.g.
+    'data_fetch', 'train_step', 'validation'), until the times are reset
+    (usually once per epoch).
+
+    Phases may be nested: the time of an inner phase is only counted for
+    that phase, and not for the outer one (e.g. a growth event during a
+    self-constructing step is not counted as feature analysis).
+    When the timer is disabled, measuring a phase does nothing.
+    """
+
+    def __init__(self, enabled=True):
+        """
+        Args:
+            enabled: `bool`, should the phases be timed or not.
+        """
+        self.enabled = enabled
+        self.times = OrderedDict()
+        self._stack = []
+
+    def start(self, phase):
+        """
+        Starts measuring the time spent in a phase (until stop is called).
+
+        Args:
+            phase: `str`, name of the phase.
+        """
+        if self.enabled:
+            # each entry: [phase, start time, time spent in nested phases]
+            self._stack.append([phase, time.time(), 0])
+
+    def stop(self, phase):
+        """
+        Stops measuring the time spent in a phase (the last started one).
+
+        Args:
+            phase: `str`, name of the phase.
+        """
+        if not self.enabled:
+            return
+        entry = self._stack.pop()
+        assert entry[0] == phase, "Phase %s stopped while measuring %s" % (
+            phase, entry[0])
+        elapsed = time.time() - entry[1]
+        self.add(phase, elapsed - entry[2])
+        if self._stack:
+            self._stack[-1][2] += elapsed
+
+    @contextmanager
+    def measure(self, phase):
+        """
+        Context manager that measures the time spent inside it for a phase.
+
+        Args:
+            phase: `str`, name of the phase.
+        """
+        self.start(phase)
+        try:
+            yield
+        finally:
+            self.stop(phase)
+
+    def add(self, phase, seconds):
+        """
+        Adds some time to a phase.
+
+        Args:
+            phase: `str`, name of the phase;
+            seconds: `float`, time to add (in seconds).
+        """
+        self.times[phase] = self.times.get(phase, 0) + seconds
+
+    def reset(self):
+        """
+        Resets all the phase times, returns the previous times as an
+        `OrderedDict` (phase names to seconds).
+        """
+        times = self.times
+        self.times = OrderedDict()
+        return times
+
+
+def get_graph_flops(graph):
+    """
+    Returns the number of floating point operations (`int`, a multiply-add
+    counts as 2) needed per example by the convolutions and matrix
+    multiplications in a graph, from the static shapes of their inputs and
+    outputs (the batch dimension being ignored).
+
+    Args:
+        graph: `tf.Graph`, the graph (e.g. an inference graph).
+    """
+    flops = 0
+    for op in graph.get_operations():
+        if op.type == 'Conv2D':
+            out_shape = op.outputs[0].get_shape().as_list()[1:]
+            filter_shape = op.inputs[1].get_shape().as_list()
+            # output elements * (kernel height * width * input features)
+            flops += 2 * int(np.prod(out_shape)) * int(
+                np.prod(filter_shape[:3]))
+        elif op.type == 'MatMul':
+            in_features, out_features = op.inputs[1].get_shape().as_list()
+            flops += 2 * in_features * out_features
+    return flops
+
+
+def get_process_rss():
+    """
+    Returns the resident set size (RSS) of the current process in bytes.
+    The current RSS is read from /proc on Linux, elsewhere the peak RSS
+    is returned instead.
+    """
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (IOError, OSError, ValueError):
+        return get_peak_rss()
+
+
+def get_peak_rss():
+    """
+    Returns the peak resident set size (RSS) of the current process in bytes.
+    """
+    import resource
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is given in bytes on macOS, in kilobytes elsewhere
+    return max_rss if sys.platform == 'darwin' else max_rss * 1024
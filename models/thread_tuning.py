@@ -0,0 +1,217 @@
+import hashlib
+import json
+import os
+import platform
+import socket
+from collections import OrderedDict
+
+
+# Default path of the cache of tuned thread settings.
+DEFAULT_THREAD_CACHE = os.path.join(
+    os.path.expanduser('~'), '.cache', 'vision_networks',
+    'thread_settings.json')
+
+# OpenMP/MKL environment settings applied with the tuned thread settings
+# (used by MKL builds of TensorFlow, harmless otherwise).
+KMP_BLOCKTIME = '1'
+KMP_AFFINITY = 'granularity=fine,compact,1,0'
+
+
+def get_cpu_model():
+    """
+    Returns the model name of the CPU (`str`), from /proc/cpuinfo on Linux
+    or from the platform module elsewhere.
+    """
+    try:
+        with open('/proc/cpuinfo') as f:
+            for line in f:
+                if line.startswith('model name'):
+                    return line.split(':', 1)[1].strip()
+    except (IOError, OSError):
+        pass
+    return platform.processor() or platform.machine()
+
+
+def get_host_fingerprint():
+    """
+    Returns a fingerprint (`str`) of the current host and its CPU
+    architecture: tuned thread settings are only reused on the same host
+    with the same hardware.
+    """
+    description = '%s|%s|%s|%d' % (socket.gethostname(), platform.machine(),
+                                   get_cpu_model(), os.cpu_count() or 1)
+    return hashlib.sha1(description.encode()).hexdigest()[:16]
+
+
+def get_workload_key(implementation, model_type, growth_rate,
+                     layer_num_list, batch_size):
+    """
+    Returns a key (`str`) identifying a workload (network architecture and
+    batch size) for which thread settings are tuned.
+
+    Args:
+        implementation: `str`, DenseNet implementation (module in models);
+        model_type: `str`, 'DenseNet' or 'DenseNet-BC';
+        growth_rate: `int`, the model's growth rate;
+        layer_num_list: `str`, number of layers in each block (e.g. '12,12');
+        batch_size: `int`, number of examples in a training batch.
+    """
+    return '%s %s k=%d layers=%s batch=%d' % (
+        implementation, model_type, growth_rate, layer_num_list, batch_size)
+
+
+def get_candidate_settings(cpu_count=None):
+    """
+    Returns the `list` of candidate thread settings (`dict`) to calibrate:
+    numbers of intra-operation threads (a quarter, half or all of the CPUs,
+    also used for OpenMP) and of inter-operation threads (1 or 2).
+
+    Args:
+        cpu_count: `int` or None, number of CPUs (default: all CPUs).
+    """
+    cpu_count = cpu_count or os.cpu_count() or 1
+    intra_options = sorted(set(max(1, cpu_count // d) for d in [4, 2, 1]))
+    return [OrderedDict([('num_intra_threads', intra),
+                         ('num_inter_threads', inter),
+                         ('omp_num_threads', intra)])
+            for intra in intra_options for inter in [1, 2]]
+
+
+def apply_thread_env(omp_num_threads):
+    """
+    Sets the OpenMP/MKL environment variables for a number of threads.
+    This is only effective before TensorFlow is imported.
+
+    Args:
+        omp_num_threads: `int` or None, number of OpenMP threads (None to
+            keep the current environment).
+    """
+    if omp_num_threads is None:
+        return
+    os.environ['OMP_NUM_THREADS'] = str(omp_num_threads)
+    os.environ.setdefault('KMP_BLOCKTIME', KMP_BLOCKTIME)
+    os.environ.setdefault('KMP_AFFINITY', KMP_AFFINITY)
+
+
+def select_best_settings(candidates, results):
+    """
+    Selects the best thread settings from the calibration results: the
+    settings with the highest training throughput, and the number of
+    inter-operation threads with the highest evaluation throughput for the
+    same intra-operation threads (the intra-operation and OpenMP threads are
+    shared by the whole process, unlike the inter-operation thread pools).
+    Returns an `OrderedDict` with the selected settings and throughputs, or
+    None if no calibration run succeeded.
+
+    Args:
+        candidates: `list` of `dict`, the calibrated thread settings;
+        results: `list` of `dict`, the metrics of each calibration run.
+    """
+    runs = [(c, r) for c, r in zip(candidates, results) if 'error' not in r]
+    if not runs:
+        return None
+    train, train_metrics = max(
+        runs, key=lambda run: run[1]['train_images_per_sec'])
+    evaluation, eval_metrics = max(
+        [run for run in runs if run[0]['num_intra_threads'] ==
+         train['num_intra_threads']],
+        key=lambda run: run[1]['eval_images_per_sec'])
+    return OrderedDict([
+        ('num_intra_threads', train['num_intra_threads']),
+        ('num_inter_threads', train['num_inter_threads']),
+        ('num_eval_inter_threads', evaluation['num_inter_threads']),
+        ('omp_num_threads', train['omp_num_threads']),
+        ('train_images_per_sec', train_metrics['train_images_per_sec']),
+        ('eval_images_per_sec', eval_metrics['eval_images_per_sec'])])
+
+
+class ThreadSettingsCache:
+    """
+    JSON file with the tuned thread settings for each host (fingerprint)
+    and workload.
+    """
+
+    def __init__(self, path=DEFAULT_THREAD_CACHE):
+        """
+        Args:
+            path: `str`, path of the JSON cache file.
+        """
+        self.path = path
+        self.settings = {}
+        if os.path.exists(path):
+            with open(path) as f:
+                self.settings = json.load(f)
+
+    def get(self, fingerprint, workload):
+        """
+        Returns the tuned settings (`dict`) for a host and workload, or
+        None if they were never tuned.
+
+        Args:
+            fingerprint: `str`, the host fingerprint;
+            workload: `str`, the workload key.
+        """
+        return self.settings.get(fingerprint, {}).get(workload)
+
+    def set(self, fingerprint, workload, settings):
+        """
+        Saves the tuned settings for a host and workload.
+
+        Args:
+            fingerprint: `str`, the host fingerprint;
+            workload: `str`, the workload key;
+            settings: `dict`, the tuned settings.
+        """
+        self.settings.setdefault(fingerprint, {})[workload] = settings
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        with open(self.path, 'w') as f:
+            json.dump(self.settings, f, indent=2, sort_keys=True)
+
+
+def autotune_threads(workload_config, run_calibration,
+                     cache_path=DEFAULT_THREAD_CACHE, retune=False):
+    """
+    Returns the best thread settings for a workload on the current host:
+    they are read from the cache if they were already tuned, otherwise they
+    are calibrated (one short run for each candidate setting) and cached.
+    Returns None if the calibration failed.
+
+    Args:
+        workload_config: `dict`, parameters of the workload (implementation,
+            model_type, growth_rate, layer_num_list, batch_size), passed to
+            run_calibration with each candidate thread setting;
+        run_calibration: function taking a `dict` of workload parameters and
+            thread settings, which runs the workload (in a new process, so
+            that OpenMP settings are applied) and returns its metrics
+            (train_images_per_sec and eval_images_per_sec, or an 'error');
+        cache_path: `str`, path of the JSON cache file;
+        retune: `bool`, should the settings be calibrated even if cached.
+    """
+    cache = ThreadSettingsCache(cache_path)
+    fingerprint = get_host_fingerprint()
+    workload = get_workload_key(
+        workload_config['implementation'], workload_config['model_type'],
+        workload_config['growth_rate'], workload_config['layer_num_list'],
+        workload_config['batch_size'])
+    settings = cache.get(fingerprint, workload)
+    if settings is not None and not retune:
+        print("Using cached thread settings for: %s" % workload)
+        return settings
+
+    print("Calibrating thread settings for: %s" % workload)
+    candidates = get_candidate_settings()
+    results = []
+    for candidate in candidates:
+        config = dict(workload_config)
+        config.update(candidate)
+        metrics = run_calibration(config)
+        print("\tintra=%d, inter=%d: %s" % (
+            candidate['num_intra_threads'], candidate['num_inter_threads'],
+            metrics.get('error') or 'train %.1f, eval %.1f images/sec' % (
+                metrics['train_images_per_sec'],
+                metrics['eval_images_per_sec'])))
+        results.append(metrics)
+    settings = select_best_settings(candidates, results)
+    if settings is not None:
+        cache.set(fingerprint, workload, settings)
+    return settings
@@ -1,14 +1,37 @@
 import argparse
+import importlib
 import os
 
-# from models.OLD_dense_net import DenseNet
-# from models.dense_net import DenseNet
-# from models.NEW_dense_net import DenseNet
-from models.NEWER_dense_net import DenseNet
 from data_providers.utils import get_data_provider_by_name
+from models.thread_tuning import DEFAULT_THREAD_CACHE, autotune_threads, \
+    apply_thread_env
 
 os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
 
+# Options only supported by the NEWER_dense_net implementation (the other
+# implementations ignore them), by destination with their flag.
+NEWER_ONLY_OPTIONS = {
+    'sparse_labels': '--sparse-labels',
+    'growth_init': '--growth_init',
+    'kernel_prune_threshold': '--kernel_prune_threshold',
+    'should_freeze_blocks': '--freeze-blocks',
+    'should_cache_features': '--feature-cache',
+    'log_batch_interval': '--log_batch_interval',
+    'should_use_summary_ops': '--summary-ops',
+    'metrics_db': '--metrics_db',
+    'num_eval_inter_threads': '--num_eval_inter_threads',
+    'data_format': '--data_format',
+    'should_fuse_batch_norm': '--fused-bn',
+    'should_use_xla': '--xla',
+    'should_recompute_features': '--memory-efficient',
+    'should_time_phases': '--phase-timings',
+    'should_log_telemetry': '--telemetry',
+    'telemetry_alarm_mb': '--telemetry_alarm_mb',
+    'should_log_costs': '--log-costs',
+    'profile_period': '--profile_period',
+    'ft_extra_rows': '--ft-extra-rows',
+}
+
 # Training parameters for CIFAR datasets (10, 100, 10+, 100+).
 train_params_cifar = {
     'batch_size': 64,
@@ -36,12 +59,31 @@ train_params_svhn = {
 }
 
 
+# Training parameters for the Synthetic dataset (generated, no download).
+train_params_synthetic = {
+    'batch_size': 64,
+    'max_n_ep': 10,
+    'initial_learning_rate': 0.1,
+    'reduce_lr_1': 0.5,
+    'reduce_lr_2': 0.75,
+    'validation_set': True,
+    'validation_split': 0.1,  # None or float
+    'shuffle': True,  # shuffle dataset every epoch or not
+    'normalization': None,  # the generated images are already normalised
+    'train_size': 5000,
+    'test_size': 1000,
+    'seed': 0,
+}
+
+
 # Get the right parameters for the current dataset.
 def get_train_params_by_name(name):
     if name in ['C10', 'C10+', 'C100', 'C100+']:
         return train_params_cifar
     if name == 'SVHN':
         return train_params_svhn
+    if name == 'Synthetic':
+        return train_params_synthetic
 
 
 # Parse arguments for the program.
@@ -57,8 +99,32 @@ if __name__ == '__main__':
         help='Test model for required dataset if pretrained model exists.'
              'If provided together with `--train` flag testing will be'
              'performed right after training.')
+    parser.add_argument(
+        '--export', action='store_true',
+        help='Export a frozen inference graph (batch norm folded, dropout'
+             ' removed, variables as constants) for the model. If provided'
+             ' without `--train`, the pretrained model is loaded first.')
+    parser.add_argument(
+        '--prune_threshold', '-prune', type=float, default=0, metavar='',
+        help='With `--export`, prune the connections whose CS is below this'
+             ' fraction of their layer\'s highest CS in the exported graph,'
+             ' and report the FLOPs, inference time and accuracy before and'
+             ' after pruning (default: %(default)s, no pruning).')
+    parser.add_argument(
+        '--prune_fine_tune_epochs', '-pft', type=int, default=0,
+        metavar='',
+        help='Number of epochs of fine-tuning with the pruned connections'
+             ' masked, before exporting (default: %(default)s).')
 
     # Parameters that define the current DenseNet model.
+    parser.add_argument(
+        '--implementation', '-impl', type=str,
+        choices=['dense_net', 'NEW_dense_net', 'NEWER_dense_net'],
+        default='NEWER_dense_net',
+        help='DenseNet implementation to use (module in models): dense_net'
+             ' (one variable per layer), NEW_dense_net (per-kernel variables)'
+             ' or NEWER_dense_net (default, also with inference export,'
+             ' profiling, etc.).')
     parser.add_argument(
         '--model_type', '-m', type=str, choices=['DenseNet', 'DenseNet-BC'],
         default='DenseNet',
@@ -69,7 +135,7 @@ if __name__ == '__main__':
         help='Growth rate (number of convolutions in a new dense layer).')
     parser.add_argument(
         '--dataset', '-ds', type=str,
-        choices=['C10', 'C10+', 'C100', 'C100+', 'SVHN'],
+        choices=['C10', 'C10+', 'C100', 'C100+', 'SVHN', 'Synthetic'],
         default='C10',
         help='Choice of dataset to use.')
     parser.add_argument(
@@ -90,6 +156,15 @@ if __name__ == '__main__':
     parser.add_argument(
         '--reduction', '-red', '-theta', type=float, default=0.5, metavar='',
         help='Reduction (theta) at transition layer, for DenseNets-BC models.')
+    parser.add_argument(
+        '--sparse-labels', dest='sparse_labels', action='store_true',
+        help='Keep labels as class numbers (int) instead of one-hot vectors,'
+             ' and use a sparse softmax cross-entropy (less label memory'
+             ' and feeding bandwidth).')
+    parser.add_argument(
+        '--one-hot-labels', dest='sparse_labels', action='store_false',
+        help='Use one-hot vectors (float) as labels.')
+    parser.set_defaults(sparse_labels=False)
 
     # What kind of algorithm (self-constructing, training, etc.) to apply.
     parser.add_argument(
@@ -182,6 +257,68 @@ if __name__ == '__main__':
         default=1,  # by default, convolutions are added one by one
         help='Expansion rate (rate at which new convolutions are added'
              ' together during the self-construction of a dense layer).')
+    parser.add_argument(
+        '--growth_init', '-ginit', type=str,
+        choices=['random', 'preserving'], default='random',
+        help='Initialisation of the kernels and layers added by'
+             ' self-construction: random (MSRA kernels, Xavier FC weights)'
+             ' or preserving (Net2Net-style: copies of existing kernels and'
+             ' zero FC weights, so that the network\'s function is preserved'
+             ' and fewer epochs are needed to recover after each growth).')
+    parser.add_argument(
+        '--kernel_prune_threshold', '-kprune', type=float, default=0,
+        metavar='',
+        help='When the self-construction of a block ends, remove the kernels'
+             ' of its last layer whose mean absolute weight is below this'
+             ' fraction of the layer\'s highest one, along with their batch'
+             ' norm params and FC weights in the transition to classes.'
+             ' If no block is added afterwards, the network is fine-tuned'
+             ' for one more epoch (default: %(default)s, no kernel is'
+             ' removed).')
+    parser.add_argument(
+        '--budget_mflops', '-bmf', type=float, default=0, metavar='',
+        help='Compute budget in FLOPs per image (in millions): the'
+             ' self-construction refuses any growth (layer, kernels or'
+             ' block) that would exceed it (default: %(default)s, no'
+             ' budget).')
+    parser.add_argument(
+        '--budget_kparams', '-bkp', type=float, default=0, metavar='',
+        help='Compute budget in parameters (in thousands, default:'
+             ' %(default)s, no budget).')
+    parser.add_argument(
+        '--budget_ms', '-bms', type=float, default=0, metavar='',
+        help='Compute budget in inference time per image (in ms, measured'
+             ' on the test set and extrapolated to the grown network from'
+             ' its FLOPs, default: %(default)s, no budget).')
+    parser.add_argument(
+        '--freeze-blocks', dest='should_freeze_blocks', action='store_true',
+        help='When a new block is added by self-construction, freeze the'
+             ' previous blocks (they are no longer trained, and the backward'
+             ' pass stops at the new block).')
+    parser.add_argument(
+        '--no-freeze-blocks', dest='should_freeze_blocks',
+        action='store_false',
+        help='Keep training all the blocks after a new block is added.')
+    parser.set_defaults(should_freeze_blocks=False)
+    parser.add_argument(
+        '--feature-cache', dest='should_cache_features', action='store_true',
+        help='With --freeze-blocks, compute the output of the frozen blocks'
+             ' once for each training image and train the last block from'
+             ' these cached features (only for datasets without'
+             ' augmentation: C10, C100, SVHN).')
+    parser.add_argument(
+        '--no-feature-cache', dest='should_cache_features',
+        action='store_false',
+        help='Do not cache the output of the frozen blocks.')
+    parser.set_defaults(should_cache_features=False)
+    parser.add_argument(
+        '--feature_cache_mb', '-fcmb', type=int, default=1024, metavar='',
+        help='Maximum size (in MB) of the feature cache in memory, larger'
+             ' caches are memory-mapped on disk (default: %(default)s).')
+    parser.add_argument(
+        '--feature_cache_dir', '-fcdir', type=str, default=None, metavar='',
+        help='Directory of the memory-mapped feature caches (default: the'
+             ' system\'s temporary directory).')
 
     # Wether or not to write TensorFlow logs.
     parser.add_argument(
@@ -191,6 +328,19 @@ if __name__ == '__main__':
         '--no-logs', dest='should_save_logs', action='store_false',
         help='Do not write tensorflow logs.')
     parser.set_defaults(should_save_logs=True)
+    parser.add_argument(
+        '--log_batch_interval', '-lbi', type=int, default=50, metavar='',
+        help='Number of training steps aggregated (mean, min and max) in each'
+             ' per-batch tensorflow log (default: %(default)s).')
+    parser.add_argument(
+        '--summary-ops', dest='should_use_summary_ops', action='store_true',
+        help='Aggregate per-batch logs in the graph, with the training step,'
+             ' and write them with summary ops.')
+    parser.add_argument(
+        '--no-summary-ops', dest='should_use_summary_ops',
+        action='store_false',
+        help='Aggregate per-batch logs outside the graph.')
+    parser.set_defaults(should_use_summary_ops=False)
 
     # Wether or not to write CSV feature logs.
     parser.add_argument(
@@ -215,6 +365,13 @@ if __name__ == '__main__':
         dest='ft_decimal', type=str, default=',',
         help='Decimal separator for the CSV feature log.')
 
+    # Wether or not to record the run's metrics in a SQLite database.
+    parser.add_argument(
+        '--metrics_db', '-db', type=str, default=None, metavar='',
+        help='Path of a SQLite database in which to record the metrics of the'
+             ' training run (epochs, layer CS, growth events, timings), e.g.'
+             ' metrics.db. Runs can be compared with compare_runs.py.')
+
     # Wether or not to calculate certain feature values (saved in ft-logs).
     parser.add_argument(
         '--feature-filters', '--ft-filters',
@@ -237,6 +394,18 @@ if __name__ == '__main__':
         help='Do not calculate cross-entropy values'
              ' (only the real cross-entropy).')
     parser.set_defaults(ft_cross_entropies=False)
+    parser.add_argument(
+        '--feature-extra-rows', '--ft-extra-rows', dest='ft_extra_rows',
+        action='store_true',
+        help='Also write the phase times, telemetry, costs and other rows'
+             ' to the CSV feature log (they are always in the compact'
+             ' feature log).')
+    parser.add_argument(
+        '--no-feature-extra-rows', '--no-ft-extra-rows',
+        dest='ft_extra_rows', action='store_false',
+        help='Only write the epochs\' features and the total training time'
+             ' to the CSV feature log.')
+    parser.set_defaults(ft_extra_rows=False)
 
     # Wether or not to save the model's state (to load it back in the future).
     parser.add_argument(
@@ -274,6 +443,118 @@ if __name__ == '__main__':
         '--num_intra_threads', '-intra', type=int, default=128, metavar='',
         help='Number of intra-operation CPU threads '
              ' (for paralellizing the inference/testing phase).')
+    parser.add_argument(
+        '--num_eval_inter_threads', '-einter', type=int, default=None,
+        metavar='',
+        help='Number of inter-operation CPU threads used for evaluation, in'
+             ' their own thread pool (default: same as for training).')
+    parser.add_argument(
+        '--autotune-threads', dest='should_autotune_threads',
+        action='store_true',
+        help='Choose the numbers of CPU threads (and the OpenMP/MKL'
+             ' environment) for training and evaluation by a short'
+             ' calibration on the current architecture and batch size.'
+             ' The result is cached for this host and architecture.')
+    parser.add_argument(
+        '--no-autotune-threads', dest='should_autotune_threads',
+        action='store_false',
+        help='Use the given numbers of CPU threads.')
+    parser.set_defaults(should_autotune_threads=False)
+    parser.add_argument(
+        '--thread_cache', type=str, default=DEFAULT_THREAD_CACHE,
+        metavar='',
+        help='Path of the cache of autotuned thread settings'
+             ' (default: %(default)s).')
+    parser.add_argument(
+        '--retune-threads', dest='should_retune_threads',
+        action='store_true',
+        help='Calibrate the thread settings again, even if they are cached.')
+    parser.set_defaults(should_retune_threads=False)
+    parser.add_argument(
+        '--data_format', '-df', type=str, choices=['NHWC', 'NCHW'],
+        default='NHWC',
+        help='Layout of the feature maps in the graph: NHWC (default) or'
+             ' NCHW (channels first, only supported on CPU by TensorFlow'
+             ' builds with MKL).')
+    parser.add_argument(
+        '--fused-bn', dest='should_fuse_batch_norm', action='store_true',
+        help='Use fused batch normalisations.')
+    parser.add_argument(
+        '--no-fused-bn', dest='should_fuse_batch_norm', action='store_false',
+        help='Use non-fused batch normalisations.')
+    parser.set_defaults(should_fuse_batch_norm=False)
+    parser.add_argument(
+        '--xla', dest='should_use_xla', action='store_true',
+        help='Compile clusters of operations with the XLA JIT compiler'
+             ' (auto-clustering).')
+    parser.add_argument(
+        '--no-xla', dest='should_use_xla', action='store_false',
+        help='Do not use the XLA JIT compiler.')
+    parser.set_defaults(should_use_xla=False)
+    parser.add_argument(
+        '--memory-efficient', dest='should_recompute_features',
+        action='store_true',
+        help='Recompute the concatenations, batch normalisations and ReLUs'
+             ' at the input of each layer during the backward pass instead'
+             ' of storing them (less memory for deep blocks, slower steps).')
+    parser.add_argument(
+        '--no-memory-efficient', dest='should_recompute_features',
+        action='store_false',
+        help='Store all the activations for the backward pass.')
+    parser.set_defaults(should_recompute_features=False)
+    parser.add_argument(
+        '--memory_budget_mb', '-mem', type=float, default=0, metavar='',
+        help='Memory budget (in MB) of the training: before training and'
+             ' after each growth event, the batch size is set to the largest'
+             ' one whose estimated memory (activations, parameters, gradients'
+             ' and momentum) fits in it, and the learning rate is scaled'
+             ' linearly with the batch size (default: %(default)s, fixed'
+             ' batch size).')
+    parser.add_argument(
+        '--max_batch_size', '-mbs', type=int, default=512, metavar='',
+        help='Maximum batch size with --memory_budget_mb (default:'
+             ' %(default)s).')
+
+    # Parameters related to profiling.
+    parser.add_argument(
+        '--phase-timings', dest='should_time_phases', action='store_true',
+        help='Measure the time spent in each phase of every epoch (data'
+             ' fetching, training steps, validation, feature analysis,'
+             ' checkpoints, logging, growth events) and the images/sec in'
+             ' training and evaluation, and record them in the logs.')
+    parser.add_argument(
+        '--no-phase-timings', dest='should_time_phases',
+        action='store_false',
+        help='Do not measure the time spent in each phase of the epochs.')
+    parser.set_defaults(should_time_phases=False)
+    parser.add_argument(
+        '--telemetry', dest='should_log_telemetry', action='store_true',
+        help='Log the graph size (nodes, variables, optimizer slots), the'
+             ' process memory (RSS) and the mean step time for every epoch'
+             ' and growth event.')
+    parser.add_argument(
+        '--no-telemetry', dest='should_log_telemetry', action='store_false',
+        help='Do not log graph and memory telemetry.')
+    parser.set_defaults(should_log_telemetry=False)
+    parser.add_argument(
+        '--log-costs', dest='should_log_costs', action='store_true',
+        help='Log the analytically estimated costs of the network'
+             ' (multiply-adds per image, parameter and activation memory)'
+             ' for every epoch and growth event, with a table of the costs'
+             ' of each layer in the logs directory.')
+    parser.add_argument(
+        '--no-log-costs', dest='should_log_costs', action='store_false',
+        help='Do not log the estimated costs of the network.')
+    parser.set_defaults(should_log_costs=False)
+    parser.add_argument(
+        '--telemetry_alarm_mb', '-alarm', type=int, default=0, metavar='',
+        help='Process memory (RSS, in MB) above which the telemetry prints an'
+             ' alarm (default: %(default)s, no alarm).')
+    parser.add_argument(
+        '--profile_period', '-prof', type=int, default=0, metavar='',
+        help='Number of training steps between each fully traced step. Traced'
+             ' steps produce a Chrome trace and a table of op costs by layer'
+             ' in the logs directory (default: %(default)s, no profiling).')
 
     args = parser.parse_args()
 
@@ -288,15 +569,86 @@ if __name__ == '__main__':
         args.reduction = 1.0
     elif args.model_type == 'DenseNet-BC':
         args.bc_mode = True
-    if not args.train and not args.test:
+    if not args.train and not args.test and not args.export:
+        print("\nFATAL ERROR:")
+        print("Operation on network (--train, --test and/or --export) not"
+              " specified!")
+        print("You should train, test or export your network."
+              " Please check arguments.")
+        exit()
+
+    if args.should_cache_features and (
+            not args.should_freeze_blocks or args.dataset.endswith('+')):
         print("\nFATAL ERROR:")
-        print("Operation on network (--train and/or --test) not specified!")
-        print("You should train or test your network. Please check arguments.")
+        print("The feature cache (--feature-cache) requires --freeze-blocks"
+              " and a dataset without augmentation (C10, C100 or SVHN)!")
+        exit()
+
+    if args.implementation != 'NEWER_dense_net':
+        unsupported_flags = [
+            flag for dest, flag in NEWER_ONLY_OPTIONS.items()
+            if getattr(args, dest) != parser.get_default(dest)]
+        if unsupported_flags:
+            print("\nFATAL ERROR:")
+            print("The %s implementation does not support %s!" % (
+                args.implementation, ', '.join(unsupported_flags)))
+            print("Please use the NEWER_dense_net implementation.")
+            exit()
+
+    # Autotune the CPU threads (before TensorFlow is imported, so that the
+    # OpenMP/MKL environment variables are applied).
+    if args.should_autotune_threads:
+        from benchmarks.common import run_benchmark_in_child
+        batch_size = get_train_params_by_name(args.dataset)['batch_size']
+        thread_settings = autotune_threads(
+            {'implementation': args.implementation,
+             'model_type': args.model_type,
+             'growth_rate': args.growth_rate,
+             'layer_num_list': args.layer_num_list,
+             'batch_size': batch_size},
+            run_benchmark_in_child, args.thread_cache,
+            args.should_retune_threads)
+        if thread_settings is None:
+            print("Thread autotuning failed, using the given settings.")
+        else:
+            args.num_intra_threads = thread_settings['num_intra_threads']
+            args.num_inter_threads = thread_settings['num_inter_threads']
+            args.num_eval_inter_threads = (
+                thread_settings['num_eval_inter_threads'])
+            apply_thread_env(thread_settings['omp_num_threads'])
+
+    # Import the chosen DenseNet implementation.
+    DenseNet = importlib.import_module(
+        'models.%s' % args.implementation).DenseNet
+    if args.export and not hasattr(DenseNet, 'export_inference_graph'):
+        print("\nFATAL ERROR:")
+        print("The %s implementation cannot export inference graphs!" %
+              args.implementation)
+        exit()
+    if args.prune_threshold > 0 and not hasattr(DenseNet,
+                                                 'prune_connections'):
+        print("\nFATAL ERROR:")
+        print("The %s implementation cannot prune connections!" %
+              args.implementation)
+        exit()
+
+    if args.memory_budget_mb > 0 and not hasattr(DenseNet,
+                                                  'get_adaptive_batch_size'):
+        print("\nFATAL ERROR:")
+        print("The %s implementation cannot adapt the batch size to a memory"
+              " budget!" % args.implementation)
+        exit()
+    if (args.budget_mflops > 0 or args.budget_kparams > 0 or
+            args.budget_ms > 0) and not hasattr(DenseNet, 'fits_budget'):
+        print("\nFATAL ERROR:")
+        print("The %s implementation does not support compute budgets!" %
+              args.implementation)
         exit()
 
     # Get model params (the arguments) and train params (depend on dataset).
     model_params = vars(args)
     train_params = get_train_params_by_name(args.dataset)
+    train_params['one_hot'] = not args.sparse_labels
     print("\nModel parameters (specified as arguments):")
     for k, v in model_params.items():
         print("\t%s: %s" % (k, v))
@@ -319,5 +671,21 @@ if __name__ == '__main__':
         print("Testing...")
         loss, accuracy = model.test(data_provider.test, batch_size=200)
         model.print_pertinent_features(loss, accuracy, -1, True)
+        if hasattr(model, 'print_cost_summary'):
+            model.print_cost_summary(accuracy)
+        if args.should_save_ft_logs and hasattr(model, 'save_feature_log'):
+            model.save_feature_log()
         print("mean cross_entropy: %f, mean accuracy: %f" % (
             loss[-1], accuracy))
+    if args.export:
+        if not args.train and not args.test:
+            model.load_model()
+        if args.prune_threshold > 0:
+            print("Pruning connections and exporting inference graph...")
+            model.prune_connections(
+                args.prune_threshold, data_provider.test,
+                args.prune_fine_tune_epochs, train_params['batch_size'],
+                train_params['initial_learning_rate'] / 100)
+        else:
+            print("Exporting inference graph...")
+            model.export_inference_graph()
@@ -0,0 +1,68 @@
+import argparse
+import os
+
+os.environ['TF_CPP_MIN_LOG_LEVEL'] = '2'
+
+
+# Parse arguments for the program.
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(
+        description='Serve a frozen DenseNet inference graph (exported with'
+                    ' `run_dense_net.py --export`) over HTTP, batching'
+                    ' concurrent requests together.')
+
+    parser.add_argument(
+        'graph_path', type=str,
+        help='Path to the frozen inference graph (frozen_graph.pb).')
+    parser.add_argument(
+        '--host', type=str, default='127.0.0.1',
+        help='Host address for the HTTP server (default: %(default)s).')
+    parser.add_argument(
+        '--port', '-p', type=int, default=8500,
+        help='Port for the HTTP server (default: %(default)s).')
+    parser.add_argument(
+        '--unix_socket', '-us', type=str, default=None, metavar='',
+        help='Listen on this Unix socket instead of a TCP port.')
+
+    # Parameters for batching requests together.
+    parser.add_argument(
+        '--max_batch_size', '-mbs', type=int, default=256, metavar='',
+        help='Maximum number of images in a batch (default: %(default)s).')
+    parser.add_argument(
+        '--max_latency_ms', '-mlat', type=float, default=5, metavar='',
+        help='Maximum time (in ms) that a request waits for other requests'
+             ' to be batched with it (default: %(default)s).')
+
+    # Parameters related to hardware optimisation.
+    parser.add_argument(
+        '--num_inter_threads', '-inter', type=int, default=1, metavar='',
+        help='Number of inter-operation CPU threads (default: %(default)s).')
+    parser.add_argument(
+        '--num_intra_threads', '-intra', type=int, default=0, metavar='',
+        help='Number of intra-operation CPU threads'
+             ' (default: %(default)s, chosen by TensorFlow).')
+
+    args = parser.parse_args()
+
+    from serving.batching import DynamicBatcher
+    from serving.frozen_graph import FrozenGraphModel
+    from serving.server import create_server
+
+    print("Loading frozen graph: %s" % args.graph_path)
+    model = FrozenGraphModel(args.graph_path, args.num_inter_threads,
+                             args.num_intra_threads)
+    batcher = DynamicBatcher(model, args.max_batch_size,
+                             args.max_latency_ms / 1000).start()
+    server = create_server(batcher, args.host, args.port, args.unix_socket)
+    if args.unix_socket is not None:
+        print("Serving predictions on unix socket: %s" % args.unix_socket)
+    else:
+        print("Serving predictions on http://%s:%d/predict" % (
+            args.host, args.port))
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\nStopping server...")
+    finally:
+        server.server_close()
+        batcher.stop()
@@ -0,0 +1,123 @@
+import queue
+import threading
+import time
+from concurrent.futures import Future
+
+import numpy as np
+
+
+class DynamicBatcher:
+    """
+    Coalesces concurrent prediction requests into batches.
+
+    Requests are queued and served by a single worker thread, which waits
+    for at most max_latency seconds after the first queued request to gather
+    more requests, until max_batch_size images are collected. The model's
+    predict method is then run once on the whole batch, and the results are
+    split back between the requests. Requests whose images do not have the
+    model's input shape are rejected, so that they never fail the batches
+    of other requests.
+    """
+
+    def __init__(self, model, max_batch_size=256, max_latency=0.005):
+        """
+        Args:
+            model: object with a predict(images, batch_size) method returning
+                the class probabilities for the images, and the shape of an
+                image as data_shape (e.g. a DenseNet or a FrozenGraphModel);
+            max_batch_size: `int`, maximum number of images in a batch;
+            max_latency: `float`, maximum time (in seconds) that a request
+                waits for other requests to be batched with it.
+        """
+        self.model = model
+        self.data_shape = tuple(model.data_shape)
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self._queue = queue.Queue()
+        self._thread = None
+
+    def start(self):
+        """Starts the worker thread that runs the batches."""
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        """Stops the worker thread once all queued requests are served."""
+        if self._thread is not None:
+            self._queue.put(None)
+            self._thread.join()
+            self._thread = None
+
+    def submit(self, images):
+        """
+        Queues a prediction request, returns a `Future` for its result (a
+        ValueError if the images do not have the model's input shape).
+
+        Args:
+            images: `np.ndarray`, 4D array of images to predict.
+        """
+        future = Future()
+        if images.ndim != 4 or images.shape[1:] != self.data_shape:
+            future.set_exception(ValueError(
+                "Expected images of shape %s, got an array of shape %s" % (
+                    (None,) + self.data_shape, images.shape)))
+        else:
+            self._queue.put((images, future))
+        return future
+
+    def predict(self, images):
+        """
+        Queues a prediction request and waits for its result.
+
+        Args:
+            images: `np.ndarray`, 4D array of images to predict.
+        """
+        return self.submit(images).result()
+
+    def _next_batch(self):
+        """
+        Gets the next list of requests to run together, waiting for the
+        first one and then for max_latency at most. Returns the requests and
+        whether the worker should stop afterwards.
+        """
+        first = self._queue.get()
+        if first is None:
+            return [], True
+        requests = [first]
+        batch_size = len(first[0])
+        deadline = time.time() + self.max_latency
+        while batch_size < self.max_batch_size:
+            timeout = deadline - time.time()
+            if timeout <= 0:
+                break
+            try:
+                request = self._queue.get(timeout=timeout)
+            except queue.Empty:
+                break
+            if request is None:
+                return requests, True
+            requests.append(request)
+            batch_size += len(request[0])
+        return requests, False
+
+    def _run(self):
+        """Worker loop: runs the model on batches of queued requests."""
+        should_stop = False
+        while not should_stop:
+            requests, should_stop = self._next_batch()
+            if not requests:
+                continue
+            sizes = [len(images) for images, _ in requests]
+            try:
+                predictions = self.model.predict(
+                    np.concatenate([images for images, _ in requests]),
+                    batch_size=self.max_batch_size)
+            except Exception as e:
+                for _, future in requests:
+                    future.set_exception(e)
+                continue
+            split_predictions = np.split(predictions, np.cumsum(sizes)[:-1])
+            for (_, future), result in zip(requests, split_predictions):
+                future.set_result(result)
@@ -0,0 +1,56 @@
+import numpy as np
+import tensorflow as tf
+
+from models.NEWER_dense_net import INFERENCE_INPUT_NAME, INFERENCE_OUTPUT_NAME
+
+
+class FrozenGraphModel:
+    """
+    Model loaded from a frozen inference graph, as exported with
+    DenseNet.export_inference_graph (no data provider is needed).
+    """
+
+    def __init__(self, graph_path, num_inter_threads=1, num_intra_threads=0):
+        """
+        Args:
+            graph_path: `str`, path to the frozen graph (binary GraphDef);
+            num_inter_threads: `int`, number of inter-operation CPU threads;
+            num_intra_threads: `int`, number of intra-operation CPU threads
+                (0 lets TensorFlow choose).
+        """
+        graph_def = tf.GraphDef()
+        with open(graph_path, 'rb') as f:
+            graph_def.ParseFromString(f.read())
+        self.graph = tf.Graph()
+        with self.graph.as_default():
+            tf.import_graph_def(graph_def, name='')
+        self.images = self.graph.get_tensor_by_name(
+            INFERENCE_INPUT_NAME + ':0')
+        self.prediction = self.graph.get_tensor_by_name(
+            INFERENCE_OUTPUT_NAME + ':0')
+        self.n_classes = int(self.prediction.get_shape()[-1])
+        self.data_shape = tuple(
+            int(dim) for dim in self.images.get_shape()[1:])
+
+        config = tf.ConfigProto()
+        config.intra_op_parallelism_threads = num_intra_threads
+        config.inter_op_parallelism_threads = num_inter_threads
+        config.gpu_options.allow_growth = True
+        self.sess = tf.Session(graph=self.graph, config=config)
+
+    def predict(self, images, batch_size=200):
+        """
+        Predicts the class probabilities for some given images.
+        Returns an `np.ndarray` of shape [num_images, n_classes].
+
+        Args:
+            images: `np.ndarray`, 4D array of (normalised) images;
+            batch_size: `int`, number of images in a prediction batch.
+        """
+        predictions = []
+        for start in range(0, images.shape[0], batch_size):
+            predictions.append(self.sess.run(self.prediction, feed_dict={
+                self.images: images[start: start + batch_size]}))
+        if not predictions:
+            return np.zeros((0, self.n_classes), dtype=np.float32)
+        return np.concatenate(predictions)
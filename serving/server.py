@@ -0,0 +1,113 @@
+import io
+import json
+import os
+import socketserver
+from http.server import BaseHTTPRequestHandler, HTTPServer
+
+import numpy as np
+
+
+class PredictionRequestHandler(BaseHTTPRequestHandler):
+    """
+    HTTP handler for prediction requests, served by a DynamicBatcher.
+
+    - POST /predict: the body contains the images to predict, either as JSON
+      ({"images": [...]}, Content-Type: application/json) or as a NumPy
+      .npy file (Content-Type: application/x-npy). A single 3D image is also
+      accepted. The response contains the class probabilities in the same
+      format ({"probabilities": [...]} for JSON).
+    - GET /health: returns 200 if the server is running.
+    """
+    protocol_version = 'HTTP/1.1'
+
+    def _send(self, code, body, content_type):
+        self.send_response(code)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_json(self, code, content):
+        self._send(code, json.dumps(content).encode(), 'application/json')
+
+    def do_GET(self):
+        if self.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        else:
+            self._send_json(404, {'error': 'Unknown path: %s' % self.path})
+
+    def do_POST(self):
+        if self.path != '/predict':
+            self._send_json(404, {'error': 'Unknown path: %s' % self.path})
+            return
+        content_type = self.headers.get('Content-Type', 'application/json')
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        try:
+            if content_type == 'application/x-npy':
+                images = np.load(io.BytesIO(body), allow_pickle=False)
+            else:
+                images = np.asarray(json.loads(body.decode())['images'])
+            images = images.astype(np.float32)
+            if images.ndim == 3:
+                images = images[np.newaxis]
+            if images.ndim != 4:
+                raise ValueError("Expected a 4D array of images, got shape "
+                                 "%s" % (images.shape,))
+            # images of another shape could not be batched with the others
+            data_shape = self.server.batcher.data_shape
+            if images.shape[1:] != data_shape:
+                raise ValueError("Expected images of shape %s, got shape %s"
+                                 % ((None,) + data_shape, images.shape))
+        except Exception as e:
+            self._send_json(400, {'error': 'Invalid request: %s' % e})
+            return
+
+        try:
+            probabilities = self.server.batcher.predict(images)
+        except Exception as e:
+            self._send_json(500, {'error': 'Prediction failed: %s' % e})
+            return
+
+        if content_type == 'application/x-npy':
+            buffer = io.BytesIO()
+            np.save(buffer, probabilities)
+            self._send(200, buffer.getvalue(), 'application/x-npy')
+        else:
+            self._send_json(200, {'probabilities': probabilities.tolist()})
+
+    def log_message(self, format, *args):
+        # Requests are not logged (Unix sockets have no client address).
+        pass
+
+
+class ThreadedHTTPServer(socketserver.ThreadingMixIn, HTTPServer):
+    """HTTP server (over TCP) handling each request in a separate thread."""
+    daemon_threads = True
+
+
+class ThreadedUnixHTTPServer(socketserver.ThreadingMixIn,
+                             socketserver.UnixStreamServer):
+    """HTTP server (over a Unix socket) handling each request in a thread."""
+    daemon_threads = True
+
+
+def create_server(batcher, host='127.0.0.1', port=8500, unix_socket=None):
+    """
+    Creates a prediction server (HTTP over TCP, or over a Unix socket if
+    unix_socket is given) whose requests are served by a DynamicBatcher.
+    The server is returned without being started (use serve_forever).
+
+    Args:
+        batcher: DynamicBatcher, the (started) batcher to serve requests;
+        host: `str`, host address for the TCP server;
+        port: `int`, port for the TCP server;
+        unix_socket: `str` or None, path of the Unix socket to listen on.
+    """
+    if unix_socket is not None:
+        if os.path.exists(unix_socket):
+            os.remove(unix_socket)
+        server = ThreadedUnixHTTPServer(unix_socket, PredictionRequestHandler)
+    else:
+        server = ThreadedHTTPServer((host, port), PredictionRequestHandler)
+    server.batcher = batcher
+    return server
@@ -0,0 +1,40 @@
+import unittest
+
+import numpy as np
+
+from serving.batching import DynamicBatcher
+
+
+class MeanModel:
+    """Stand-in model predicting the mean of each image."""
+    data_shape = (4, 4, 3)
+
+    def predict(self, images, batch_size):
+        return images.reshape(len(images), -1).mean(axis=1, keepdims=True)
+
+
+class ImageShapeTest(unittest.TestCase):
+    """
+    Requests with images of another shape than the model's are rejected
+    without failing the requests batched with them.
+    """
+
+    def setUp(self):
+        self.batcher = DynamicBatcher(MeanModel(), max_latency=0.05).start()
+
+    def tearDown(self):
+        self.batcher.stop()
+
+    def test_other_shape_rejected(self):
+        valid = self.batcher.submit(np.ones((2, 4, 4, 3), np.float32))
+        invalid = self.batcher.submit(np.ones((1, 5, 4, 3), np.float32))
+        self.assertRaises(ValueError, invalid.result)
+        np.testing.assert_allclose(valid.result(), [[1.0], [1.0]])
+
+    def test_not_4d_rejected(self):
+        self.assertRaises(ValueError, self.batcher.predict,
+                          np.ones((4, 4, 3), np.float32))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,47 @@
+import unittest
+
+from models.cost_model import get_layer_costs, get_total_costs
+
+
+class LayerCostsTest(unittest.TestCase):
+    """
+    Parameter and multiply-add counts of small architectures (counted by
+    hand).
+    """
+
+    def test_densenet(self):
+        # 8x8 RGB images, 4 initial kernels, blocks of 2+3 and 2 kernels
+        layer_costs = get_layer_costs((8, 8, 3), 10, [[2, 3], [2]], 2, 4)
+        self.assertEqual([layer['name'] for layer in layer_costs], [
+            'Initial_convolution', 'Block_0/layer_0', 'Block_0/layer_1',
+            'Transition_after_block_0', 'Block_1/layer_0',
+            'Transition_to_classes'])
+        # conv: 3x3xCxK, batch norm: 2xC, FC: CxN + N
+        self.assertEqual([layer['params'] for layer in layer_costs],
+                         [108, 80, 174, 99, 180, 142])
+        self.assertEqual([layer['macs'] for layer in layer_costs],
+                         [6912, 4608, 10368, 5184, 2592, 110])
+        total = get_total_costs(layer_costs)
+        self.assertEqual(total['params'], 783)
+        self.assertEqual(total['param_bytes'], 783 * 4)
+
+    def test_densenet_bc(self):
+        # bottleneck of 4 x growth rate, then 3x3 convolution
+        layer_costs = get_layer_costs((8, 8, 3), 10, [[2], [2]], 2, 4,
+                                      bc_mode=True, reduction=0.5)
+        self.assertEqual([layer['params'] for layer in layer_costs],
+                         [108, 200, 30, 190, 70])
+
+    def test_memory_efficient(self):
+        costs = get_layer_costs((8, 8, 3), 10, [[2, 3]], 2, 4, batch_size=8)
+        efficient_costs = get_layer_costs((8, 8, 3), 10, [[2, 3]], 2, 4,
+                                          batch_size=8,
+                                          memory_efficient=True)
+        for layer, efficient_layer in zip(costs[1:-1], efficient_costs[1:-1]):
+            self.assertEqual(layer['params'], efficient_layer['params'])
+            self.assertLess(efficient_layer['activation_bytes'],
+                            layer['activation_bytes'])
+
+
+if __name__ == '__main__':
+    unittest.main()
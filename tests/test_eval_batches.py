@@ -0,0 +1,42 @@
+import unittest
+
+import numpy as np
+
+from data_providers.synthetic import SyntheticDataSet
+
+
+class EvalBatchesTest(unittest.TestCase):
+    """
+    Evaluation batches cover every example exactly once, and do not change
+    the iteration state of the training batches.
+    """
+
+    def setUp(self):
+        # each image holds its own index
+        self.dataset = SyntheticDataSet(
+            np.arange(10, dtype=np.float32).reshape(10, 1, 1, 1),
+            np.arange(10), shuffle=True)
+
+    def test_every_example_once(self):
+        batches = list(self.dataset.eval_batches(4))
+        self.assertEqual([len(labels) for _, labels in batches], [4, 4, 2])
+        labels = np.concatenate([labels for _, labels in batches])
+        np.testing.assert_array_equal(np.sort(labels), np.arange(10))
+        for images, labels in batches:
+            np.testing.assert_array_equal(images.ravel(), labels)
+
+    def test_exact_batches(self):
+        batches = list(self.dataset.eval_batches(5))
+        self.assertEqual([len(labels) for _, labels in batches], [5, 5])
+
+    def test_training_state_unchanged(self):
+        first_images, _ = self.dataset.next_batch(4)
+        list(self.dataset.eval_batches(3))
+        second_images, _ = self.dataset.next_batch(4)
+        # the second training batch follows the first one in the epoch
+        seen = np.concatenate([first_images, second_images]).ravel()
+        self.assertEqual(len(np.unique(seen)), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,108 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+import numpy as np
+
+from analysis.ft_logs import read_ft_log
+from models.feature_log import FeatureLog, read_feature_log
+
+
+class FeatureLogTest(unittest.TestCase):
+    """
+    Feature logs written by a FeatureLog are read back by the analysis tool
+    from the CSV feature log (written along the way or exported).
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.log_path = os.path.join(self.directory, 'run.features.csv')
+        self.csv_path = os.path.join(self.directory, 'run.csv')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def write_log(self, extra_rows=False):
+        """
+        Writes a log of two epochs of a block with two layers (the second
+        one only at the second epoch), with phase times and total time.
+        """
+        feature_log = FeatureLog(self.log_path, self.csv_path, ';', ',',
+                                 extra_rows, flush_rows=2)
+        for epoch in [1, 2]:
+            feature_log.start_row('Epoch', epoch)
+            feature_log.add_values('accuracy', 0.5 * epoch)
+            feature_log.add_values('loss', [2.5, 1.25][:epoch])
+            if epoch == 1:
+                layers = [(0.25, [1.0], [1.0], 1.0)]
+            else:
+                layers = [(0.5, [1.0, 0.75], [1.0], 1.0),
+                          (1.0, [1.0], [0.5, 1.0], 0.5)]
+            for l, (lcs_dst, cs_dst, cs_src, lcs_src) in enumerate(layers):
+                feature_log.add_values('lcs_dst', lcs_dst, 0, l)
+                feature_log.add_values('cs_dst', cs_dst, 0, l)
+                feature_log.add_values('cs_src', cs_src, 0, l)
+                feature_log.add_values('lcs_src', lcs_src, 0, l)
+            feature_log.end_row()
+            feature_log.add_row('Phase times', epoch,
+                                {'train_step': 2.0 * epoch, 'logging': 0.5})
+        feature_log.add_row('Total training time', 2, {'seconds': 3725.5})
+        feature_log.close()
+        return feature_log
+
+    def check_features(self, log):
+        np.testing.assert_array_equal(log.epochs, [1, 2])
+        np.testing.assert_allclose(log.accuracy, [0.5, 1.0])
+        np.testing.assert_allclose(log.loss, [[2.5, np.nan], [2.5, 1.25]])
+        np.testing.assert_array_equal(log.layer_num_list, [[1], [2]])
+        np.testing.assert_allclose(log.lcs_dst[0], [[0.25, np.nan],
+                                                    [0.5, 1.0]])
+        np.testing.assert_allclose(log.lcs_src[0], [[1.0, np.nan],
+                                                    [1.0, 0.5]])
+        np.testing.assert_allclose(
+            log.cs_tables[0][1], [[1.0, np.nan], [0.5, 1.0]])
+        self.assertEqual(log.total_time, 3725.5)
+
+    def test_compact_log(self):
+        self.write_log()
+        rows = read_feature_log(self.log_path)
+        self.assertEqual([(kind, epoch) for kind, epoch, _ in rows], [
+            ('Epoch', 1), ('Phase times', 1), ('Epoch', 2),
+            ('Phase times', 2), ('Total training time', 2)])
+        # one line per feature, with all its values
+        key, block, layer, values = rows[2][2][-3]
+        self.assertEqual((key, block, layer), ('cs_dst', 0, 1))
+        np.testing.assert_array_equal(values, [1.0])
+
+    def test_csv_written_along(self):
+        self.write_log()
+        log = read_ft_log(self.csv_path)
+        self.check_features(log)
+        # by default, only the epochs and total time are in the CSV log
+        self.assertEqual(list(log.timings), [])
+
+    def test_csv_with_extra_rows(self):
+        self.write_log(extra_rows=True)
+        log = read_ft_log(self.csv_path)
+        self.check_features(log)
+        np.testing.assert_allclose(
+            log.timings['Phase times']['train_step'], [2.0, 4.0])
+
+    def test_export_csv(self):
+        feature_log = self.write_log()
+        with open(self.csv_path) as f:
+            written = f.read()
+        export_path = os.path.join(self.directory, 'export.csv')
+        feature_log.export_csv(export_path, ';', ',')
+        with open(export_path) as f:
+            self.assertEqual(f.read(), written)
+        feature_log.export_csv(export_path, ';', ',', extra_rows=True)
+        log = read_ft_log(export_path)
+        self.check_features(log)
+        np.testing.assert_array_equal(
+            log.timings['Phase times']['epoch'], [1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
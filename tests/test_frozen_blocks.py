@@ -0,0 +1,65 @@
+import unittest
+
+import numpy as np
+
+from benchmarks.common import get_model_params
+from data_providers.synthetic import SyntheticDataProvider
+
+try:
+    import tensorflow as tf
+    from models.NEWER_dense_net import DenseNet
+except ImportError:
+    DenseNet = None
+
+
+@unittest.skipIf(DenseNet is None, 'requires TensorFlow')
+class FrozenBlocksTest(unittest.TestCase):
+    """
+    Once frozen, the blocks' batch norms are in inference mode, so that the
+    frozen blocks no longer change and their cached outputs are the ones
+    computed when training without the cache.
+    """
+
+    def setUp(self):
+        tf.reset_default_graph()
+        self.data_provider = SyntheticDataProvider(
+            data_shape=(8, 8, 3), n_classes=4, train_size=64, test_size=32)
+        model_params = get_model_params({'growth_rate': 4})
+        model_params.update(should_freeze_blocks=True,
+                            should_cache_features=True)
+        self.model = DenseNet(data_provider=self.data_provider,
+                              **model_params)
+        # move the moving statistics away from their initial values
+        self.model.train_one_epoch(self.data_provider.train, 16, 0.1)
+        self.model._new_block()
+
+    def tearDown(self):
+        self.model.release_feature_cache()
+        self.model.sess.close()
+
+    def get_frozen_values(self):
+        return self.model.sess.run([
+            var for var in tf.global_variables()
+            if var.name.startswith('Block_0/')])
+
+    def test_frozen_blocks_unchanged(self):
+        frozen_values = self.get_frozen_values()
+        self.model.train_one_epoch(self.data_provider.train, 16, 0.1)
+        for before, after in zip(frozen_values, self.get_frozen_values()):
+            np.testing.assert_array_equal(before, after)
+
+    def test_cached_features_match(self):
+        train = self.data_provider.train
+        self.model.build_feature_cache(train, 16)
+        uncached = self.model.sess.run(self.model.frozen_output, feed_dict={
+            self.model.images: train.images[:16],
+            self.model.is_training: True,
+            self.model.frozen_blocks_input: self.model.frozen_blocks,
+        })
+        np.testing.assert_allclose(
+            self.model.feature_cache.features[:16], uncached,
+            rtol=1e-5, atol=1e-5)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,46 @@
+import os
+import shutil
+import tempfile
+import unittest
+
+from models.metrics_store import MetricsStore
+
+
+class LayerCSTest(unittest.TestCase):
+    """
+    The layer CS is only recorded within a run (i.e. during training).
+    """
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.store = MetricsStore(os.path.join(self.directory, 'metrics.db'))
+
+    def tearDown(self):
+        self.store.close()
+        shutil.rmtree(self.directory)
+
+    def count_layer_cs_rows(self):
+        return self.store.connection.execute(
+            "SELECT COUNT(*) FROM layer_cs").fetchone()[0]
+
+    def test_test_only_mode(self):
+        # with --test and no --train, no run is ever started
+        self.store.log_layer_cs(-1, 0, [1.0, 0.5], [0.5, 1.0])
+        self.assertEqual(self.count_layer_cs_rows(), 0)
+
+    def test_during_run(self):
+        self.store.start_run('run', 'DenseNet', 'C10', 12, {})
+        self.store.log_layer_cs(1, 0, [1.0, 0.5], [0.5, 1.0])
+        self.assertEqual(self.count_layer_cs_rows(), 2)
+
+    def test_after_run(self):
+        # the final test pass after training is not recorded in the run
+        self.store.start_run('run', 'DenseNet', 'C10', 12, {})
+        self.store.log_layer_cs(1, 0, [1.0], [1.0])
+        self.store.end_run(10.0, [1])
+        self.store.log_layer_cs(1, 0, [1.0], [1.0])
+        self.assertEqual(self.count_layer_cs_rows(), 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
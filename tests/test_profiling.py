@@ -0,0 +1,55 @@
+import unittest
+from unittest import mock
+
+from models.profiling import PhaseTimer
+
+
+class PhaseTimerTest(unittest.TestCase):
+    """
+    The time of a nested phase is only counted for that phase, not for the
+    phases in which it is nested.
+    """
+
+    def measure(self, timer, clock):
+        # feature analysis from 0 to 10, with a growth event from 2 to 7
+        # (itself with a checkpoint from 3 to 4)
+        with mock.patch('models.profiling.time.time',
+                        side_effect=clock):
+            timer.start('feature_analysis')
+            timer.start('growth')
+            with timer.measure('checkpoint'):
+                pass
+            timer.stop('growth')
+            timer.stop('feature_analysis')
+
+    def test_nested_phases(self):
+        timer = PhaseTimer()
+        self.measure(timer, [0, 2, 3, 4, 7, 10])
+        self.assertEqual(timer.times, {
+            'checkpoint': 1, 'growth': 4, 'feature_analysis': 5})
+
+    def test_repeated_phase(self):
+        timer = PhaseTimer()
+        with mock.patch('models.profiling.time.time',
+                        side_effect=[0, 1, 5, 8]):
+            with timer.measure('validation'):
+                pass
+            with timer.measure('validation'):
+                pass
+        self.assertEqual(timer.reset(), {'validation': 4})
+        self.assertEqual(timer.times, {})
+
+    def test_wrong_phase_stopped(self):
+        timer = PhaseTimer()
+        timer.start('feature_analysis')
+        timer.start('growth')
+        self.assertRaises(AssertionError, timer.stop, 'feature_analysis')
+
+    def test_disabled(self):
+        timer = PhaseTimer(enabled=False)
+        self.measure(timer, [])
+        self.assertEqual(timer.times, {})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,45 @@
+import unittest
+
+import numpy as np
+
+from data_providers.synthetic import SyntheticDataProvider
+
+
+class SyntheticDataProviderTest(unittest.TestCase):
+    """
+    The synthetic data (and its shuffling) only depends on the seed.
+    """
+
+    def get_provider(self, seed):
+        return SyntheticDataProvider(
+            data_shape=(4, 4, 3), n_classes=5, train_size=40, test_size=20,
+            validation_set=True, validation_split=0.25, shuffle=True,
+            seed=seed)
+
+    def get_data(self, provider):
+        return [provider.train.images, provider.train.labels,
+                provider.validation.images, provider.test.images,
+                provider.test.labels, provider.train.next_batch(8)[0],
+                provider.train.next_batch(8)[0]]
+
+    def test_same_seed(self):
+        for first, second in zip(self.get_data(self.get_provider(1)),
+                                 self.get_data(self.get_provider(1))):
+            np.testing.assert_array_equal(first, second)
+
+    def test_other_seed(self):
+        first = self.get_provider(1)
+        second = self.get_provider(2)
+        self.assertFalse(np.array_equal(first.test.images,
+                                        second.test.images))
+
+    def test_shapes(self):
+        provider = self.get_provider(0)
+        self.assertEqual(provider.train.images.shape, (30, 4, 4, 3))
+        self.assertEqual(provider.validation.images.shape, (10, 4, 4, 3))
+        self.assertEqual(provider.test.labels.shape, (20, 5))
+        self.assertEqual(provider.train.images.dtype, np.float32)
+
+
+if __name__ == '__main__':
+    unittest.main()